@@ -1,13 +1,23 @@
 from __future__ import annotations
 
 import json
+import os
+import threading
 import time
 import uuid
-from dataclasses import dataclass
-from typing import Any
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Mapping
 
 from flask import Flask, jsonify, request, send_from_directory
 
+from backend.catalog.binary import BinaryCatalog
+from backend.catalog.delta import CatalogDelta, delta_path_for
+from backend.catalog.manifest import file_hash
+from backend.catalog.pipeline import load_existing_catalog
+from backend.catalog.schema import FoodItem as CatalogItem
+from backend.catalog.shards import ShardedCatalog, normalize_locales
+
 app = Flask(__name__, static_folder="static", static_url_path="")
 
 
@@ -31,6 +41,106 @@ FOODS: list[FoodItem] = [
     FoodItem("5", "Protein Shake", 220, 30, 8, 4, 0.88),
 ]
 
+
+class MemoryCatalog:
+    """A JSON catalog (or shard), already decoded, read the way the app reads a BinaryCatalog."""
+
+    def __init__(self, items: Mapping[str, CatalogItem]) -> None:
+        self.items = list(items.values())
+        self.by_id = {item.id: item for item in self.items}
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def name(self, number: int) -> str:
+        return self.items[number].name
+
+    def item(self, number: int) -> CatalogItem:
+        return self.items[number]
+
+    def get_by_id(self, item_id: str) -> CatalogItem | None:
+        return self.by_id.get(item_id)
+
+
+@dataclass(frozen=True)
+class CatalogView:
+    """One version of the served catalog; never mutated once published.
+
+    ``files`` is the catalog as last opened (one file, or the served
+    locales' shards). ``overlay`` holds foods added
+    or revised by deltas applied since, by id, and ``hidden`` the file ids
+    they replace or remove. Reloads build a new view and swap the module
+    reference, so requests keep reading the view they started with.
+
+    Name token indexes, one per file and one over the overlay, are built
+    with the view, and each view starts its own search cache. Swapping the
+    view swaps both, so no request can fill the new cache with results from
+    the old catalog.
+    """
+
+    files: tuple[BinaryCatalog | MemoryCatalog, ...]
+    sha256: str | None
+    overlay: dict[str, FoodItem]
+    hidden: frozenset[str]
+    file_indexes: tuple[dict[str, list[int]], ...] = ()
+    overlay_index: dict[str, list[str]] = field(default_factory=dict)
+    search_cache: dict[tuple[str, str], dict[str, Any]] = field(default_factory=dict, compare=False)
+
+
+# Optional catalog; a binary one (``catalog import --format binary``) is mapped rather than loaded.
+# For a sharded catalog (``--shard-by-locale``), only the listed locales' shards are opened.
+CATALOG_PATH = os.getenv("CALORIE_TRACKER_CATALOG")
+CATALOG_LOCALES = normalize_locales(
+    [locale for locale in os.getenv("CALORIE_TRACKER_CATALOG_LOCALES", "").split(",") if locale.strip()] or None
+)
+catalog_lock = threading.Lock()
+
+
+def open_catalog(path: Path | None) -> CatalogView:
+    if path is None or not path.exists():
+        return CatalogView((), None, {}, frozenset())
+    files = catalog_files(load_existing_catalog(path, CATALOG_LOCALES))
+    indexes = tuple(
+        build_name_index((number, catalog.name(number)) for number in range(len(catalog))) for catalog in files
+    )
+    return CatalogView(files, file_hash(path), {}, frozenset(), indexes)
+
+
+def build_name_index(entries: Iterable[tuple[Any, str]]) -> dict[str, list[Any]]:
+    """Lower-cased name tokens -> the positions (or ids) of the names holding them."""
+    index: dict[str, list[Any]] = {}
+    for position, name in entries:
+        for token in set(name.lower().split()):
+            index.setdefault(token, []).append(position)
+    return index
+
+
+def index_candidates(index: dict[str, list[Any]], query: str) -> set[Any]:
+    """Entries ``text_match_score`` may score above zero for ``query``.
+
+    Those share a token with the query or contain all of it. Each
+    whitespace-free piece of a contained query falls inside one name token,
+    so the tokens holding the longest piece cover that case.
+    """
+    pieces = query.lower().split()
+    candidates: set[Any] = set()
+    for piece in pieces:
+        candidates.update(index.get(piece, ()))
+    longest = max(pieces, key=len, default="")
+    for token, positions in index.items():
+        if longest in token:
+            candidates.update(positions)
+    return candidates
+
+
+def catalog_files(base: Mapping[str, CatalogItem]) -> tuple[BinaryCatalog | MemoryCatalog, ...]:
+    """The files of a loaded catalog; JSON ones are wrapped to read like binary ones."""
+    shards = list(base.shards.values()) if isinstance(base, ShardedCatalog) else [base]
+    return tuple(shard if isinstance(shard, BinaryCatalog) else MemoryCatalog(shard) for shard in shards)
+
+
+catalog_view = open_catalog(Path(CATALOG_PATH) if CATALOG_PATH else None)
+
 user_history: dict[str, dict[str, int]] = {}
 user_favorites: dict[str, set[str]] = {}
 user_recents: dict[str, list[str]] = {}
@@ -39,7 +149,6 @@ meal_templates: dict[str, list[dict[str, Any]]] = {}
 
 CACHE_TTL = 30
 CACHE_MAX = 50
-search_cache: dict[tuple[str, str], dict[str, Any]] = {}
 query_counts: dict[tuple[str, str], int] = {}
 
 
@@ -55,13 +164,15 @@ def search() -> Any:
     if not query:
         return jsonify({"results": [], "cached": False})
 
+    view = catalog_view
     cache_key = (user_id, query.lower())
-    cached = get_cached_results(cache_key)
+    cached = get_cached_results(view.search_cache, cache_key)
     if cached is not None:
         return jsonify({"results": cached, "cached": True})
 
     candidates = list(FOODS)
     candidates.extend(custom_macros.get(user_id, []))
+    candidates.extend(catalog_matches(query, view))
 
     history_counts = user_history.get(user_id, {})
     max_history = max(history_counts.values(), default=0)
@@ -91,7 +202,7 @@ def search() -> Any:
 
     ranked.sort(key=lambda r: r["score"], reverse=True)
 
-    store_cached_results(cache_key, ranked)
+    store_cached_results(view.search_cache, cache_key, ranked)
     return jsonify({"results": ranked, "cached": False})
 
 
@@ -190,6 +301,11 @@ def meal_templates_handler() -> Any:
     return jsonify({"templates": meal_templates.get(user_id, [])})
 
 
+@app.route("/api/catalog/reload", methods=["POST"])
+def catalog_reload() -> Any:
+    return jsonify(reload_catalog())
+
+
 @app.route("/api/cache/stats")
 def cache_stats() -> Any:
     frequent_queries = sorted(query_counts.items(), key=lambda x: x[1], reverse=True)
@@ -197,7 +313,49 @@ def cache_stats() -> Any:
         {"query": key[1], "user_id": key[0], "hits": count}
         for key, count in frequent_queries
     ]
-    return jsonify({"cache_size": len(search_cache), "frequent_queries": formatted[:5]})
+    return jsonify({"cache_size": len(catalog_view.search_cache), "frequent_queries": formatted[:5]})
+
+
+def apply_catalog_delta(view: CatalogView, delta: CatalogDelta) -> CatalogView:
+    """A copy of ``view`` with ``delta`` applied; ``view`` itself is left untouched."""
+    overlay = dict(view.overlay)
+    hidden = set(view.hidden)
+    for item in [*delta.added, *delta.revised]:
+        if CATALOG_LOCALES is not None and item.locale.lower() not in CATALOG_LOCALES:
+            continue
+        overlay[item.id] = catalog_food(item)
+        hidden.add(item.id)
+    for item_id in delta.removed:
+        overlay.pop(item_id, None)
+        hidden.add(item_id)
+    overlay_index = build_name_index((item_id, item.name) for item_id, item in overlay.items())
+    return CatalogView(view.files, delta.catalog_sha256, overlay, frozenset(hidden), view.file_indexes, overlay_index)
+
+
+def reload_catalog() -> dict[str, Any]:
+    """Catch up with the catalog on disk, by its last delta if it follows the served version."""
+    global catalog_view
+    if not CATALOG_PATH:
+        return {"mode": "disabled"}
+    path = Path(CATALOG_PATH)
+    with catalog_lock:
+        view = catalog_view
+        delta = CatalogDelta.load(delta_path_for(path))
+        if delta is not None and delta.catalog_sha256 == view.sha256:
+            return {"mode": "current", "sha256": view.sha256}
+        if delta is not None and delta.base_sha256 == view.sha256:
+            catalog_view = apply_catalog_delta(view, delta)
+            result = {
+                "mode": "delta",
+                "added": len(delta.added),
+                "revised": len(delta.revised),
+                "removed": len(delta.removed),
+            }
+        else:
+            # Requests still holding the old view keep its mapping alive until they finish.
+            catalog_view = open_catalog(path)
+            result = {"mode": "full"}
+        return {**result, "sha256": catalog_view.sha256}
 
 
 def calculate_totals(items: list[dict[str, Any]]) -> dict[str, int]:
@@ -216,9 +374,45 @@ def resolve_item(user_id: str, item_id: str) -> FoodItem:
     for item in FOODS:
         if item.id == item_id:
             return item
+    view = catalog_view
+    if item_id in view.overlay:
+        return view.overlay[item_id]
+    if item_id not in view.hidden:
+        for catalog in view.files:
+            catalog_item = catalog.get_by_id(item_id)
+            if catalog_item is not None:
+                return catalog_food(catalog_item)
     return FoodItem(item_id, "Unknown Item", 0, 0, 0, 0, 0.0)
 
 
+def catalog_food(item: CatalogItem) -> FoodItem:
+    nutrients = item.nutrients_per_100g
+    return FoodItem(
+        id=item.id,
+        name=item.name,
+        calories=round(nutrients.calories_kcal or 0),
+        protein=round(nutrients.protein_g or 0),
+        carbs=round(nutrients.carbs_g or 0),
+        fat=round(nutrients.fat_g or 0),
+        popularity=item.confidence,
+    )
+
+
+def catalog_matches(query: str, view: CatalogView | None = None) -> Iterator[FoodItem]:
+    """Catalog foods whose name matches ``query``; only matching items are decoded."""
+    view = view or catalog_view
+    for item_id in sorted(index_candidates(view.overlay_index, query)):
+        item = view.overlay[item_id]
+        if text_match_score(item.name, query):
+            yield item
+    for catalog, index in zip(view.files, view.file_indexes):
+        for number in sorted(index_candidates(index, query)):
+            if text_match_score(catalog.name(number), query):
+                item = catalog.item(number)
+                if item.id not in view.hidden:
+                    yield catalog_food(item)
+
+
 def item_to_dict(item: FoodItem) -> dict[str, Any]:
     return {
         "id": item.id,
@@ -245,7 +439,9 @@ def text_match_score(name: str, query: str) -> float:
     return min(1.0, len(overlap) / len(name_tokens))
 
 
-def get_cached_results(cache_key: tuple[str, str]) -> list[dict[str, Any]] | None:
+def get_cached_results(
+    search_cache: dict[tuple[str, str], dict[str, Any]], cache_key: tuple[str, str]
+) -> list[dict[str, Any]] | None:
     cached = search_cache.get(cache_key)
     if not cached:
         return None
@@ -257,7 +453,9 @@ def get_cached_results(cache_key: tuple[str, str]) -> list[dict[str, Any]] | Non
     return cached["results"]
 
 
-def store_cached_results(cache_key: tuple[str, str], results: list[dict[str, Any]]) -> None:
+def store_cached_results(
+    search_cache: dict[tuple[str, str], dict[str, Any]], cache_key: tuple[str, str], results: list[dict[str, Any]]
+) -> None:
     query_counts[cache_key] = query_counts.get(cache_key, 0) + 1
     search_cache[cache_key] = {
         "timestamp": time.time(),
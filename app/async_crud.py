@@ -0,0 +1,191 @@
+"""Asyncio counterparts of :mod:`app.crud`.
+
+Each coroutine runs the synchronous implementation through
+``AsyncSession.run_sync`` so both modes share one set of queries, while the
+statements themselves go through the async driver instead of a worker thread.
+"""
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import changes, crud, models, schemas, sync
+from .cache import UserCache
+
+
+async def get_user(db: AsyncSession, user_id: int) -> Optional[models.User]:
+    return await db.run_sync(crud.get_user, user_id)
+
+
+async def get_cached_user(db: AsyncSession, cache: UserCache, user_id: int) -> Optional[models.User]:
+    return await db.run_sync(cache.get, user_id)
+
+
+async def get_user_by_email(db: AsyncSession, email: str) -> Optional[models.User]:
+    return await db.run_sync(crud.get_user_by_email, email)
+
+
+async def list_users(db: AsyncSession) -> List[models.User]:
+    return await db.run_sync(crud.list_users)
+
+
+async def create_user(db: AsyncSession, name: str, email: str, timezone: str) -> models.User:
+    return await db.run_sync(crud.create_user, name, email, timezone)
+
+
+async def update_user(db: AsyncSession, user: models.User, updates: Dict) -> models.User:
+    return await db.run_sync(crud.update_user, user, updates)
+
+
+async def delete_user(db: AsyncSession, user: models.User) -> None:
+    await db.run_sync(crud.delete_user, user)
+
+
+async def get_goal_config(db: AsyncSession, user_id: int) -> Optional[models.GoalConfig]:
+    return await db.run_sync(crud.get_goal_config, user_id)
+
+
+async def upsert_goal_config(db: AsyncSession, user_id: int, updates: Dict) -> models.GoalConfig:
+    return await db.run_sync(crud.upsert_goal_config, user_id, updates)
+
+
+async def delete_goal_config(db: AsyncSession, goal: models.GoalConfig) -> None:
+    await db.run_sync(crud.delete_goal_config, goal)
+
+
+async def get_daily_log(db: AsyncSession, user_id: int, log_date: date) -> Optional[models.DailyLog]:
+    return await db.run_sync(crud.get_daily_log, user_id, log_date)
+
+
+async def get_daily_log_by_id(db: AsyncSession, daily_log_id: int) -> Optional[models.DailyLog]:
+    return await db.run_sync(crud.get_daily_log_by_id, daily_log_id)
+
+
+async def get_user_with_daily_log(
+    db: AsyncSession,
+    user_id: int,
+    log_date: date,
+) -> Tuple[Optional[models.User], Optional[models.DailyLog]]:
+    return await db.run_sync(crud.get_user_with_daily_log, user_id, log_date)
+
+
+async def list_daily_logs(
+    db: AsyncSession,
+    user_id: int,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+) -> List[models.DailyLog]:
+    return await db.run_sync(crud.list_daily_logs, user_id, start_date, end_date)
+
+
+async def save_daily_log(
+    db: AsyncSession,
+    user: models.User,
+    log_date: date,
+    timezone: str,
+    existing: Optional[models.DailyLog],
+) -> models.DailyLog:
+    return await db.run_sync(crud.save_daily_log, user, log_date, timezone, existing)
+
+
+async def delete_daily_log(db: AsyncSession, daily_log: models.DailyLog) -> None:
+    await db.run_sync(crud.delete_daily_log, daily_log)
+
+
+async def create_meal(db: AsyncSession, daily_log: models.DailyLog, data: Dict) -> models.Meal:
+    return await db.run_sync(crud.create_meal, daily_log, data)
+
+
+async def get_meal(db: AsyncSession, meal_id: int) -> Optional[models.Meal]:
+    return await db.run_sync(crud.get_meal, meal_id)
+
+
+async def list_meals(db: AsyncSession, daily_log_id: int) -> List[models.Meal]:
+    return await db.run_sync(crud.list_meals, daily_log_id)
+
+
+async def update_meal(db: AsyncSession, meal: models.Meal, updates: Dict) -> models.Meal:
+    return await db.run_sync(crud.update_meal, meal, updates)
+
+
+async def delete_meal(db: AsyncSession, meal: models.Meal) -> None:
+    await db.run_sync(crud.delete_meal, meal)
+
+
+async def create_food_item(db: AsyncSession, meal: models.Meal, data: Dict) -> models.FoodItem:
+    return await db.run_sync(crud.create_food_item, meal, data)
+
+
+async def get_food_item(db: AsyncSession, item_id: int) -> Optional[models.FoodItem]:
+    return await db.run_sync(crud.get_food_item, item_id)
+
+
+async def list_food_items(db: AsyncSession, meal_id: int) -> List[models.FoodItem]:
+    return await db.run_sync(crud.list_food_items, meal_id)
+
+
+async def update_food_item(db: AsyncSession, item: models.FoodItem, updates: Dict) -> models.FoodItem:
+    return await db.run_sync(crud.update_food_item, item, updates)
+
+
+async def delete_food_item(db: AsyncSession, item: models.FoodItem) -> None:
+    await db.run_sync(crud.delete_food_item, item)
+
+
+async def get_weight_entry(db: AsyncSession, entry_id: int) -> Optional[models.WeightEntry]:
+    return await db.run_sync(crud.get_weight_entry, entry_id)
+
+
+async def list_weight_entries(
+    db: AsyncSession,
+    user_id: int,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+) -> List[models.WeightEntry]:
+    return await db.run_sync(crud.list_weight_entries, user_id, start_date, end_date)
+
+
+async def upsert_weight_entry(
+    db: AsyncSession,
+    user_id: int,
+    entry_date: date,
+    updates: Dict,
+) -> models.WeightEntry:
+    return await db.run_sync(crud.upsert_weight_entry, user_id, entry_date, updates)
+
+
+async def update_weight_entry(db: AsyncSession, entry: models.WeightEntry, updates: Dict) -> models.WeightEntry:
+    return await db.run_sync(crud.update_weight_entry, entry, updates)
+
+
+async def delete_weight_entry(db: AsyncSession, entry: models.WeightEntry) -> None:
+    await db.run_sync(crud.delete_weight_entry, entry)
+
+
+async def get_macro_totals(db: AsyncSession, daily_log_id: int) -> Optional[models.MacroTotals]:
+    return await db.run_sync(crud.get_macro_totals, daily_log_id)
+
+
+async def refresh_macro_totals_for_log(db: AsyncSession, daily_log_id: int) -> models.MacroTotals:
+    return await db.run_sync(crud.refresh_macro_totals_for_log, daily_log_id)
+
+
+async def build_daily_summaries(
+    db: AsyncSession,
+    user: models.User,
+    start_date: date,
+    end_date: date,
+) -> List[Tuple[date, int, float, float, float]]:
+    return await db.run_sync(crud.build_daily_summaries, user, start_date, end_date)
+
+
+async def apply_sync_mutations(
+    db: AsyncSession,
+    user_id: int,
+    mutations: List[schemas.SyncMutationIn],
+) -> Tuple[List[schemas.SyncMutationResult], List[models.MacroTotals]]:
+    return await db.run_sync(sync.apply_mutations, user_id, mutations)
+
+
+async def list_changes(db: AsyncSession, user_id: int, since: int, limit: int) -> schemas.ChangeFeedOut:
+    return await db.run_sync(changes.list_changes, user_id, since, limit)
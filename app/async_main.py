@@ -0,0 +1,398 @@
+"""CalorieTracker API served from async SQLAlchemy sessions.
+
+Mirrors the synchronous handlers in ``app.main``; selected by setting
+``CALORIE_TRACKER_DATABASE_MODE=async``.
+"""
+from contextlib import asynccontextmanager
+from datetime import date
+from typing import List, Optional
+
+from fastapi import Depends, FastAPI, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import async_crud, changes, crud, models, schemas
+from .cache import UserCache, user_cache
+from .database import Base, create_async_sessionmaker, upgrade_schema
+from .events import stream_macro_totals
+
+async_engine, AsyncSessionLocal = create_async_sessionmaker()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    async with async_engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(upgrade_schema, Base.metadata)
+    yield
+    await async_engine.dispose()
+
+
+app = FastAPI(title="CalorieTracker API", lifespan=lifespan)
+
+
+async def get_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def get_user_cache() -> UserCache:
+    return user_cache
+
+
+async def get_user_or_404(
+    user_id: int,
+    db: AsyncSession = Depends(get_db),
+    cache: UserCache = Depends(get_user_cache),
+) -> models.User:
+    user = await async_crud.get_cached_user(db, cache, user_id)
+    if user is None:
+        user = await async_crud.get_user(db, user_id)
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        cache.put(user)
+    return user
+
+
+async def _get_user_and_daily_log(db: AsyncSession, cache: UserCache, user_id: int, log_date: date):
+    user = await async_crud.get_cached_user(db, cache, user_id)
+    if user is not None:
+        return user, await async_crud.get_daily_log(db, user_id, log_date)
+    user, log = await async_crud.get_user_with_daily_log(db, user_id, log_date)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    cache.put(user)
+    return user, log
+
+
+@app.post("/users", response_model=schemas.UserOut)
+async def create_user(user: schemas.UserCreate, db: AsyncSession = Depends(get_db)):
+    existing = await async_crud.get_user_by_email(db, user.email)
+    if existing:
+        raise HTTPException(status_code=400, detail="Email already registered")
+    timezone = crud.resolve_timezone(user.timezone, "UTC")
+    return await async_crud.create_user(db, user.name, user.email, timezone)
+
+
+@app.get("/users", response_model=List[schemas.UserOut])
+async def list_users(db: AsyncSession = Depends(get_db)):
+    return await async_crud.list_users(db)
+
+
+@app.get("/users/{user_id}", response_model=schemas.UserOut)
+async def get_user(user: models.User = Depends(get_user_or_404)):
+    return user
+
+
+@app.put("/users/{user_id}", response_model=schemas.UserOut)
+async def update_user(user_id: int, update: schemas.UserUpdate, db: AsyncSession = Depends(get_db)):
+    user = await async_crud.get_user(db, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    updates = update.dict(exclude_unset=True)
+    if "timezone" in updates:
+        updates["timezone"] = crud.resolve_timezone(updates["timezone"], user.timezone)
+    return await async_crud.update_user(db, user, updates)
+
+
+@app.delete("/users/{user_id}")
+async def delete_user(user_id: int, db: AsyncSession = Depends(get_db)):
+    user = await async_crud.get_user(db, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    await async_crud.delete_user(db, user)
+    return {"status": "deleted"}
+
+
+@app.get("/users/{user_id}/goals", response_model=schemas.GoalConfigOut)
+async def get_goals(
+    user_id: int,
+    user: models.User = Depends(get_user_or_404),
+    db: AsyncSession = Depends(get_db),
+):
+    goal = await async_crud.get_goal_config(db, user_id)
+    if not goal:
+        raise HTTPException(status_code=404, detail="Goal config not found")
+    return goal
+
+
+@app.put("/users/{user_id}/goals", response_model=schemas.GoalConfigOut)
+async def upsert_goals(
+    user_id: int,
+    payload: schemas.GoalConfigCreate,
+    user: models.User = Depends(get_user_or_404),
+    db: AsyncSession = Depends(get_db),
+):
+    return await async_crud.upsert_goal_config(db, user_id, payload.dict(exclude_unset=True))
+
+
+@app.delete("/users/{user_id}/goals")
+async def delete_goals(user_id: int, db: AsyncSession = Depends(get_db)):
+    goal = await async_crud.get_goal_config(db, user_id)
+    if not goal:
+        raise HTTPException(status_code=404, detail="Goal config not found")
+    await async_crud.delete_goal_config(db, goal)
+    return {"status": "deleted"}
+
+
+@app.get("/users/{user_id}/daily-logs", response_model=List[schemas.DailyLogOut])
+async def list_daily_logs(
+    user_id: int,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    user: models.User = Depends(get_user_or_404),
+    db: AsyncSession = Depends(get_db),
+):
+    return await async_crud.list_daily_logs(db, user_id, start_date, end_date)
+
+
+@app.post("/users/{user_id}/daily-logs", response_model=schemas.DailyLogOut)
+async def create_daily_log(
+    user_id: int,
+    payload: schemas.DailyLogCreate,
+    db: AsyncSession = Depends(get_db),
+    cache: UserCache = Depends(get_user_cache),
+):
+    user, existing = await _get_user_and_daily_log(db, cache, user_id, payload.log_date)
+    timezone = crud.resolve_timezone(payload.timezone, user.timezone)
+    return await async_crud.save_daily_log(db, user, payload.log_date, timezone, existing)
+
+
+@app.get("/users/{user_id}/daily-logs/{log_date}", response_model=schemas.DailyLogOut)
+async def get_daily_log(user_id: int, log_date: date, db: AsyncSession = Depends(get_db)):
+    log = await async_crud.get_daily_log(db, user_id, log_date)
+    if not log:
+        raise HTTPException(status_code=404, detail="Daily log not found")
+    return log
+
+
+@app.put("/users/{user_id}/daily-logs/{log_date}", response_model=schemas.DailyLogOut)
+async def upsert_daily_log(
+    user_id: int,
+    log_date: date,
+    payload: schemas.DailyLogCreate,
+    db: AsyncSession = Depends(get_db),
+    cache: UserCache = Depends(get_user_cache),
+):
+    user, existing = await _get_user_and_daily_log(db, cache, user_id, log_date)
+    timezone = crud.resolve_timezone(payload.timezone, user.timezone)
+    return await async_crud.save_daily_log(db, user, log_date, timezone, existing)
+
+
+@app.delete("/users/{user_id}/daily-logs/{log_date}")
+async def delete_daily_log(user_id: int, log_date: date, db: AsyncSession = Depends(get_db)):
+    log = await async_crud.get_daily_log(db, user_id, log_date)
+    if not log:
+        raise HTTPException(status_code=404, detail="Daily log not found")
+    await async_crud.delete_daily_log(db, log)
+    return {"status": "deleted"}
+
+
+@app.get("/daily-logs/{daily_log_id}/meals", response_model=List[schemas.MealOut])
+async def list_meals(daily_log_id: int, db: AsyncSession = Depends(get_db)):
+    return await async_crud.list_meals(db, daily_log_id)
+
+
+@app.post("/daily-logs/{daily_log_id}/meals", response_model=schemas.MealOut)
+async def create_meal(daily_log_id: int, payload: schemas.MealCreate, db: AsyncSession = Depends(get_db)):
+    daily_log = await async_crud.get_daily_log_by_id(db, daily_log_id)
+    if not daily_log:
+        raise HTTPException(status_code=404, detail="Daily log not found")
+    return await async_crud.create_meal(db, daily_log, payload.dict(exclude_unset=True))
+
+
+@app.get("/meals/{meal_id}", response_model=schemas.MealOut)
+async def get_meal(meal_id: int, db: AsyncSession = Depends(get_db)):
+    meal = await async_crud.get_meal(db, meal_id)
+    if not meal:
+        raise HTTPException(status_code=404, detail="Meal not found")
+    return meal
+
+
+@app.put("/meals/{meal_id}", response_model=schemas.MealOut)
+async def update_meal(meal_id: int, payload: schemas.MealCreate, db: AsyncSession = Depends(get_db)):
+    meal = await async_crud.get_meal(db, meal_id)
+    if not meal:
+        raise HTTPException(status_code=404, detail="Meal not found")
+    return await async_crud.update_meal(db, meal, payload.dict(exclude_unset=True))
+
+
+@app.delete("/meals/{meal_id}")
+async def delete_meal(meal_id: int, db: AsyncSession = Depends(get_db)):
+    meal = await async_crud.get_meal(db, meal_id)
+    if not meal:
+        raise HTTPException(status_code=404, detail="Meal not found")
+    await async_crud.delete_meal(db, meal)
+    return {"status": "deleted"}
+
+
+@app.get("/meals/{meal_id}/food-items", response_model=List[schemas.FoodItemOut])
+async def list_food_items(meal_id: int, db: AsyncSession = Depends(get_db)):
+    return await async_crud.list_food_items(db, meal_id)
+
+
+@app.post("/meals/{meal_id}/food-items", response_model=schemas.FoodItemOut)
+async def create_food_item(meal_id: int, payload: schemas.FoodItemCreate, db: AsyncSession = Depends(get_db)):
+    meal = await async_crud.get_meal(db, meal_id)
+    if not meal:
+        raise HTTPException(status_code=404, detail="Meal not found")
+    return await async_crud.create_food_item(db, meal, payload.dict(exclude_unset=True))
+
+
+@app.get("/food-items/{item_id}", response_model=schemas.FoodItemOut)
+async def get_food_item(item_id: int, db: AsyncSession = Depends(get_db)):
+    item = await async_crud.get_food_item(db, item_id)
+    if not item:
+        raise HTTPException(status_code=404, detail="Food item not found")
+    return item
+
+
+@app.put("/food-items/{item_id}", response_model=schemas.FoodItemOut)
+async def update_food_item(item_id: int, payload: schemas.FoodItemCreate, db: AsyncSession = Depends(get_db)):
+    item = await async_crud.get_food_item(db, item_id)
+    if not item:
+        raise HTTPException(status_code=404, detail="Food item not found")
+    return await async_crud.update_food_item(db, item, payload.dict(exclude_unset=True))
+
+
+@app.delete("/food-items/{item_id}")
+async def delete_food_item(item_id: int, db: AsyncSession = Depends(get_db)):
+    item = await async_crud.get_food_item(db, item_id)
+    if not item:
+        raise HTTPException(status_code=404, detail="Food item not found")
+    await async_crud.delete_food_item(db, item)
+    return {"status": "deleted"}
+
+
+@app.get("/daily-logs/{daily_log_id}/macro-totals", response_model=schemas.MacroTotalsOut)
+async def get_macro_totals(daily_log_id: int, db: AsyncSession = Depends(get_db)):
+    totals = await async_crud.get_macro_totals(db, daily_log_id)
+    if not totals:
+        totals = await async_crud.refresh_macro_totals_for_log(db, daily_log_id)
+    return totals
+
+
+@app.get("/users/{user_id}/macro-totals/stream")
+async def stream_user_macro_totals(user_id: int):
+    async with AsyncSessionLocal() as db:
+        user = await async_crud.get_cached_user(db, user_cache, user_id)
+        if user is None and not await async_crud.get_user(db, user_id):
+            raise HTTPException(status_code=404, detail="User not found")
+    return StreamingResponse(
+        stream_macro_totals(user_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/users/{user_id}/weight-entries", response_model=List[schemas.WeightEntryOut])
+async def list_weight_entries(
+    user_id: int,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    user: models.User = Depends(get_user_or_404),
+    db: AsyncSession = Depends(get_db),
+):
+    return await async_crud.list_weight_entries(db, user_id, start_date, end_date)
+
+
+@app.post("/users/{user_id}/weight-entries", response_model=schemas.WeightEntryOut)
+async def create_weight_entry(
+    user_id: int,
+    payload: schemas.WeightEntryCreate,
+    user: models.User = Depends(get_user_or_404),
+    db: AsyncSession = Depends(get_db),
+):
+    return await async_crud.upsert_weight_entry(
+        db,
+        user_id,
+        payload.entry_date,
+        {"weight": payload.weight, "note": payload.note},
+    )
+
+
+@app.get("/weight-entries/{entry_id}", response_model=schemas.WeightEntryOut)
+async def get_weight_entry(entry_id: int, db: AsyncSession = Depends(get_db)):
+    entry = await async_crud.get_weight_entry(db, entry_id)
+    if not entry:
+        raise HTTPException(status_code=404, detail="Weight entry not found")
+    return entry
+
+
+@app.put("/weight-entries/{entry_id}", response_model=schemas.WeightEntryOut)
+async def update_weight_entry(entry_id: int, payload: schemas.WeightEntryCreate, db: AsyncSession = Depends(get_db)):
+    entry = await async_crud.get_weight_entry(db, entry_id)
+    if not entry:
+        raise HTTPException(status_code=404, detail="Weight entry not found")
+    updates = {"entry_date": payload.entry_date, "weight": payload.weight, "note": payload.note}
+    return await async_crud.update_weight_entry(db, entry, updates)
+
+
+@app.delete("/weight-entries/{entry_id}")
+async def delete_weight_entry(entry_id: int, db: AsyncSession = Depends(get_db)):
+    entry = await async_crud.get_weight_entry(db, entry_id)
+    if not entry:
+        raise HTTPException(status_code=404, detail="Weight entry not found")
+    await async_crud.delete_weight_entry(db, entry)
+    return {"status": "deleted"}
+
+
+@app.get("/users/{user_id}/summaries", response_model=schemas.SummaryResponse)
+async def get_summaries(
+    user_id: int,
+    start_date: date,
+    end_date: date,
+    timezone: Optional[str] = None,
+    user: models.User = Depends(get_user_or_404),
+    db: AsyncSession = Depends(get_db),
+):
+    tz = crud.resolve_timezone(timezone, user.timezone)
+    daily = await async_crud.build_daily_summaries(db, user, start_date, end_date)
+    weekly = crud.build_weekly_summaries(daily, tz)
+    daily_payload = [
+        schemas.DailySummary(
+            log_date=item[0],
+            calories_total=item[1],
+            protein_total=item[2],
+            carbs_total=item[3],
+            fat_total=item[4],
+        )
+        for item in daily
+    ]
+    weekly_payload = [
+        schemas.WeeklySummary(
+            week_start=item[0],
+            week_end=item[1],
+            calories_total=item[2],
+            protein_total=item[3],
+            carbs_total=item[4],
+            fat_total=item[5],
+        )
+        for item in weekly
+    ]
+    return schemas.SummaryResponse(daily=daily_payload, weekly=weekly_payload)
+
+
+@app.post("/users/{user_id}/sync", response_model=schemas.SyncResponse)
+async def sync_mutations(
+    user_id: int,
+    payload: schemas.SyncRequest,
+    user: models.User = Depends(get_user_or_404),
+    db: AsyncSession = Depends(get_db),
+):
+    results, totals = await async_crud.apply_sync_mutations(db, user_id, payload.mutations)
+    return schemas.SyncResponse(results=results, macro_totals=totals)
+
+
+@app.get("/users/{user_id}/changes", response_model=schemas.ChangeFeedOut)
+async def list_changes(
+    user_id: int,
+    since: int = 0,
+    limit: int = Query(changes.CHANGE_FEED_PAGE, ge=1, le=changes.CHANGE_FEED_PAGE),
+    user: models.User = Depends(get_user_or_404),
+    db: AsyncSession = Depends(get_db),
+):
+    try:
+        return await async_crud.list_changes(db, user_id, since, limit)
+    except changes.CursorExpiredError as exc:
+        raise HTTPException(status_code=410, detail={"message": str(exc), "cursor": exc.cursor})
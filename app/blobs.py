@@ -0,0 +1,198 @@
+"""Content-addressed store for photo bytes.
+
+Blobs live at ``blobs/ab/cd/<sha256>`` so no directory grows past a few
+thousand entries. A photo uploaded twice is written once: each photo log holds
+a reference (optionally tagged with the owning account) in a small SQLite
+table, and a blob is unlinked when its last reference is released. Writes go
+to a temp file that is fsynced and renamed into place, so readers never see a
+partial blob. Only the rename and the reference update hold the store's lock,
+so uploads of different photos are written in parallel.
+
+``BlobResponse`` serves a blob without reading it into Python buffers: the
+server sends the file itself when it offers the ASGI ``pathsend`` extension,
+and otherwise the body is handed over as slices of the blob's mmap, so the
+socket writes straight from the page cache.
+"""
+import mmap
+import os
+import sqlite3
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from starlette.responses import Response
+
+from .storage import DATA_DIR
+
+BLOB_DIR = DATA_DIR / "blobs"
+BLOB_INDEX = "refs.sqlite3"
+# Bytes of the mapping handed to the server per body message.
+BLOB_SEND_CHUNK = 1024 * 1024
+
+
+class BlobStore:
+    def __init__(self, directory: Path = BLOB_DIR) -> None:
+        self.directory = Path(directory)
+        self.puts = 0
+        self.deduplicated = 0
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    def path_for(self, digest: str) -> Path:
+        return self.directory / digest[:2] / digest[2:4] / digest
+
+    def exists(self, digest: str) -> bool:
+        return self.path_for(digest).exists()
+
+    def put(self, digest: str, chunks: Iterable[bytes], ref: str, owner: Optional[str] = None) -> bool:
+        """Store the bytes of ``digest`` unless present and add ``ref``; True if written."""
+        path = self.path_for(digest)
+        tmp_name = None
+        try:
+            while True:
+                if tmp_name is None and not path.exists():
+                    tmp_name = self._write_temp(path, chunks)
+                with self._lock:
+                    created = not path.exists()
+                    if created and tmp_name is None:
+                        # Its last reference was released since the check above.
+                        continue
+                    if created:
+                        os.replace(tmp_name, path)
+                        tmp_name = None
+                    # Otherwise an upload of the same photo renamed first: a duplicate after all.
+                    db = self._db()
+                    db.execute(
+                        "INSERT OR REPLACE INTO blob_refs (ref, digest, owner) VALUES (?, ?, ?)", (ref, digest, owner)
+                    )
+                    db.commit()
+                    self.puts += 1
+                    self.deduplicated += not created
+                    return created
+        finally:
+            if tmp_name is not None:
+                os.unlink(tmp_name)
+
+    def digest_for(self, ref: str) -> Optional[str]:
+        with self._lock:
+            row = self._db().execute("SELECT digest FROM blob_refs WHERE ref = ?", (ref,)).fetchone()
+        return row[0] if row else None
+
+    def refcount(self, digest: str) -> int:
+        with self._lock:
+            return self._db().execute("SELECT COUNT(*) FROM blob_refs WHERE digest = ?", (digest,)).fetchone()[0]
+
+    @contextmanager
+    def open(self, digest: str) -> Iterator[memoryview]:
+        """Read-only memoryview over a blob, backed by mmap."""
+        with self.path_for(digest).open("rb") as handle:
+            with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                with memoryview(mapped) as view:
+                    yield view
+
+    def release(self, ref: str) -> List[str]:
+        """Drop one photo's reference; returns the digests whose blobs were deleted."""
+        with self._lock:
+            return self._release("ref = ?", (ref,))
+
+    def release_owner(self, owner: str) -> List[str]:
+        """Drop every reference held by an account; returns the deleted digests."""
+        with self._lock:
+            return self._release("owner = ?", (owner,))
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            blobs, refs = self._db().execute("SELECT COUNT(DISTINCT digest), COUNT(*) FROM blob_refs").fetchone()
+        return {"blobs": blobs, "refs": refs, "puts": self.puts, "deduplicated": self.deduplicated}
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _release(self, where: str, params) -> List[str]:
+        db = self._db()
+        digests = [row[0] for row in db.execute(f"SELECT DISTINCT digest FROM blob_refs WHERE {where}", params)]
+        db.execute(f"DELETE FROM blob_refs WHERE {where}", params)
+        db.commit()
+        deleted = []
+        for digest in digests:
+            if db.execute("SELECT 1 FROM blob_refs WHERE digest = ? LIMIT 1", (digest,)).fetchone() is None:
+                self.path_for(digest).unlink(missing_ok=True)
+                deleted.append(digest)
+        return deleted
+
+    def _write_temp(self, path: Path, chunks: Iterable[bytes]) -> str:
+        """Write and fsync ``chunks`` to a temp file beside ``path``; returns its name."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as handle:
+                for chunk in chunks:
+                    handle.write(chunk)
+                handle.flush()
+                os.fsync(handle.fileno())
+        except BaseException:
+            os.unlink(tmp_name)
+            raise
+        return tmp_name
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.directory / BLOB_INDEX, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS blob_refs (ref TEXT PRIMARY KEY, digest TEXT NOT NULL, owner TEXT)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS blob_refs_digest ON blob_refs (digest)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS blob_refs_owner ON blob_refs (owner)")
+        return self._conn
+
+
+blob_store = BlobStore()
+
+
+class BlobResponse(Response):
+    """Response whose body is a stored blob, sent without copying it into Python."""
+
+    def __init__(self, path: Path, digest: str, media_type: Optional[str] = None) -> None:
+        self.path = path
+        self.status_code = 200
+        self.media_type = media_type
+        self.background = None
+        self.init_headers({"etag": f'"{digest}"', "content-length": str(path.stat().st_size)})
+
+    async def __call__(self, scope, receive, send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope["method"] == "HEAD":
+            await send({"type": "http.response.body", "body": b""})
+        elif "http.response.pathsend" in scope.get("extensions", {}):
+            await send({"type": "http.response.pathsend", "path": str(self.path)})
+        else:
+            await self._send_mapped(send)
+
+    async def _send_mapped(self, send) -> None:
+        with self.path.open("rb") as handle:
+            size = os.fstat(handle.fileno()).st_size
+            if not size:
+                await send({"type": "http.response.body", "body": b""})
+                return
+            mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        # Start readahead so the first slices do not fault page by page on the event loop.
+        mapped.madvise(mmap.MADV_WILLNEED)
+        view = memoryview(mapped)
+        try:
+            for start in range(0, size, BLOB_SEND_CHUNK):
+                end = min(start + BLOB_SEND_CHUNK, size)
+                await send({"type": "http.response.body", "body": view[start:end], "more_body": end < size})
+        finally:
+            try:
+                view.release()
+                mapped.close()
+            except BufferError:
+                # The transport still holds an unsent slice; the mapping closes once it lets go.
+                pass
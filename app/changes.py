@@ -0,0 +1,168 @@
+"""Per-user change feed used by clients to pull deltas since a cursor.
+
+``crud`` appends a :class:`models.ChangeLogEntry` for every mutation. Reading
+the feed coalesces a page of entries into one change per row and attaches the
+row's current state; compaction drops entries past the retention window and
+remembers how far it went so stale cursors get a clean "resync" answer.
+Cursors are ids, so both are tracked per id bucket (see ``app.sharding``);
+outside sharded mode every id falls in bucket 0.
+"""
+import argparse
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from . import models, schemas
+from .crud import DELETE, INSERT, UPDATE
+from .sharding import ID_BITS, bucket_of, id_range
+
+CHANGE_LOG_RETENTION_DAYS = 30
+CHANGE_FEED_PAGE = 500
+
+ENTITIES = {
+    "user": (models.User, schemas.UserOut),
+    "goal_config": (models.GoalConfig, schemas.GoalConfigOut),
+    "daily_log": (models.DailyLog, schemas.DailyLogOut),
+    "meal": (models.Meal, schemas.MealOut),
+    "food_item": (models.FoodItem, schemas.FoodItemOut),
+    "macro_totals": (models.MacroTotals, schemas.MacroTotalsOut),
+    "weight_entry": (models.WeightEntry, schemas.WeightEntryOut),
+}
+
+
+class CursorExpiredError(LookupError):
+    def __init__(self, cursor: int):
+        super().__init__("Cursor predates the retained change log")
+        self.cursor = cursor
+
+
+def head_cursor(db: Session, user_id: int) -> int:
+    latest = (
+        db.query(func.max(models.ChangeLogEntry.id))
+        .filter(models.ChangeLogEntry.user_id == user_id)
+        .scalar()
+    )
+    return latest or _compacted_through(db, bucket_of(user_id))
+
+
+def _checkpoint(db: Session, bucket: int) -> Optional[models.ChangeLogCheckpoint]:
+    ids = id_range(bucket)
+    return (
+        db.query(models.ChangeLogCheckpoint)
+        .filter(models.ChangeLogCheckpoint.id >= ids.start, models.ChangeLogCheckpoint.id < ids.stop)
+        .first()
+    )
+
+
+def _compacted_through(db: Session, bucket: int) -> int:
+    checkpoint = _checkpoint(db, bucket)
+    return checkpoint.compacted_through if checkpoint else 0
+
+
+def list_changes(
+    db: Session,
+    user_id: int,
+    since: int = 0,
+    limit: int = CHANGE_FEED_PAGE,
+) -> schemas.ChangeFeedOut:
+    if since < _compacted_through(db, bucket_of(user_id)):
+        raise CursorExpiredError(head_cursor(db, user_id))
+    entries = (
+        db.query(models.ChangeLogEntry)
+        .filter(models.ChangeLogEntry.user_id == user_id, models.ChangeLogEntry.id > since)
+        .order_by(models.ChangeLogEntry.id)
+        .limit(limit + 1)
+        .all()
+    )
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    latest: Dict[Tuple[str, int], Tuple[int, str, bool]] = {}
+    for entry in entries:
+        key = (entry.entity, entry.entity_id)
+        inserted = entry.op == INSERT or (key in latest and latest[key][2])
+        latest[key] = (entry.id, entry.op, inserted)
+
+    live: Dict[str, List[int]] = {}
+    for (entity, entity_id), (_, op, _) in latest.items():
+        if op != DELETE and entity in ENTITIES:
+            live.setdefault(entity, []).append(entity_id)
+    rows: Dict[Tuple[str, int], Dict] = {}
+    for entity, ids in live.items():
+        model, schema = ENTITIES[entity]
+        for row in db.query(model).filter(model.id.in_(ids)).all():
+            rows[(entity, row.id)] = schema.from_orm(row).dict()
+
+    changes: List[schemas.ChangeOut] = []
+    for key, (cursor, op, inserted) in sorted(latest.items(), key=lambda item: item[1][0]):
+        data: Optional[Dict] = rows.get(key)
+        if op == DELETE or data is None:
+            if inserted:
+                # Created and removed inside this page: the client never saw it.
+                continue
+            op, data = DELETE, None
+        else:
+            op = INSERT if inserted else UPDATE
+        changes.append(schemas.ChangeOut(cursor=cursor, entity=key[0], entity_id=key[1], op=op, data=data))
+
+    cursor = entries[-1].id if entries else since
+    return schemas.ChangeFeedOut(changes=changes, cursor=cursor, has_more=has_more)
+
+
+def compact_change_log(
+    db: Session,
+    retention: timedelta = timedelta(days=CHANGE_LOG_RETENTION_DAYS),
+    now: Optional[datetime] = None,
+) -> int:
+    cutoff = (now or datetime.utcnow()) - retention
+    bucket = models.ChangeLogEntry.id.op(">>")(ID_BITS)
+    expired = (
+        db.query(bucket, func.max(models.ChangeLogEntry.id))
+        .filter(models.ChangeLogEntry.changed_at < cutoff)
+        .group_by(bucket)
+        .all()
+    )
+    removed = 0
+    for bucket_id, through in expired:
+        ids = id_range(bucket_id)
+        removed += (
+            db.query(models.ChangeLogEntry)
+            .filter(models.ChangeLogEntry.id >= ids.start, models.ChangeLogEntry.id <= through)
+            .delete(synchronize_session=False)
+        )
+        checkpoint = _checkpoint(db, bucket_id)
+        if checkpoint is None:
+            db.add(models.ChangeLogCheckpoint(id=ids.start, compacted_through=through))
+        else:
+            checkpoint.compacted_through = max(checkpoint.compacted_through, through)
+            checkpoint.compacted_at = datetime.utcnow()
+    db.commit()
+    return removed
+
+
+def main() -> None:
+    from .database import Base, SessionLocal, create_schema, engine, shard_router
+
+    parser = argparse.ArgumentParser(description="Change feed maintenance")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    compact_parser = subparsers.add_parser("compact", help="Drop change-log entries past retention")
+    compact_parser.add_argument("--retention-days", type=int, default=CHANGE_LOG_RETENTION_DAYS)
+    args = parser.parse_args()
+
+    if args.command == "compact":
+        if shard_router is not None:
+            shard_router.create_all(Base.metadata)
+        else:
+            create_schema(Base.metadata, engine)
+        db = SessionLocal()
+        try:
+            removed = compact_change_log(db, timedelta(days=args.retention_days))
+        finally:
+            db.close()
+        print(f"Removed {removed} change-log entries")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,56 @@
 from collections import defaultdict
-from datetime import date, timedelta
+from datetime import date, datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 
-from sqlalchemy import func
+from sqlalchemy import and_, event, func
 from sqlalchemy.orm import Session
 from zoneinfo import ZoneInfo
 
-from . import models
+from . import models, schemas
+from .cache import user_cache
+from .events import macro_totals_hub
+from .sharding import bulk_insert
+
+INSERT = "insert"
+UPDATE = "update"
+DELETE = "delete"
+PENDING_CHANGES = "pending_changes"
+PENDING_TOTALS = "pending_macro_totals"
+
+
+def record_change(db: Session, user_id: int, entity: str, entity_id: int, op: str) -> None:
+    """Queue a change-feed entry; callers flush first so inserted rows have ids.
+
+    Entries are written in a single executemany when the transaction commits.
+    """
+    db.info.setdefault(PENDING_CHANGES, []).append(
+        {
+            "user_id": user_id,
+            "entity": entity,
+            "entity_id": entity_id,
+            "op": op,
+            "changed_at": datetime.utcnow(),
+        }
+    )
+
+
+@event.listens_for(Session, "before_commit")
+def _write_pending_changes(db: Session) -> None:
+    pending = db.info.pop(PENDING_CHANGES, None)
+    if pending:
+        bulk_insert(db, models.ChangeLogEntry.__table__, pending)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_macro_totals(db: Session) -> None:
+    for user_id, payload in db.info.pop(PENDING_TOTALS, ()):
+        macro_totals_hub.publish(user_id, payload)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_pending_changes(db: Session, previous_transaction) -> None:
+    db.info.pop(PENDING_CHANGES, None)
+    db.info.pop(PENDING_TOTALS, None)
 
 
 def get_user(db: Session, user_id: int) -> Optional[models.User]:
@@ -24,6 +68,8 @@ def list_users(db: Session) -> List[models.User]:
 def create_user(db: Session, name: str, email: str, timezone: str) -> models.User:
     user = models.User(name=name, email=email, timezone=timezone)
     db.add(user)
+    db.flush()
+    record_change(db, user.id, "user", user.id, INSERT)
     db.commit()
     db.refresh(user)
     return user
@@ -32,14 +78,21 @@ def create_user(db: Session, name: str, email: str, timezone: str) -> models.Use
 def update_user(db: Session, user: models.User, updates: Dict) -> models.User:
     for key, value in updates.items():
         setattr(user, key, value)
+    record_change(db, user.id, "user", user.id, UPDATE)
     db.commit()
+    user_cache.invalidate(user.id)
     db.refresh(user)
     return user
 
 
 def delete_user(db: Session, user: models.User) -> None:
+    user_id = user.id
     db.delete(user)
+    db.query(models.ChangeLogEntry).filter(models.ChangeLogEntry.user_id == user_id).delete(
+        synchronize_session=False
+    )
     db.commit()
+    user_cache.invalidate(user_id)
 
 
 def get_goal_config(db: Session, user_id: int) -> Optional[models.GoalConfig]:
@@ -51,15 +104,20 @@ def upsert_goal_config(db: Session, user_id: int, updates: Dict) -> models.GoalC
     if goal:
         for key, value in updates.items():
             setattr(goal, key, value)
+        op = UPDATE
     else:
         goal = models.GoalConfig(user_id=user_id, **updates)
         db.add(goal)
+        db.flush()
+        op = INSERT
+    record_change(db, user_id, "goal_config", goal.id, op)
     db.commit()
     db.refresh(goal)
     return goal
 
 
 def delete_goal_config(db: Session, goal: models.GoalConfig) -> None:
+    record_change(db, goal.user_id, "goal_config", goal.id, DELETE)
     db.delete(goal)
     db.commit()
 
@@ -72,6 +130,29 @@ def get_daily_log(db: Session, user_id: int, log_date: date) -> Optional[models.
     )
 
 
+def get_daily_log_by_id(db: Session, daily_log_id: int) -> Optional[models.DailyLog]:
+    return db.query(models.DailyLog).filter(models.DailyLog.id == daily_log_id).first()
+
+
+def get_user_with_daily_log(
+    db: Session,
+    user_id: int,
+    log_date: date,
+) -> Tuple[Optional[models.User], Optional[models.DailyLog]]:
+    row = (
+        db.query(models.User, models.DailyLog)
+        .outerjoin(
+            models.DailyLog,
+            and_(models.DailyLog.user_id == models.User.id, models.DailyLog.log_date == log_date),
+        )
+        .filter(models.User.id == user_id)
+        .first()
+    )
+    if row is None:
+        return None, None
+    return row[0], row[1]
+
+
 def list_daily_logs(
     db: Session,
     user_id: int,
@@ -93,20 +174,41 @@ def upsert_daily_log(
     timezone: str,
 ) -> models.DailyLog:
     existing = get_daily_log(db, user.id, log_date)
+    return save_daily_log(db, user, log_date, timezone, existing)
+
+
+def save_daily_log(
+    db: Session,
+    user: models.User,
+    log_date: date,
+    timezone: str,
+    existing: Optional[models.DailyLog],
+) -> models.DailyLog:
     if existing:
-        existing.timezone = timezone
-        db.commit()
-        db.refresh(existing)
+        if existing.timezone != timezone:
+            existing.timezone = timezone
+            record_change(db, user.id, "daily_log", existing.id, UPDATE)
+            db.commit()
+            db.refresh(existing)
         return existing
-    daily_log = models.DailyLog(user_id=user.id, log_date=log_date, timezone=timezone)
+    daily_log = models.DailyLog(
+        user_id=user.id,
+        log_date=log_date,
+        timezone=timezone,
+        macro_totals=models.MacroTotals(),
+    )
     db.add(daily_log)
+    db.flush()
+    record_change(db, user.id, "daily_log", daily_log.id, INSERT)
+    record_change(db, user.id, "macro_totals", daily_log.macro_totals.id, INSERT)
     db.commit()
     db.refresh(daily_log)
-    ensure_macro_totals(db, daily_log)
     return daily_log
 
 
 def delete_daily_log(db: Session, daily_log: models.DailyLog) -> None:
+    # Meals, food items and totals cascade with the log; clients drop them too.
+    record_change(db, daily_log.user_id, "daily_log", daily_log.id, DELETE)
     db.delete(daily_log)
     db.commit()
 
@@ -114,6 +216,8 @@ def delete_daily_log(db: Session, daily_log: models.DailyLog) -> None:
 def create_meal(db: Session, daily_log: models.DailyLog, data: Dict) -> models.Meal:
     meal = models.Meal(daily_log_id=daily_log.id, **data)
     db.add(meal)
+    db.flush()
+    record_change(db, daily_log.user_id, "meal", meal.id, INSERT)
     db.commit()
     db.refresh(meal)
     return meal
@@ -130,6 +234,7 @@ def list_meals(db: Session, daily_log_id: int) -> List[models.Meal]:
 def update_meal(db: Session, meal: models.Meal, updates: Dict) -> models.Meal:
     for key, value in updates.items():
         setattr(meal, key, value)
+    record_change(db, meal.daily_log.user_id, "meal", meal.id, UPDATE)
     db.commit()
     db.refresh(meal)
     return meal
@@ -137,17 +242,22 @@ def update_meal(db: Session, meal: models.Meal, updates: Dict) -> models.Meal:
 
 def delete_meal(db: Session, meal: models.Meal) -> None:
     daily_log_id = meal.daily_log_id
+    user_id = meal.daily_log.user_id
+    record_change(db, user_id, "meal", meal.id, DELETE)
     db.delete(meal)
     db.commit()
-    refresh_macro_totals_for_log(db, daily_log_id)
+    refresh_macro_totals_for_log(db, daily_log_id, user_id)
 
 
 def create_food_item(db: Session, meal: models.Meal, data: Dict) -> models.FoodItem:
     item = models.FoodItem(meal_id=meal.id, **data)
+    user_id = meal.daily_log.user_id
     db.add(item)
+    db.flush()
+    record_change(db, user_id, "food_item", item.id, INSERT)
     db.commit()
     db.refresh(item)
-    refresh_macro_totals_for_log(db, meal.daily_log_id)
+    refresh_macro_totals_for_log(db, meal.daily_log_id, user_id)
     return item
 
 
@@ -162,17 +272,21 @@ def list_food_items(db: Session, meal_id: int) -> List[models.FoodItem]:
 def update_food_item(db: Session, item: models.FoodItem, updates: Dict) -> models.FoodItem:
     for key, value in updates.items():
         setattr(item, key, value)
+    user_id = item.meal.daily_log.user_id
+    record_change(db, user_id, "food_item", item.id, UPDATE)
     db.commit()
     db.refresh(item)
-    refresh_macro_totals_for_log(db, item.meal.daily_log_id)
+    refresh_macro_totals_for_log(db, item.meal.daily_log_id, user_id)
     return item
 
 
 def delete_food_item(db: Session, item: models.FoodItem) -> None:
     daily_log_id = item.meal.daily_log_id
+    user_id = item.meal.daily_log.user_id
+    record_change(db, user_id, "food_item", item.id, DELETE)
     db.delete(item)
     db.commit()
-    refresh_macro_totals_for_log(db, daily_log_id)
+    refresh_macro_totals_for_log(db, daily_log_id, user_id)
 
 
 def get_weight_entry(db: Session, entry_id: int) -> Optional[models.WeightEntry]:
@@ -202,11 +316,14 @@ def upsert_weight_entry(db: Session, user_id: int, entry_date: date, updates: Di
     if existing:
         for key, value in updates.items():
             setattr(existing, key, value)
+        record_change(db, user_id, "weight_entry", existing.id, UPDATE)
         db.commit()
         db.refresh(existing)
         return existing
     entry = models.WeightEntry(user_id=user_id, entry_date=entry_date, **updates)
     db.add(entry)
+    db.flush()
+    record_change(db, user_id, "weight_entry", entry.id, INSERT)
     db.commit()
     db.refresh(entry)
     return entry
@@ -215,16 +332,26 @@ def upsert_weight_entry(db: Session, user_id: int, entry_date: date, updates: Di
 def update_weight_entry(db: Session, entry: models.WeightEntry, updates: Dict) -> models.WeightEntry:
     for key, value in updates.items():
         setattr(entry, key, value)
+    record_change(db, entry.user_id, "weight_entry", entry.id, UPDATE)
     db.commit()
     db.refresh(entry)
     return entry
 
 
 def delete_weight_entry(db: Session, entry: models.WeightEntry) -> None:
+    record_change(db, entry.user_id, "weight_entry", entry.id, DELETE)
     db.delete(entry)
     db.commit()
 
 
+def get_macro_totals(db: Session, daily_log_id: int) -> Optional[models.MacroTotals]:
+    return (
+        db.query(models.MacroTotals)
+        .filter(models.MacroTotals.daily_log_id == daily_log_id)
+        .first()
+    )
+
+
 def ensure_macro_totals(db: Session, daily_log: models.DailyLog) -> models.MacroTotals:
     totals = (
         db.query(models.MacroTotals)
@@ -235,12 +362,36 @@ def ensure_macro_totals(db: Session, daily_log: models.DailyLog) -> models.Macro
         return totals
     totals = models.MacroTotals(daily_log_id=daily_log.id)
     db.add(totals)
+    db.flush()
+    record_change(db, daily_log.user_id, "macro_totals", totals.id, INSERT)
     db.commit()
     db.refresh(totals)
     return totals
 
 
-def refresh_macro_totals_for_log(db: Session, daily_log_id: int) -> models.MacroTotals:
+def refresh_macro_totals_for_log(
+    db: Session,
+    daily_log_id: int,
+    user_id: Optional[int] = None,
+) -> models.MacroTotals:
+    totals_row = recompute_macro_totals(db, daily_log_id, user_id)
+    db.commit()
+    db.refresh(totals_row)
+    return totals_row
+
+
+def recompute_macro_totals(
+    db: Session,
+    daily_log_id: int,
+    user_id: Optional[int] = None,
+) -> models.MacroTotals:
+    """Recompute the totals row for a log inside the caller's transaction.
+
+    A change-feed entry and a live-stream event are only produced when the
+    totals actually move, so read paths such as ``build_daily_summaries`` stay
+    silent.
+    """
+    db.flush()
     totals = (
         db.query(
             func.coalesce(func.sum(models.FoodItem.calories * models.FoodItem.quantity), 0),
@@ -257,15 +408,30 @@ def refresh_macro_totals_for_log(db: Session, daily_log_id: int) -> models.Macro
         .filter(models.MacroTotals.daily_log_id == daily_log_id)
         .first()
     )
+    op = UPDATE
     if not totals_row:
         totals_row = models.MacroTotals(daily_log_id=daily_log_id)
         db.add(totals_row)
-    totals_row.calories_total = int(totals[0] or 0)
-    totals_row.protein_total = float(totals[1] or 0)
-    totals_row.carbs_total = float(totals[2] or 0)
-    totals_row.fat_total = float(totals[3] or 0)
-    db.commit()
-    db.refresh(totals_row)
+        op = INSERT
+    values = (int(totals[0] or 0), float(totals[1] or 0), float(totals[2] or 0), float(totals[3] or 0))
+    current = (totals_row.calories_total, totals_row.protein_total, totals_row.carbs_total, totals_row.fat_total)
+    if op == UPDATE and current == values:
+        return totals_row
+    (
+        totals_row.calories_total,
+        totals_row.protein_total,
+        totals_row.carbs_total,
+        totals_row.fat_total,
+    ) = values
+    db.flush()
+    if user_id is None:
+        user_id = db.query(models.DailyLog.user_id).filter(models.DailyLog.id == daily_log_id).scalar()
+    if user_id is not None:
+        record_change(db, user_id, "macro_totals", totals_row.id, op)
+        if macro_totals_hub.has_subscribers(user_id):
+            # Published from after_commit so listeners never see rolled-back totals.
+            payload = schemas.MacroTotalsOut.from_orm(totals_row).dict()
+            db.info.setdefault(PENDING_TOTALS, []).append((user_id, payload))
     return totals_row
 
 
@@ -1,7 +1,22 @@
-from sqlalchemy import create_engine
+import os
+from typing import List
+
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.orm import sessionmaker, declarative_base
 
-DATABASE_URL = "sqlite:///./calorie_tracker.db"
+DATABASE_URL = os.getenv("CALORIE_TRACKER_DATABASE_URL", "sqlite:///./calorie_tracker.db")
+# "sync" serves the API from blocking sessions on the thread pool; "async"
+# switches to the aiosqlite-backed handlers in app.async_main; "sharded" splits
+# users across CALORIE_TRACKER_SHARDS SQLite files (see app.sharding).
+DATABASE_MODE = os.getenv("CALORIE_TRACKER_DATABASE_MODE", "sync")
+ASYNC_DATABASE_URL = os.getenv(
+    "CALORIE_TRACKER_ASYNC_DATABASE_URL",
+    DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://", 1),
+)
+ASYNC_POOL_SIZE = int(os.getenv("CALORIE_TRACKER_ASYNC_POOL_SIZE", "4"))
+SQLITE_BUSY_TIMEOUT_MS = 5000
+SHARDS = int(os.getenv("CALORIE_TRACKER_SHARDS", "4"))
+SHARD_DIR = os.getenv("CALORIE_TRACKER_SHARD_DIR", "./shards")
 
 engine = create_engine(
     DATABASE_URL,
@@ -10,3 +25,106 @@ engine = create_engine(
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
+
+# Columns added to tables that earlier releases already created. ``create_all``
+# never alters an existing table, so ``create_schema`` adds them in place.
+# Rows written before the upgrade get the epoch as ``updated_at``, so any
+# synced client write is newer than them.
+COLUMN_UPGRADES = {
+    ("food_items", "updated_at"): "DATETIME NOT NULL DEFAULT '1970-01-01 00:00:00.000000'",
+    ("weight_entries", "updated_at"): "DATETIME NOT NULL DEFAULT '1970-01-01 00:00:00.000000'",
+}
+
+
+# Tables whose ids must never be reused, with the highest id already handed out
+# that may no longer be in the table.
+AUTOINCREMENT_TABLES = {
+    "change_log": "SELECT coalesce(max(compacted_through), 0) FROM change_log_checkpoint",
+}
+
+
+def _rebuild_with_autoincrement(connection, table, high_water_sql: str) -> None:
+    """Recreate ``table`` with AUTOINCREMENT, keeping its rows and never reissuing an old id."""
+    for index in inspect(connection).get_indexes(table.name):
+        connection.execute(text(f"DROP INDEX {index['name']}"))
+    connection.execute(text(f"ALTER TABLE {table.name} RENAME TO {table.name}_old"))
+    table.create(bind=connection)
+    connection.execute(text(f"INSERT INTO {table.name} SELECT * FROM {table.name}_old"))
+    connection.execute(text(f"DROP TABLE {table.name}_old"))
+    high_water = max(
+        connection.execute(text(f"SELECT coalesce(max(id), 0) FROM {table.name}")).scalar(),
+        connection.execute(text(high_water_sql)).scalar(),
+    )
+    connection.execute(text("DELETE FROM sqlite_sequence WHERE name = :name"), {"name": table.name})
+    connection.execute(
+        text("INSERT INTO sqlite_sequence (name, seq) VALUES (:name, :seq)"), {"name": table.name, "seq": high_water}
+    )
+
+
+def upgrade_schema(connection, metadata=None) -> List[str]:
+    """Add any column from ``COLUMN_UPGRADES`` an existing table lacks, and give
+    ``AUTOINCREMENT_TABLES`` created without it AUTOINCREMENT; returns what changed."""
+    inspector = inspect(connection)
+    changed = []
+    if metadata is not None and connection.dialect.name == "sqlite":
+        for name, high_water_sql in AUTOINCREMENT_TABLES.items():
+            sql = connection.execute(
+                text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": name}
+            ).scalar()
+            if sql is not None and "AUTOINCREMENT" not in sql.upper():
+                _rebuild_with_autoincrement(connection, metadata.tables[name], high_water_sql)
+                changed.append(f"{name} AUTOINCREMENT")
+    for (table, column), ddl in COLUMN_UPGRADES.items():
+        if not inspector.has_table(table):
+            continue
+        if column not in {existing["name"] for existing in inspector.get_columns(table)}:
+            connection.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+            changed.append(f"{table}.{column}")
+    return changed
+
+
+def create_schema(metadata, bind) -> None:
+    """Create missing tables, then bring tables from earlier releases up to date."""
+    metadata.create_all(bind=bind)
+    with bind.begin() as connection:
+        upgrade_schema(connection, metadata)
+
+
+shard_router = None
+if DATABASE_MODE == "sharded":
+    from .sharding import ShardRouter
+
+    shard_router = ShardRouter.open(SHARD_DIR, SHARDS)
+    SessionLocal = shard_router.sessionmaker()
+
+
+def create_async_sessionmaker(url: str = ASYNC_DATABASE_URL, pool_size: int = ASYNC_POOL_SIZE):
+    """Build the asyncio engine and session factory (requires ``aiosqlite``)."""
+    from sqlalchemy import event
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+    from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+    async_engine = create_async_engine(
+        url,
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=pool_size,
+        max_overflow=0,
+    )
+    if async_engine.dialect.name == "sqlite":
+        # WAL lets the pooled connections read while one of them writes. The
+        # driver only opens a transaction at the first write, so a writer waits
+        # on busy_timeout for the lock instead of failing a read-to-write upgrade.
+        @event.listens_for(async_engine.sync_engine, "connect")
+        def _configure_sqlite(dbapi_connection, connection_record) -> None:
+            cursor = dbapi_connection.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+            cursor.close()
+
+    factory = sessionmaker(
+        async_engine,
+        class_=AsyncSession,
+        autoflush=False,
+        expire_on_commit=False,
+    )
+    return async_engine, factory
@@ -0,0 +1,183 @@
+"""Compile ``feedback.jsonl`` into a columnar training dataset, incrementally.
+
+The dataset is a directory of flat little-endian column files that can be
+memory-mapped directly:
+
+* ``labels.i32``: index into ``vocab.json`` of each confirmed label,
+* ``portions.f32``: portion in grams,
+* ``log_ids.uuid``: the 16 raw bytes of each photo log id,
+
+plus ``manifest.json`` holding the row count and the *watermark*, the byte
+offset in ``feedback.jsonl`` up to which lines have been compiled. Each run
+reads only the tail past the watermark, appends to the columns and then
+replaces the manifest; columns are truncated back to the manifest's row count
+on open, so a crash mid-append is harmless.
+"""
+import argparse
+import json
+import mmap
+import os
+import sys
+import uuid
+from array import array
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List
+
+from .storage import DATA_DIR, FEEDBACK_FILE
+
+DATASET_DIR = DATA_DIR / "feedback_dataset"
+LABELS_FILE = "labels.i32"
+PORTIONS_FILE = "portions.f32"
+LOG_IDS_FILE = "log_ids.uuid"
+VOCAB_FILE = "vocab.json"
+MANIFEST_FILE = "manifest.json"
+UUID_BYTES = 16
+
+
+@dataclass(frozen=True)
+class CompileReport:
+    added: int
+    skipped: int
+    rows: int
+    watermark: int
+    rebuilt: bool
+
+
+def _write_json(path: Path, payload) -> None:
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    with tmp_path.open("w", encoding="utf-8") as handle:
+        json.dump(payload, handle, ensure_ascii=False)
+        handle.flush()
+        os.fsync(handle.fileno())
+    os.replace(tmp_path, path)
+
+
+def _little_endian(column: array) -> bytes:
+    if sys.byteorder != "little":
+        column = array(column.typecode, column)
+        column.byteswap()
+    return column.tobytes()
+
+
+def compile_feedback(source: Path = FEEDBACK_FILE, directory: Path = DATASET_DIR) -> CompileReport:
+    directory.mkdir(parents=True, exist_ok=True)
+    manifest_path = directory / MANIFEST_FILE
+    manifest = json.loads(manifest_path.read_text()) if manifest_path.exists() else {"rows": 0, "watermark": 0}
+    vocab: List[str] = json.loads((directory / VOCAB_FILE).read_text()) if manifest["rows"] else []
+    size = source.stat().st_size if source.exists() else 0
+
+    # A log shorter than the watermark was rewritten; start over.
+    rebuilt = size < manifest["watermark"]
+    if rebuilt:
+        manifest, vocab = {"rows": 0, "watermark": 0}, []
+    rows, watermark = manifest["rows"], manifest["watermark"]
+    for name, width in ((LABELS_FILE, 4), (PORTIONS_FILE, 4), (LOG_IDS_FILE, UUID_BYTES)):
+        with (directory / name).open("ab") as handle:
+            handle.truncate(rows * width)
+
+    label_ids: Dict[str, int] = {label: index for index, label in enumerate(vocab)}
+    labels, portions, log_ids = array("i"), array("f"), bytearray()
+    skipped = 0
+    if size > watermark:
+        with source.open("rb") as handle:
+            handle.seek(watermark)
+            for line in handle:
+                if not line.endswith(b"\n"):
+                    break  # torn tail; picked up by the next run
+                watermark += len(line)
+                try:
+                    record = json.loads(line)
+                    log_id = uuid.UUID(record["log_id"]).bytes
+                    label = record["confirmed_label"].strip()
+                    portion = float(record["portion_grams"])
+                except (KeyError, TypeError, ValueError, AttributeError):
+                    skipped += 1
+                    continue
+                if label not in label_ids:
+                    label_ids[label] = len(vocab)
+                    vocab.append(label)
+                labels.append(label_ids[label])
+                portions.append(portion)
+                log_ids += log_id
+
+    if labels or watermark != manifest["watermark"] or rebuilt:
+        columns = {LABELS_FILE: _little_endian(labels), PORTIONS_FILE: _little_endian(portions), LOG_IDS_FILE: log_ids}
+        for name, data in columns.items():
+            with (directory / name).open("ab") as handle:
+                handle.write(data)
+                handle.flush()
+                os.fsync(handle.fileno())
+        rows += len(labels)
+        _write_json(directory / VOCAB_FILE, vocab)
+        _write_json(manifest_path, {"rows": rows, "watermark": watermark, "byteorder": "little"})
+    return CompileReport(added=len(labels), skipped=skipped, rows=rows, watermark=watermark, rebuilt=rebuilt)
+
+
+class FeedbackDataset:
+    """Read-only, memory-mapped view of a compiled dataset.
+
+    ``labels`` and ``portions`` are ``memoryview`` columns (``int32`` and
+    ``float32``) over the mapped files, so opening costs no parsing.
+    """
+
+    def __init__(self, directory: Path = DATASET_DIR) -> None:
+        manifest = json.loads((directory / MANIFEST_FILE).read_text())
+        if manifest.get("byteorder", "little") != sys.byteorder:
+            raise ValueError("Dataset byte order does not match this machine")
+        self.rows: int = manifest["rows"]
+        self.vocab: List[str] = json.loads((directory / VOCAB_FILE).read_text())
+        self._maps: List[mmap.mmap] = []
+        self.labels = self._column(directory / LABELS_FILE, 4, "i")
+        self.portions = self._column(directory / PORTIONS_FILE, 4, "f")
+        self._log_ids = self._column(directory / LOG_IDS_FILE, UUID_BYTES, "B")
+
+    def _column(self, path: Path, width: int, typecode: str) -> memoryview:
+        if not self.rows:
+            return memoryview(b"").cast(typecode)
+        with path.open("rb") as handle:
+            mapped = mmap.mmap(handle.fileno(), self.rows * width, access=mmap.ACCESS_READ)
+        self._maps.append(mapped)
+        return memoryview(mapped).cast(typecode)
+
+    def __len__(self) -> int:
+        return self.rows
+
+    def log_id(self, row: int) -> str:
+        return str(uuid.UUID(bytes=bytes(self._log_ids[row * UUID_BYTES : (row + 1) * UUID_BYTES])))
+
+    def label(self, row: int) -> str:
+        return self.vocab[self.labels[row]]
+
+    def close(self) -> None:
+        for view in (self.labels, self.portions, self._log_ids):
+            view.release()
+        for mapped in self._maps:
+            mapped.close()
+        self._maps = []
+
+    def __enter__(self) -> "FeedbackDataset":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Feedback dataset maintenance")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    compile_parser = subparsers.add_parser("compile", help="Append new feedback lines to the dataset")
+    compile_parser.add_argument("--source", type=Path, default=FEEDBACK_FILE)
+    compile_parser.add_argument("--out", type=Path, default=DATASET_DIR)
+    args = parser.parse_args()
+
+    if args.command == "compile":
+        report = compile_feedback(args.source, args.out)
+        print(
+            f"Added {report.added} rows ({report.skipped} skipped{', rebuilt' if report.rebuilt else ''}): "
+            f"{report.rows} rows through byte {report.watermark}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""In-process pub/sub for pushing macro totals to connected clients.
+
+Publishers run on worker threads (sync handlers) or the event loop (async
+handlers); each subscriber owns a bounded ``asyncio.Queue`` on its loop.
+A subscriber whose queue fills up is dropped rather than allowed to buffer
+without limit, and its stream ends so the client can reconnect.
+"""
+import asyncio
+import json
+import threading
+from collections import defaultdict
+from typing import Any, AsyncIterator, Dict, Optional, Set
+
+from fastapi.encoders import jsonable_encoder
+
+SUBSCRIBER_QUEUE_SIZE = 16
+KEEPALIVE_SECONDS = 15.0
+
+
+class Subscription:
+    def __init__(self, user_id: int, loop: asyncio.AbstractEventLoop, queue_size: int) -> None:
+        self.user_id = user_id
+        self.loop = loop
+        self.queue: "asyncio.Queue[Optional[Dict[str, Any]]]" = asyncio.Queue(maxsize=queue_size)
+        self.dropped = False
+
+    def offer(self, payload: Dict[str, Any]) -> bool:
+        """Enqueue on the subscriber's loop; returns False when it overflowed."""
+        if self.dropped:
+            return False
+        try:
+            self.queue.put_nowait(payload)
+            return True
+        except asyncio.QueueFull:
+            self.dropped = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+            return False
+
+
+class MacroTotalsHub:
+    def __init__(self, queue_size: int = SUBSCRIBER_QUEUE_SIZE) -> None:
+        self.queue_size = queue_size
+        self.dropped = 0
+        self._subscribers: Dict[int, Set[Subscription]] = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id: int) -> Subscription:
+        subscription = Subscription(user_id, asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            self._subscribers[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+
+    def has_subscribers(self, user_id: int) -> bool:
+        return bool(self._subscribers.get(user_id))
+
+    def publish(self, user_id: int, payload: Dict[str, Any]) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for subscription in subscribers:
+            subscription.loop.call_soon_threadsafe(self._deliver, subscription, payload)
+
+    def _deliver(self, subscription: Subscription, payload: Dict[str, Any]) -> None:
+        if not subscription.offer(payload):
+            self.dropped += 1
+            self.unsubscribe(subscription)
+
+
+macro_totals_hub = MacroTotalsHub()
+
+
+async def stream_macro_totals(
+    user_id: int,
+    hub: MacroTotalsHub = macro_totals_hub,
+    keepalive: float = KEEPALIVE_SECONDS,
+) -> AsyncIterator[str]:
+    """Yield server-sent events for every macro totals change of a user."""
+    subscription = hub.subscribe(user_id)
+    try:
+        yield "retry: 3000\n\n"
+        while True:
+            try:
+                payload = await asyncio.wait_for(subscription.queue.get(), timeout=keepalive)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            if payload is None:
+                return
+            data = json.dumps(jsonable_encoder(payload))
+            yield f"event: macro_totals\ndata: {data}\n\n"
+    finally:
+        hub.unsubscribe(subscription)
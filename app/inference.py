@@ -1,6 +1,34 @@
+import abc
+import argparse
+import asyncio
 import hashlib
+import importlib
+import mmap
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
 from dataclasses import dataclass
-from typing import List
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple, Union
+
+INFERENCE_WORKERS = int(os.getenv("CALORIE_TRACKER_INFERENCE_WORKERS", str(os.cpu_count() or 1)))
+INFERENCE_MAX_BATCH = 8
+INFERENCE_MAX_WAIT_SECONDS = 0.005
+INFERENCE_QUEUE_SIZE = 64
+INFERENCE_RETRY_AFTER_SECONDS = 1
+LATENCY_SAMPLES = 1024
+# A registered backend name, or "package.module:Factory" for one defined elsewhere.
+INFERENCE_BACKEND = os.getenv("CALORIE_TRACKER_INFERENCE_BACKEND", "hash")
+INFERENCE_WARMUP_RUNS = int(os.getenv("CALORIE_TRACKER_INFERENCE_WARMUP", "3"))
+WARMUP_PAYLOAD = bytes(64 * 1024)
+LATENCY_BUCKETS_MS = (0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000)
 
 FOOD_CANDIDATES = [
     "grilled chicken",
@@ -22,6 +50,17 @@ class Candidate:
     confidence: float
 
 
+@dataclass(frozen=True)
+class PayloadFile:
+    """An upload spooled to disk; workers map it rather than receive a pickled copy."""
+
+    path: str
+    size: int
+
+
+Payload = Union[bytes, bytearray, PayloadFile]
+
+
 def _ranked_candidates(seed: bytes) -> List[Candidate]:
     digest = hashlib.sha256(seed).hexdigest()
     start = int(digest[:4], 16) % len(FOOD_CANDIDATES)
@@ -30,7 +69,475 @@ def _ranked_candidates(seed: bytes) -> List[Candidate]:
     return [Candidate(label=label, confidence=confidences[idx]) for idx, label in enumerate(ordered[:3])]
 
 
-def run_on_device_inference(filename: str, payload: bytes) -> List[Candidate]:
+def run_on_device_inference(filename: str, payload: memoryview) -> List[Candidate]:
     """Simulated on-device model that hashes the image content for deterministic candidates."""
     seed = f"{filename}:{len(payload)}".encode("utf-8") + payload[:64]
     return _ranked_candidates(seed)
+
+
+@contextmanager
+def payload_view(payload: Payload) -> Iterator[memoryview]:
+    """Zero-copy view of an upload, mapping spooled files read-only."""
+    if not isinstance(payload, PayloadFile):
+        with memoryview(payload) as view:
+            yield view
+        return
+    with open(payload.path, "rb") as handle:
+        with mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            with memoryview(mapped) as view:
+                yield view
+
+
+class InferenceBackend(abc.ABC):
+    """A model turning image bytes into ranked candidates.
+
+    ``load`` runs once per worker process before any upload is served;
+    ``predict`` receives a read-only ``memoryview`` of the image.
+    """
+
+    name = "base"
+
+    def load(self) -> None:
+        pass
+
+    @abc.abstractmethod
+    def predict(self, filename: str, payload: memoryview) -> List[Candidate]:
+        ...
+
+
+_backends: Dict[str, Callable[[], InferenceBackend]] = {}
+
+
+def register_backend(name: str):
+    def decorator(factory: Callable[[], InferenceBackend]) -> Callable[[], InferenceBackend]:
+        _backends[name] = factory
+        return factory
+
+    return decorator
+
+
+def _import_factory(spec: str) -> Callable[[], InferenceBackend]:
+    module_name, _, attribute = spec.partition(":")
+    factory: Any = importlib.import_module(module_name)
+    for part in attribute.split("."):
+        factory = getattr(factory, part)
+    return factory
+
+
+def backend_spec(name: str = INFERENCE_BACKEND) -> str:
+    """``module:Factory`` for ``name``, importable by a freshly spawned worker.
+
+    The registry only lives in the process that ran the ``register_backend``
+    calls; spawned workers import ``app.inference`` from scratch and would not
+    know names registered anywhere else. Names are therefore resolved here,
+    in the parent, and a factory a worker could not import fails now rather
+    than in every worker.
+    """
+    if name not in _backends:
+        if ":" not in name:
+            raise ValueError(f"Unknown inference backend {name!r}; registered: {sorted(_backends)}")
+        return name
+    factory = _backends[name]
+    spec = f"{factory.__module__}:{factory.__qualname__}"
+    try:
+        importable = factory.__module__ != "__main__" and _import_factory(spec) is factory
+    except (ImportError, AttributeError):
+        importable = False
+    if not importable:
+        raise ValueError(f"Inference backend {name!r} ({spec}) cannot be imported by worker processes")
+    return spec
+
+
+def create_backend(name: str = INFERENCE_BACKEND) -> InferenceBackend:
+    if name in _backends:
+        return _backends[name]()
+    if ":" not in name:
+        raise ValueError(f"Unknown inference backend {name!r}; registered: {sorted(_backends)}")
+    return _import_factory(name)()
+
+
+@register_backend("hash")
+class HashBackend(InferenceBackend):
+    """The deterministic stand-in model: candidates derived from a hash of the bytes."""
+
+    name = "hash"
+
+    def predict(self, filename: str, payload: memoryview) -> List[Candidate]:
+        return run_on_device_inference(filename, payload)
+
+
+def warm_up(backend: InferenceBackend, runs: int = INFERENCE_WARMUP_RUNS) -> None:
+    with memoryview(WARMUP_PAYLOAD) as view:
+        for _ in range(runs):
+            backend.predict("warmup.jpg", view)
+
+
+# The backend loaded into this (worker) process.
+_worker_backend: Optional[InferenceBackend] = None
+
+
+def init_worker(name: str = INFERENCE_BACKEND, warmup_runs: int = INFERENCE_WARMUP_RUNS) -> None:
+    """Process-pool initializer: load and warm the model once per worker."""
+    global _worker_backend
+    backend = create_backend(name)
+    backend.load()
+    warm_up(backend, warmup_runs)
+    _worker_backend = backend
+
+
+def worker_ready() -> str:
+    return _worker_backend.name if _worker_backend is not None else ""
+
+
+def run_batch_timed(
+    items: List[Tuple[str, Payload]]
+) -> List[Tuple[Union[List[Candidate], Exception], float]]:
+    """Worker-process entry point: run the model over one micro-batch, timing each upload.
+
+    An upload that fails (its spool file already removed by a cancelled
+    request, say) yields its exception in place of candidates, so the rest of
+    the batch is unaffected.
+    """
+    if _worker_backend is None:
+        init_worker(warmup_runs=0)
+    results = []
+    for filename, payload in items:
+        try:
+            with payload_view(payload) as view:
+                started = time.perf_counter()
+                candidates = _worker_backend.predict(filename, view)
+                results.append((candidates, time.perf_counter() - started))
+        except Exception as exc:
+            results.append((exc, 0.0))
+    return results
+
+
+def run_batch(items: List[Tuple[str, Payload]]) -> List[List[Candidate]]:
+    results = []
+    for candidates, _ in run_batch_timed(items):
+        if isinstance(candidates, Exception):
+            raise candidates
+        results.append(candidates)
+    return results
+
+
+class LatencyHistogram:
+    """Counts of latencies per fixed millisecond bucket."""
+
+    def __init__(self, bounds: Tuple[float, ...] = LATENCY_BUCKETS_MS) -> None:
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total_ms = 0.0
+
+    def record(self, seconds: float) -> None:
+        milliseconds = seconds * 1000
+        self.counts[bisect_left(self.bounds, milliseconds)] += 1
+        self.total_ms += milliseconds
+
+    def snapshot(self) -> Dict[str, Any]:
+        count = sum(self.counts)
+        labels = [f"le_{bound:g}" for bound in self.bounds] + ["inf"]
+        return {
+            "count": count,
+            "mean_ms": self.total_ms / count if count else 0.0,
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+class InferenceOverloaded(RuntimeError):
+    def __init__(self, retry_after: int):
+        super().__init__("Inference queue is full")
+        self.retry_after = retry_after
+
+
+class InferenceMetrics:
+    def __init__(self, samples: int = LATENCY_SAMPLES) -> None:
+        self.requests = 0
+        self.rejected = 0
+        self.batches = 0
+        self.batch_sizes: Counter = Counter()
+        self.latencies: Deque[float] = deque(maxlen=samples)
+        self.model_latency: Dict[str, LatencyHistogram] = {}
+        self._lock = threading.Lock()
+
+    def record_request(self, accepted: bool) -> None:
+        with self._lock:
+            if accepted:
+                self.requests += 1
+            else:
+                self.rejected += 1
+
+    def record_batch(self, size: int) -> None:
+        with self._lock:
+            self.batches += 1
+            self.batch_sizes[size] += 1
+
+    def record_latency(self, seconds: float) -> None:
+        with self._lock:
+            self.latencies.append(seconds)
+
+    def record_model_latency(self, backend: str, seconds: float) -> None:
+        with self._lock:
+            self.model_latency.setdefault(backend, LatencyHistogram()).record(seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            latencies = sorted(self.latencies)
+            sizes = dict(sorted(self.batch_sizes.items()))
+            batched = sum(size * count for size, count in sizes.items())
+
+            def percentile(pct: float) -> float:
+                if not latencies:
+                    return 0.0
+                return latencies[min(len(latencies) - 1, int(round(pct / 100 * (len(latencies) - 1))))] * 1000
+
+            return {
+                "requests": self.requests,
+                "rejected": self.rejected,
+                "batches": self.batches,
+                "mean_batch_size": batched / self.batches if self.batches else 0.0,
+                "batch_sizes": sizes,
+                "latency_ms": {"p50": percentile(50), "p99": percentile(99), "max": percentile(100)},
+                "model_latency": {name: histogram.snapshot() for name, histogram in self.model_latency.items()},
+            }
+
+
+class InferenceExecutor:
+    """Micro-batches inference requests onto a process pool.
+
+    ``submit`` enqueues an upload and returns a future of its candidates. A
+    dispatcher thread groups queued uploads into batches of up to
+    ``max_batch`` or whatever arrived within ``max_wait`` seconds of the
+    first, and hands each batch to a worker process. At most ``queue_size``
+    uploads may be queued or running; beyond that ``submit`` raises
+    :class:`InferenceOverloaded` so the API can shed load with a 503.
+
+    Every worker loads ``backend`` and runs ``warmup_runs`` predictions when
+    it starts; ``start(wait=True)`` blocks until all of them are ready.
+
+    A worker that dies breaks the whole pool. The next batch then gets a new
+    pool, and a batch that was running on the dead worker is retried there
+    once before its uploads fail.
+    """
+
+    def __init__(
+        self,
+        workers: int = INFERENCE_WORKERS,
+        max_batch: int = INFERENCE_MAX_BATCH,
+        max_wait: float = INFERENCE_MAX_WAIT_SECONDS,
+        queue_size: int = INFERENCE_QUEUE_SIZE,
+        retry_after: int = INFERENCE_RETRY_AFTER_SECONDS,
+        backend: str = INFERENCE_BACKEND,
+        warmup_runs: int = INFERENCE_WARMUP_RUNS,
+    ) -> None:
+        self.workers = workers
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue_size = queue_size
+        self.retry_after = retry_after
+        self.backend = backend
+        self.warmup_runs = warmup_runs
+        self.metrics = InferenceMetrics()
+        self._queue: "queue.Queue[Optional[Tuple[str, Payload, Future, float]]]" = queue.Queue()
+        self._slots = threading.BoundedSemaphore(queue_size)
+        self._in_flight = 0
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._thread: Optional[threading.Thread] = None
+        self._ready: List[Future] = []
+        self._lock = threading.Lock()
+
+    def submit(self, filename: str, payload: Payload) -> Future:
+        if not self._slots.acquire(blocking=False):
+            self.metrics.record_request(accepted=False)
+            raise InferenceOverloaded(self.retry_after)
+        future: Future = Future()
+        self.start()
+        self._queue.put((filename, payload, future, time.perf_counter()))
+        self.metrics.record_request(accepted=True)
+        return future
+
+    def start(self, wait: bool = False) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._pool = self._new_pool()
+                # One task per worker makes the pool start (and warm) all of them now.
+                self._ready = [self._pool.submit(worker_ready) for _ in range(self.workers)]
+                self._thread = threading.Thread(target=self._dispatch, name="inference-batcher", daemon=True)
+                self._thread.start()
+            ready = self._ready
+        if wait:
+            for future in ready:
+                future.result()
+
+    async def infer(self, filename: str, payload: Payload) -> List[Candidate]:
+        return await asyncio.wrap_future(self.submit(filename, payload))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.backend,
+            "workers": self.workers,
+            "max_batch": self.max_batch,
+            "queue_depth": self._queue.qsize(),
+            "in_flight": self._in_flight,
+            **self.metrics.snapshot(),
+        }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        # Spawned workers do not inherit the API's threads and locks, nor its backend registry.
+        return ProcessPoolExecutor(
+            self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker,
+            initargs=(backend_spec(self.backend), self.warmup_runs),
+        )
+
+    def _replace_pool(self, broken: ProcessPoolExecutor) -> ProcessPoolExecutor:
+        """Swap ``broken`` for a new pool, unless another batch already did."""
+        with self._lock:
+            replaced = self._pool is broken
+            if replaced:
+                self._pool = self._new_pool()
+            pool = self._pool or broken
+        if replaced:
+            broken.shutdown(wait=False)
+        return pool
+
+    def _submit(self, items: List[Tuple[str, Payload]]) -> Future:
+        """Hand ``items`` to the pool; if that fails, a future holding the error."""
+        pool = self._pool
+        try:
+            try:
+                return pool.submit(run_batch_timed, items)
+            except BrokenProcessPool:
+                return self._replace_pool(pool).submit(run_batch_timed, items)
+        except Exception as exc:
+            failed: Future = Future()
+            failed.set_exception(exc)
+            return failed
+
+    def _dispatch(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.max_wait
+            stopping = False
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._run(batch)
+            if stopping:
+                return
+
+    def _run(self, batch: List[Tuple[str, Payload, Future, float]], retry: bool = True) -> None:
+        if retry:
+            self.metrics.record_batch(len(batch))
+            with self._lock:
+                self._in_flight += len(batch)
+        work = self._submit([(filename, payload) for filename, payload, _, _ in batch])
+
+        def finish(work: Future) -> None:
+            if retry and isinstance(work.exception(), BrokenProcessPool):
+                self._run(batch, retry=False)
+                return
+            with self._lock:
+                self._in_flight -= len(batch)
+            error = work.exception()
+            results = None if error else work.result()
+            for index, (_, _, future, started) in enumerate(batch):
+                self._slots.release()
+                self.metrics.record_latency(time.perf_counter() - started)
+                if future.done():
+                    continue
+                if error is not None:
+                    future.set_exception(error)
+                    continue
+                candidates, model_seconds = results[index]
+                if isinstance(candidates, Exception):
+                    future.set_exception(candidates)
+                else:
+                    self.metrics.record_model_latency(self.backend, model_seconds)
+                    future.set_result(candidates)
+
+        work.add_done_callback(finish)
+
+
+inference_executor = InferenceExecutor()
+
+
+def _percentile_ms(ordered: List[float], pct: float) -> float:
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))] * 1000
+
+
+def benchmark(name: str, images: List[Tuple[str, bytes]], warmup_runs: int, repeat: int) -> Dict[str, Any]:
+    """Load ``name`` in-process and time it over ``images``."""
+    started = time.perf_counter()
+    backend = create_backend(name)
+    backend.load()
+    load_seconds = time.perf_counter() - started
+    warm_up(backend, warmup_runs)
+    histogram = LatencyHistogram()
+    latencies = []
+    for _ in range(repeat):
+        for filename, payload in images:
+            with memoryview(payload) as view:
+                started = time.perf_counter()
+                backend.predict(filename, view)
+                elapsed = time.perf_counter() - started
+            histogram.record(elapsed)
+            latencies.append(elapsed)
+    latencies.sort()
+    return {
+        "backend": name,
+        "load_ms": load_seconds * 1000,
+        "images_per_second": len(latencies) / sum(latencies) if sum(latencies) else 0.0,
+        "p50_ms": _percentile_ms(latencies, 50) if latencies else 0.0,
+        "p99_ms": _percentile_ms(latencies, 99) if latencies else 0.0,
+        **histogram.snapshot(),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Inference backend tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    bench = subparsers.add_parser("bench", help="Replay a directory of images through one or more backends")
+    bench.add_argument("images", type=Path)
+    bench.add_argument("--backend", action="append", help="Repeat to compare backends (default: configured one)")
+    bench.add_argument("--warmup", type=int, default=INFERENCE_WARMUP_RUNS)
+    bench.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        images = [(path.name, path.read_bytes()) for path in sorted(args.images.iterdir()) if path.is_file()]
+        if not images:
+            parser.error(f"No images in {args.images}")
+        for name in args.backend or [INFERENCE_BACKEND]:
+            result = benchmark(name, images, args.warmup, args.repeat)
+            print(
+                f"{result['backend']}: load {result['load_ms']:.1f}ms, {result['count']} predictions, "
+                f"{result['images_per_second']:.0f} images/s, p50 {result['p50_ms']:.3f}ms, "
+                f"p99 {result['p99_ms']:.3f}ms"
+            )
+            print("  " + " ".join(f"{label}={count}" for label, count in result["buckets"].items() if count))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from .inference import Candidate
+from .storage import DATA_DIR
+
+INFERENCE_CACHE_FILE = DATA_DIR / "inference_cache.sqlite3"
+INFERENCE_CACHE_MAX = 4096
+# The SQLite tier keeps at most this many results, none unused for longer than the age limit.
+INFERENCE_CACHE_DISK_MAX = int(os.getenv("CALORIE_TRACKER_INFERENCE_CACHE_DISK_MAX", "100000"))
+INFERENCE_CACHE_MAX_AGE_SECONDS = float(os.getenv("CALORIE_TRACKER_INFERENCE_CACHE_MAX_AGE", str(30 * 24 * 60 * 60)))
+# Writes between eviction passes, so the cost of counting rows is spread out.
+INFERENCE_CACHE_EVICT_EVERY = 256
+# Hand a photo re-uploaded by the same user its still-pending log instead of opening another.
+REUSE_PENDING_LOG = os.getenv("CALORIE_TRACKER_REUSE_PENDING_LOG", "1") == "1"
+
+
+@dataclass(frozen=True)
+class CachedInference:
+    candidates: List[Candidate]
+    log_id: Optional[str]
+    # The user_id the log was uploaded under; only that user may be handed it again.
+    owner: Optional[str] = None
+
+
+class InferenceCache:
+    """Inference results keyed by the SHA-256 of the full image bytes.
+
+    A bounded in-memory LRU sits in front of a SQLite table that survives
+    restarts; disk hits are promoted into memory. The table is only a cache,
+    so it is written without fsync. Each row records when it was last used;
+    every ``INFERENCE_CACHE_EVICT_EVERY`` writes, rows older than
+    ``max_age_seconds`` and the least recently used rows past
+    ``max_disk_entries`` are deleted.
+
+    ``get`` and ``put`` may touch SQLite, so async callers run them in a
+    thread pool.
+    """
+
+    def __init__(
+        self,
+        path: Path = INFERENCE_CACHE_FILE,
+        max_entries: int = INFERENCE_CACHE_MAX,
+        max_disk_entries: int = INFERENCE_CACHE_DISK_MAX,
+        max_age_seconds: float = INFERENCE_CACHE_MAX_AGE_SECONDS,
+    ) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.max_age_seconds = max_age_seconds
+        self.evicted = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, CachedInference]" = OrderedDict()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def get(self, digest: str) -> Optional[CachedInference]:
+        with self._lock:
+            cached = self._entries.get(digest)
+            if cached is None:
+                db = self._db()
+                row = db.execute(
+                    "SELECT candidates, log_id, owner, used_at FROM inference_cache WHERE digest = ?", (digest,)
+                ).fetchone()
+                now = time.time()
+                if row is not None and now - row[3] <= self.max_age_seconds:
+                    candidates = [Candidate(**candidate) for candidate in json.loads(row[0])]
+                    cached = CachedInference(candidates, row[1], row[2])
+                    self._remember(digest, cached)
+                    db.execute("UPDATE inference_cache SET used_at = ? WHERE digest = ?", (now, digest))
+                    db.commit()
+            else:
+                self._entries.move_to_end(digest)
+            if cached is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return cached
+
+    def put(
+        self, digest: str, candidates: List[Candidate], log_id: Optional[str] = None, owner: Optional[str] = None
+    ) -> None:
+        cached = CachedInference(list(candidates), log_id, owner)
+        with self._lock:
+            self._remember(digest, cached)
+            db = self._db()
+            db.execute(
+                "INSERT OR REPLACE INTO inference_cache (digest, candidates, log_id, owner, used_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (digest, json.dumps([candidate.__dict__ for candidate in candidates]), log_id, owner, time.time()),
+            )
+            self._writes += 1
+            if self._writes % INFERENCE_CACHE_EVICT_EVERY == 0:
+                self._evict(db)
+            db.commit()
+
+    def evict(self) -> int:
+        """Delete expired rows and trim the table to ``max_disk_entries``; returns rows deleted."""
+        with self._lock:
+            db = self._db()
+            deleted = self._evict(db)
+            db.commit()
+            return deleted
+
+    def _evict(self, db: sqlite3.Connection) -> int:
+        deleted = db.execute(
+            "DELETE FROM inference_cache WHERE used_at < ?", (time.time() - self.max_age_seconds,)
+        ).rowcount
+        (count,) = db.execute("SELECT count(*) FROM inference_cache").fetchone()
+        if count > self.max_disk_entries:
+            deleted += db.execute(
+                "DELETE FROM inference_cache WHERE digest IN "
+                "(SELECT digest FROM inference_cache ORDER BY used_at LIMIT ?)",
+                (count - self.max_disk_entries,),
+            ).rowcount
+        self.evicted += deleted
+        return deleted
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "evicted": self.evicted,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _remember(self, digest: str, cached: CachedInference) -> None:
+        self._entries[digest] = cached
+        self._entries.move_to_end(digest)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=OFF")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS inference_cache ("
+                "digest TEXT PRIMARY KEY, candidates TEXT NOT NULL, log_id TEXT, owner TEXT, "
+                "used_at REAL NOT NULL DEFAULT 0)"
+            )
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(inference_cache)")}
+            if "owner" not in columns:
+                # Logs cached before owners were recorded are never handed out again.
+                self._conn.execute("ALTER TABLE inference_cache ADD COLUMN owner TEXT")
+            if "used_at" not in columns:
+                # Tables from before eviction: existing rows count as unused since now.
+                self._conn.execute("ALTER TABLE inference_cache ADD COLUMN used_at REAL NOT NULL DEFAULT 0")
+                self._conn.execute("UPDATE inference_cache SET used_at = ?", (time.time(),))
+            self._conn.execute("CREATE INDEX IF NOT EXISTS ix_inference_cache_used_at ON inference_cache (used_at)")
+            self._evict(self._conn)
+            self._conn.commit()
+        return self._conn
+
+
+inference_cache = InferenceCache()
@@ -1,25 +1,70 @@
 from datetime import date
 from typing import List, Optional
 
-from fastapi import Depends, FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
-from . import crud, models, schemas
-from .database import Base, SessionLocal, engine
+from . import changes, crud, models, schemas, sync
+from .events import stream_macro_totals
+from .cache import UserCache, user_cache
+from .database import DATABASE_MODE, Base, SessionLocal, create_schema, engine, shard_router
+from .sharding import SHARD_HINT
 
-Base.metadata.create_all(bind=engine)
+if shard_router is not None:
+    shard_router.create_all(Base.metadata)
+else:
+    create_schema(Base.metadata, engine)
 
 app = FastAPI(title="CalorieTracker API")
 
 
-def get_db():
+def _open_session(params) -> Session:
     db = SessionLocal()
+    if shard_router is not None:
+        # Pin the request to the shard its path ids live on; routes without
+        # one (listing or creating users) fan out across every shard.
+        db.info[SHARD_HINT] = shard_router.shard_for_params(params)
+    return db
+
+
+def get_db(request: Request):
+    db = _open_session(request.path_params)
     try:
         yield db
     finally:
         db.close()
 
 
+def get_user_cache() -> UserCache:
+    return user_cache
+
+
+def get_user_or_404(
+    user_id: int,
+    db: Session = Depends(get_db),
+    cache: UserCache = Depends(get_user_cache),
+) -> models.User:
+    user = cache.get(db, user_id)
+    if user is None:
+        user = crud.get_user(db, user_id)
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+        cache.put(user)
+    return user
+
+
+def _get_user_and_daily_log(db: Session, cache: UserCache, user_id: int, log_date: date):
+    user = cache.get(db, user_id)
+    if user is not None:
+        return user, crud.get_daily_log(db, user_id, log_date)
+    user, log = crud.get_user_with_daily_log(db, user_id, log_date)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    cache.put(user)
+    return user, log
+
+
 @app.post("/users", response_model=schemas.UserOut)
 def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
     existing = crud.get_user_by_email(db, user.email)
@@ -35,10 +80,7 @@ def list_users(db: Session = Depends(get_db)):
 
 
 @app.get("/users/{user_id}", response_model=schemas.UserOut)
-def get_user(user_id: int, db: Session = Depends(get_db)):
-    user = crud.get_user(db, user_id)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+def get_user(user: models.User = Depends(get_user_or_404)):
     return user
 
 
@@ -63,10 +105,7 @@ def delete_user(user_id: int, db: Session = Depends(get_db)):
 
 
 @app.get("/users/{user_id}/goals", response_model=schemas.GoalConfigOut)
-def get_goals(user_id: int, db: Session = Depends(get_db)):
-    user = crud.get_user(db, user_id)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+def get_goals(user_id: int, user: models.User = Depends(get_user_or_404), db: Session = Depends(get_db)):
     goal = crud.get_goal_config(db, user_id)
     if not goal:
         raise HTTPException(status_code=404, detail="Goal config not found")
@@ -74,10 +113,12 @@ def get_goals(user_id: int, db: Session = Depends(get_db)):
 
 
 @app.put("/users/{user_id}/goals", response_model=schemas.GoalConfigOut)
-def upsert_goals(user_id: int, payload: schemas.GoalConfigCreate, db: Session = Depends(get_db)):
-    user = crud.get_user(db, user_id)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+def upsert_goals(
+    user_id: int,
+    payload: schemas.GoalConfigCreate,
+    user: models.User = Depends(get_user_or_404),
+    db: Session = Depends(get_db),
+):
     goal = crud.upsert_goal_config(db, user_id, payload.dict(exclude_unset=True))
     return goal
 
@@ -96,21 +137,22 @@ def list_daily_logs(
     user_id: int,
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
+    user: models.User = Depends(get_user_or_404),
     db: Session = Depends(get_db),
 ):
-    user = crud.get_user(db, user_id)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
     return crud.list_daily_logs(db, user_id, start_date, end_date)
 
 
 @app.post("/users/{user_id}/daily-logs", response_model=schemas.DailyLogOut)
-def create_daily_log(user_id: int, payload: schemas.DailyLogCreate, db: Session = Depends(get_db)):
-    user = crud.get_user(db, user_id)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+def create_daily_log(
+    user_id: int,
+    payload: schemas.DailyLogCreate,
+    db: Session = Depends(get_db),
+    cache: UserCache = Depends(get_user_cache),
+):
+    user, existing = _get_user_and_daily_log(db, cache, user_id, payload.log_date)
     timezone = crud.resolve_timezone(payload.timezone, user.timezone)
-    log = crud.upsert_daily_log(db, user, payload.log_date, timezone)
+    log = crud.save_daily_log(db, user, payload.log_date, timezone, existing)
     return log
 
 
@@ -123,12 +165,16 @@ def get_daily_log(user_id: int, log_date: date, db: Session = Depends(get_db)):
 
 
 @app.put("/users/{user_id}/daily-logs/{log_date}", response_model=schemas.DailyLogOut)
-def upsert_daily_log(user_id: int, log_date: date, payload: schemas.DailyLogCreate, db: Session = Depends(get_db)):
-    user = crud.get_user(db, user_id)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+def upsert_daily_log(
+    user_id: int,
+    log_date: date,
+    payload: schemas.DailyLogCreate,
+    db: Session = Depends(get_db),
+    cache: UserCache = Depends(get_user_cache),
+):
+    user, existing = _get_user_and_daily_log(db, cache, user_id, log_date)
     timezone = crud.resolve_timezone(payload.timezone, user.timezone)
-    log = crud.upsert_daily_log(db, user, log_date, timezone)
+    log = crud.save_daily_log(db, user, log_date, timezone, existing)
     return log
 
 
@@ -148,7 +194,7 @@ def list_meals(daily_log_id: int, db: Session = Depends(get_db)):
 
 @app.post("/daily-logs/{daily_log_id}/meals", response_model=schemas.MealOut)
 def create_meal(daily_log_id: int, payload: schemas.MealCreate, db: Session = Depends(get_db)):
-    daily_log = db.query(models.DailyLog).filter(models.DailyLog.id == daily_log_id).first()
+    daily_log = crud.get_daily_log_by_id(db, daily_log_id)
     if not daily_log:
         raise HTTPException(status_code=404, detail="Daily log not found")
     meal = crud.create_meal(db, daily_log, payload.dict(exclude_unset=True))
@@ -221,34 +267,47 @@ def delete_food_item(item_id: int, db: Session = Depends(get_db)):
 
 @app.get("/daily-logs/{daily_log_id}/macro-totals", response_model=schemas.MacroTotalsOut)
 def get_macro_totals(daily_log_id: int, db: Session = Depends(get_db)):
-    totals = (
-        db.query(models.MacroTotals)
-        .filter(models.MacroTotals.daily_log_id == daily_log_id)
-        .first()
-    )
+    totals = crud.get_macro_totals(db, daily_log_id)
     if not totals:
         totals = crud.refresh_macro_totals_for_log(db, daily_log_id)
     return totals
 
 
+@app.get("/users/{user_id}/macro-totals/stream")
+async def stream_user_macro_totals(user_id: int):
+    # The stream is long-lived, so check the user on a short session rather than
+    # holding a pooled connection through get_db for the life of the response.
+    db = _open_session({"user_id": user_id})
+    try:
+        if user_cache.get(db, user_id) is None and not crud.get_user(db, user_id):
+            raise HTTPException(status_code=404, detail="User not found")
+    finally:
+        db.close()
+    return StreamingResponse(
+        stream_macro_totals(user_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.get("/users/{user_id}/weight-entries", response_model=List[schemas.WeightEntryOut])
 def list_weight_entries(
     user_id: int,
     start_date: Optional[date] = None,
     end_date: Optional[date] = None,
+    user: models.User = Depends(get_user_or_404),
     db: Session = Depends(get_db),
 ):
-    user = crud.get_user(db, user_id)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
     return crud.list_weight_entries(db, user_id, start_date, end_date)
 
 
 @app.post("/users/{user_id}/weight-entries", response_model=schemas.WeightEntryOut)
-def create_weight_entry(user_id: int, payload: schemas.WeightEntryCreate, db: Session = Depends(get_db)):
-    user = crud.get_user(db, user_id)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+def create_weight_entry(
+    user_id: int,
+    payload: schemas.WeightEntryCreate,
+    user: models.User = Depends(get_user_or_404),
+    db: Session = Depends(get_db),
+):
     entry = crud.upsert_weight_entry(
         db,
         user_id,
@@ -290,11 +349,9 @@ def get_summaries(
     start_date: date,
     end_date: date,
     timezone: Optional[str] = None,
+    user: models.User = Depends(get_user_or_404),
     db: Session = Depends(get_db),
 ):
-    user = crud.get_user(db, user_id)
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
     tz = crud.resolve_timezone(timezone, user.timezone)
     daily = crud.build_daily_summaries(db, user, start_date, end_date)
     weekly = crud.build_weekly_summaries(daily, tz)
@@ -320,28 +377,130 @@ def get_summaries(
         for item in weekly
     ]
     return schemas.SummaryResponse(daily=daily_payload, weekly=weekly_payload)
+
+
+@app.post("/users/{user_id}/sync", response_model=schemas.SyncResponse)
+def sync_mutations(
+    user_id: int,
+    payload: schemas.SyncRequest,
+    user: models.User = Depends(get_user_or_404),
+    db: Session = Depends(get_db),
+):
+    results, totals = sync.apply_mutations(db, user_id, payload.mutations)
+    return schemas.SyncResponse(results=results, macro_totals=totals)
+
+
+@app.get("/users/{user_id}/changes", response_model=schemas.ChangeFeedOut)
+def list_changes(
+    user_id: int,
+    since: int = 0,
+    limit: int = Query(changes.CHANGE_FEED_PAGE, ge=1, le=changes.CHANGE_FEED_PAGE),
+    user: models.User = Depends(get_user_or_404),
+    db: Session = Depends(get_db),
+):
+    try:
+        return changes.list_changes(db, user_id, since, limit)
+    except changes.CursorExpiredError as exc:
+        raise HTTPException(status_code=410, detail={"message": str(exc), "cursor": exc.cursor})
+
+
+# Entry point for the database-backed API (``uvicorn app.main:api_app``). With
+# CALORIE_TRACKER_DATABASE_MODE=async the aiosqlite handlers serve it instead.
+api_app = app
+if DATABASE_MODE == "async":
+    from .async_main import app as api_app
+
+
+import itertools
+import json
 import uuid
+from contextlib import asynccontextmanager
 from pathlib import Path
-from typing import List
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
-from fastapi import FastAPI, File, HTTPException, UploadFile
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, File, Form, HTTPException, Query, UploadFile
+from fastapi.responses import HTMLResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel, Field
 
-from app.inference import Candidate, run_on_device_inference
-from app.storage import iter_jsonl, log_feedback, log_photo
+from app.blobs import BlobResponse, blob_store
+from app.inference import Candidate, InferenceOverloaded, inference_executor
+from app.inference_cache import REUSE_PENDING_LOG, inference_cache
+from app.nutrition import candidate_nutrition
+from app.storage import CursorExpiredError, log_feedback, log_photo, photo_log_store
+from app.uploads import UploadLimitMiddleware, UploadTooLarge, read_upload, upload_stats
+from app.writer import close_writers
 
 BASE_DIR = Path(__file__).resolve().parent.parent
 STATIC_DIR = BASE_DIR / "static"
 
-app = FastAPI(title="CalorieTracker")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    photo_log_store.start_compactor()
+    inference_executor.start(wait=True)
+    yield
+    photo_log_store.stop_compactor()
+    inference_executor.shutdown()
+    close_writers()
+    inference_cache.close()
+    blob_store.close()
+
+
+app = FastAPI(title="CalorieTracker", lifespan=lifespan)
 app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
+app.add_middleware(UploadLimitMiddleware, paths=("/photo-log",))
+
+
+class NutrientsOut(BaseModel):
+    calories_kcal: Optional[float]
+    protein_g: Optional[float]
+    fat_g: Optional[float]
+    carbs_g: Optional[float]
+    fiber_g: Optional[float] = None
+    sugar_g: Optional[float] = None
+    sodium_mg: Optional[float] = None
+
+
+class PortionOut(BaseModel):
+    description: str
+    amount: float
+    unit: str
+    gram_weight: float
 
 
 class CandidateOut(BaseModel):
     label: str
     confidence: float
+    food_id: Optional[str] = None
+    food_name: Optional[str] = None
+    nutrients_per_100g: Optional[NutrientsOut] = None
+    portions: List[PortionOut] = []
+
+
+def _candidates_out(candidates: List[Candidate]) -> List[CandidateOut]:
+    """Candidates with the nutrition of their catalog match, so confirming needs no lookups.
+
+    Resolving may reload the catalog after an import, so async callers run this in a thread pool.
+    """
+    out = []
+    for candidate in candidates:
+        food = candidate_nutrition.resolve(candidate.label)
+        if food is None:
+            out.append(CandidateOut(label=candidate.label, confidence=candidate.confidence))
+            continue
+        out.append(
+            CandidateOut(
+                label=candidate.label,
+                confidence=candidate.confidence,
+                food_id=food.id,
+                food_name=food.name,
+                nutrients_per_100g=NutrientsOut(**food.nutrients_per_100g.__dict__),
+                portions=[PortionOut(**portion.__dict__) for portion in food.portions],
+            )
+        )
+    return out
 
 
 class PhotoLogResponse(BaseModel):
@@ -369,31 +528,64 @@ def index() -> HTMLResponse:
 
 
 @app.post("/photo-log", response_model=PhotoLogResponse)
-async def create_photo_log(photo: UploadFile = File(...)) -> PhotoLogResponse:
-    payload = await photo.read()
-    if not payload:
-        raise HTTPException(status_code=400, detail="Photo payload is empty.")
-    candidates = run_on_device_inference(photo.filename or "upload", payload)
-    log_id = str(uuid.uuid4())
+async def create_photo_log(
+    photo: UploadFile = File(...), user_id: Optional[int] = Form(None)
+) -> PhotoLogResponse:
+    try:
+        upload = await read_upload(photo)
+    except UploadTooLarge as exc:
+        raise HTTPException(status_code=413, detail=str(exc))
+    with upload:
+        if not upload.size:
+            raise HTTPException(status_code=400, detail="Photo payload is empty.")
+        digest = upload.digest
+        owner = None if user_id is None else str(user_id)
+        cached = await run_in_threadpool(inference_cache.get, digest)
+        if cached is not None:
+            candidates = cached.candidates
+            if (
+                REUSE_PENDING_LOG
+                and owner is not None
+                and cached.owner == owner
+                and cached.log_id
+                and photo_log_store.status(cached.log_id) == "pending_confirmation"
+            ):
+                return PhotoLogResponse(
+                    log_id=cached.log_id,
+                    candidates=await run_in_threadpool(_candidates_out, candidates),
+                )
+        else:
+            try:
+                candidates = await inference_executor.infer(photo.filename or "upload", upload.payload())
+            except InferenceOverloaded as exc:
+                raise HTTPException(
+                    status_code=503,
+                    detail="Inference is busy, retry shortly.",
+                    headers={"Retry-After": str(exc.retry_after)},
+                )
+        log_id = str(uuid.uuid4())
+        # Writes, fsyncs and commits the reference; keep that off the event loop.
+        await run_in_threadpool(blob_store.put, digest, upload.chunks(), log_id, owner)
     log_photo(
         {
             "log_id": log_id,
             "filename": photo.filename,
             "content_type": photo.content_type,
+            "content_hash": digest,
             "status": "pending_confirmation",
             "candidates": [candidate.__dict__ for candidate in candidates],
         }
     )
+    await run_in_threadpool(inference_cache.put, digest, candidates, log_id, owner)
     return PhotoLogResponse(
         log_id=log_id,
-        candidates=[CandidateOut(label=c.label, confidence=c.confidence) for c in candidates],
+        candidates=await run_in_threadpool(_candidates_out, candidates),
     )
 
 
 @app.post("/photo-log/confirm", response_model=ConfirmationResponse)
 def confirm_photo_log(payload: ConfirmationPayload) -> ConfirmationResponse:
-    logs = iter_jsonl(Path(BASE_DIR / "data" / "photo_logs.jsonl"))
-    if not any(entry.get("log_id") == payload.log_id for entry in logs):
+    if not photo_log_store.exists(payload.log_id):
         raise HTTPException(status_code=404, detail="Log entry not found.")
 
     log_feedback(
@@ -419,6 +611,53 @@ def confirm_photo_log(payload: ConfirmationPayload) -> ConfirmationResponse:
     )
 
 
+@app.get("/inference/metrics")
+def inference_metrics() -> Dict:
+    return {**inference_executor.stats(), "cache": inference_cache.stats(), "uploads": upload_stats.snapshot()}
+
+
+def _json_array(records: Iterable[Tuple[int, Dict]]) -> Iterator[str]:
+    yield "["
+    for index, (cursor, record) in enumerate(records):
+        yield ("," if index else "") + json.dumps({"cursor": cursor, **record}, ensure_ascii=False)
+    yield "]"
+
+
 @app.get("/photo-log/recent")
-def recent_logs() -> List[dict]:
-    return iter_jsonl(Path(BASE_DIR / "data" / "photo_logs.jsonl"))
+def recent_logs(
+    limit: int = Query(50, ge=1, le=500),
+    before: Optional[int] = Query(None, ge=0),
+) -> StreamingResponse:
+    """Newest records first; pass the last record's ``cursor`` as ``before`` for the next page."""
+    try:
+        records = itertools.islice(photo_log_store.iter_recent(before), limit)
+    except CursorExpiredError as exc:
+        raise HTTPException(status_code=410, detail={"message": str(exc), "cursor": exc.cursor})
+    return StreamingResponse(_json_array(records), media_type="application/json")
+
+
+@app.get("/photo-log/{log_id}/photo")
+def get_photo(log_id: str) -> BlobResponse:
+    digest = blob_store.digest_for(log_id)
+    if digest is None:
+        raise HTTPException(status_code=404, detail="Photo not found.")
+    record = photo_log_store.get(log_id) or {}
+    try:
+        return BlobResponse(
+            blob_store.path_for(digest), digest, media_type=record.get("content_type") or "application/octet-stream"
+        )
+    except FileNotFoundError:
+        # Released since the lookup.
+        raise HTTPException(status_code=404, detail="Photo not found.")
+
+
+@app.delete("/photo-log/{log_id}/photo")
+def delete_photo(log_id: str) -> Dict:
+    if blob_store.digest_for(log_id) is None:
+        raise HTTPException(status_code=404, detail="Photo not found.")
+    return {"log_id": log_id, "blobs_deleted": len(blob_store.release(log_id))}
+
+
+@app.delete("/users/{user_id}/photos")
+def delete_account_photos(user_id: int) -> Dict:
+    return {"user_id": user_id, "blobs_deleted": len(blob_store.release_owner(str(user_id)))}
@@ -6,6 +6,7 @@ from sqlalchemy import (
     DateTime,
     Float,
     ForeignKey,
+    Index,
     Integer,
     String,
     UniqueConstraint,
@@ -27,6 +28,7 @@ class User(Base):
     daily_logs = relationship("DailyLog", back_populates="user", cascade="all, delete-orphan")
     weight_entries = relationship("WeightEntry", back_populates="user", cascade="all, delete-orphan")
     goal_config = relationship("GoalConfig", back_populates="user", uselist=False, cascade="all, delete-orphan")
+    sync_mutations = relationship("SyncMutation", back_populates="user", cascade="all, delete-orphan")
 
 
 class GoalConfig(Base):
@@ -90,6 +92,7 @@ class FoodItem(Base):
     carbs = Column(Float, nullable=False, default=0)
     fat = Column(Float, nullable=False, default=0)
     quantity = Column(Float, nullable=False, default=1)
+    updated_at = Column(DateTime(timezone=True), default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
 
     meal = relationship("Meal", back_populates="food_items")
 
@@ -119,5 +122,67 @@ class WeightEntry(Base):
     weight = Column(Float, nullable=False)
     note = Column(String, nullable=True)
     created_at = Column(DateTime(timezone=True), default=datetime.utcnow, nullable=False)
+    updated_at = Column(DateTime(timezone=True), default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
 
     user = relationship("User", back_populates="weight_entries")
+
+
+class SyncMutation(Base):
+    """Outcome of an offline mutation, keyed by the client's idempotency key."""
+
+    __tablename__ = "sync_mutations"
+    __table_args__ = (UniqueConstraint("user_id", "idempotency_key", name="uq_sync_mutation_key"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    idempotency_key = Column(String, nullable=False)
+    op = Column(String, nullable=False)
+    status = Column(String, nullable=False)
+    entity_id = Column(Integer, nullable=True)
+    detail = Column(String, nullable=True)
+    client_timestamp = Column(DateTime(timezone=True), nullable=False)
+    applied_at = Column(DateTime(timezone=True), default=datetime.utcnow, nullable=False)
+
+    user = relationship("User", back_populates="sync_mutations")
+
+
+class ChangeLogEntry(Base):
+    """One row per mutation; the autoincrement id doubles as the client's sync cursor.
+
+    AUTOINCREMENT keeps SQLite from reusing the ids of rows compaction deleted,
+    which would hand out cursors the checkpoint already marks as expired.
+    """
+
+    __tablename__ = "change_log"
+    __table_args__ = (Index("ix_change_log_user_cursor", "user_id", "id"), {"sqlite_autoincrement": True})
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    entity = Column(String, nullable=False)
+    entity_id = Column(Integer, nullable=False)
+    op = Column(String, nullable=False)
+    changed_at = Column(DateTime(timezone=True), default=datetime.utcnow, nullable=False, index=True)
+
+
+class ChangeLogCheckpoint(Base):
+    """Highest cursor removed by compaction; older cursors must resync from scratch."""
+
+    __tablename__ = "change_log_checkpoint"
+
+    id = Column(Integer, primary_key=True)
+    compacted_through = Column(Integer, nullable=False, default=0)
+    compacted_at = Column(DateTime(timezone=True), default=datetime.utcnow, nullable=False)
+
+
+class IdSequence(Base):
+    """Highest id handed out for one table inside one id bucket (sharded mode).
+
+    ``id`` is the bucket's first id plus the table's slot in
+    ``sharding.SEQUENCE_SLOTS``, so the row lives and moves with its bucket.
+    """
+
+    __tablename__ = "id_sequences"
+
+    id = Column(Integer, primary_key=True)
+    table_name = Column(String, nullable=False)
+    last_id = Column(Integer, nullable=False)
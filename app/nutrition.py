@@ -0,0 +1,94 @@
+"""Resolve photo candidate labels to catalog foods.
+
+The map from label to catalog item is computed once per catalog version:
+``resolve`` stats the catalog file and rebuilds the map only when its size or
+mtime changed, so a fresh ``catalog import`` is picked up without a restart.
+Labels the model can emit are matched up front; any other label is matched
+on first use and remembered until the next rebuild.
+"""
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Dict, FrozenSet, List, Mapping, Optional, Tuple
+
+from backend.catalog.pipeline import load_existing_catalog
+from backend.catalog.schema import FoodItem
+
+from .inference import FOOD_CANDIDATES
+from .storage import DATA_DIR
+
+CATALOG_FILE = Path(os.getenv("CALORIE_TRACKER_CATALOG", str(DATA_DIR / "catalog.json")))
+CATALOG_LOCALE = os.getenv("CALORIE_TRACKER_LOCALE", "en-US")
+# Locales to load from a sharded catalog (comma-separated); unset loads every locale.
+CATALOG_LOCALES = [
+    locale for locale in os.getenv("CALORIE_TRACKER_CATALOG_LOCALES", "").split(",") if locale.strip()
+] or None
+# Share of label and name tokens that must agree for a fuzzy match.
+MIN_MATCH_SCORE = 0.5
+
+
+def _tokens(text: str) -> FrozenSet[str]:
+    return frozenset(re.findall(r"[a-z0-9]+", text.lower()))
+
+
+class CandidateNutritionMap:
+    def __init__(
+        self, path: Path = CATALOG_FILE, locale: str = CATALOG_LOCALE, locales: Optional[List[str]] = CATALOG_LOCALES
+    ) -> None:
+        self.path = path
+        self.locale = locale
+        self.locales = locales
+        self.builds = 0
+        self._stamp: Optional[Tuple[int, int]] = None
+        self._catalog: Mapping[str, FoodItem] = {}
+        self._items: List[Tuple[FrozenSet[str], str]] = []
+        self._by_token: Dict[str, List[int]] = {}
+        self._labels: Dict[str, Optional[FoodItem]] = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, label: str) -> Optional[FoodItem]:
+        with self._lock:
+            self._refresh()
+            key = label.strip().lower()
+            if key not in self._labels:
+                self._labels[key] = self._match(key)
+            return self._labels[key]
+
+    def _refresh(self) -> None:
+        try:
+            stat = self.path.stat()
+            stamp = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            stamp = None
+        if stamp == self._stamp and self.builds:
+            return
+        catalog = load_existing_catalog(self.path, self.locales) if stamp else {}
+        # Index names from the merge keys (name::brand::locale) so binary catalogs stay undecoded.
+        self._catalog = catalog
+        self._items = [(_tokens(key.split("::", 1)[0]), key) for key in catalog]
+        self._by_token = {}
+        for index, (tokens, _) in enumerate(self._items):
+            for token in tokens:
+                self._by_token.setdefault(token, []).append(index)
+        self._labels = {label: self._match(label) for label in FOOD_CANDIDATES}
+        self._stamp = stamp
+        self.builds += 1
+
+    def _match(self, label: str) -> Optional[FoodItem]:
+        wanted = _tokens(label)
+        best: Optional[Tuple[float, bool, float]] = None
+        best_item = None
+        for index in {index for token in wanted for index in self._by_token.get(token, ())}:
+            tokens, key = self._items[index]
+            score = len(wanted & tokens) / len(wanted | tokens)
+            if score < MIN_MATCH_SCORE:
+                continue
+            item = self._catalog[key]
+            rank = (score, item.locale == self.locale, item.confidence)
+            if best is None or rank > best:
+                best, best_item = rank, item
+        return best_item
+
+
+candidate_nutrition = CandidateNutritionMap()
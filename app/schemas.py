@@ -1,5 +1,5 @@
 from datetime import date, datetime
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 
 from pydantic import BaseModel, EmailStr, Field
 
@@ -159,3 +159,44 @@ class WeeklySummary(BaseModel):
 class SummaryResponse(BaseModel):
     daily: List[DailySummary]
     weekly: List[WeeklySummary]
+
+
+class SyncMutationIn(BaseModel):
+    idempotency_key: str = Field(..., min_length=1, max_length=128)
+    client_timestamp: datetime
+    op: str
+    payload: Dict[str, Any] = Field(default_factory=dict)
+
+
+class SyncRequest(BaseModel):
+    mutations: List[SyncMutationIn] = Field(..., max_items=1000)
+
+
+class SyncMutationResult(BaseModel):
+    idempotency_key: str
+    op: str
+    status: str
+    entity_id: Optional[int] = None
+    detail: Optional[str] = None
+
+    class Config:
+        orm_mode = True
+
+
+class SyncResponse(BaseModel):
+    results: List[SyncMutationResult]
+    macro_totals: List[MacroTotalsOut]
+
+
+class ChangeOut(BaseModel):
+    cursor: int
+    entity: str
+    entity_id: int
+    op: str
+    data: Optional[Dict[str, Any]] = None
+
+
+class ChangeFeedOut(BaseModel):
+    changes: List[ChangeOut]
+    cursor: int
+    has_more: bool
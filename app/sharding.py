@@ -0,0 +1,334 @@
+"""Spread the SQLite store across several files so users stop sharing one writer lock.
+
+Every primary key carries a *bucket* in its high bits (``id >> ID_BITS``).
+A user's bucket is a hash of their email; every row they own is allocated an
+id inside the same bucket, so any id in a URL - user, daily log, meal, food
+item or weight entry - names the shard that holds it. Ids come from a
+per-bucket, per-table high-water mark in ``id_sequences``, so an id is never
+handed out twice even after its row is deleted. A JSON shard map assigns
+buckets to shard files, and ``python -m app.sharding rebalance`` moves buckets
+when shards are added or removed.
+"""
+import argparse
+import json
+import os
+import zlib
+from collections import defaultdict
+from functools import partial
+from pathlib import Path
+from typing import Dict, Iterable, List, Mapping, Optional
+
+from sqlalchemy import create_engine, delete, event, func, insert, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.horizontal_shard import ShardedSession
+from sqlalchemy.orm import Mapper, Session, object_session, sessionmaker
+
+BUCKETS = 1024
+ID_BITS = 40
+SHARD_FILE = "calorie_tracker.shard{index:02d}.db"
+SHARD_MAP_FILE = "shard_map.json"
+
+# Session.info keys: the router owning a sharded session, and the shard a
+# request is pinned to (queries fan out to every shard without one).
+ROUTER = "shard_router"
+SHARD_HINT = "shard_hint"
+
+# Column that places a new row in its owner's bucket, by table.
+OWNER_COLUMNS = {
+    "goal_configs": "user_id",
+    "daily_logs": "user_id",
+    "weight_entries": "user_id",
+    "sync_mutations": "user_id",
+    "change_log": "user_id",
+    "meals": "daily_log_id",
+    "macro_totals": "daily_log_id",
+    "food_items": "meal_id",
+}
+
+# Path parameters that identify the shard of a request, most specific first.
+ROUTING_PARAMS = ("user_id", "daily_log_id", "meal_id", "item_id", "entry_id")
+
+
+def bucket_of(row_id: int) -> int:
+    return row_id >> ID_BITS
+
+
+def bucket_for_email(email: str) -> int:
+    return zlib.crc32(email.strip().lower().encode("utf-8")) % BUCKETS
+
+
+def id_range(bucket: int) -> range:
+    low = bucket << ID_BITS
+    return range(low, low + (1 << ID_BITS))
+
+
+# Offset of each table's id_sequences row from its bucket's first id.
+SEQUENCE_SLOTS = {
+    "users": 1,
+    "goal_configs": 2,
+    "daily_logs": 3,
+    "meals": 4,
+    "food_items": 5,
+    "macro_totals": 6,
+    "weight_entries": 7,
+    "sync_mutations": 8,
+    "change_log": 9,
+}
+
+
+def _reserve_ids(execute, table, bucket: int, count: int) -> range:
+    """Reserve ``count`` ids for ``table`` in ``bucket`` past its persistent high-water mark.
+
+    The mark only grows, so ids of deleted rows (and change-log cursors removed
+    by compaction) are never handed out again. A bucket written before the
+    mark existed starts from its highest live id. ``execute`` runs a statement
+    on the bucket's shard inside the caller's transaction.
+    """
+    sequences = table.metadata.tables["id_sequences"]
+    ids = id_range(bucket)
+    slot = ids.start + SEQUENCE_SLOTS[table.name]
+    live_max = (
+        select(func.coalesce(func.max(table.c.id), ids.start))
+        .where(table.c.id >= ids.start, table.c.id < ids.stop)
+        .scalar_subquery()
+    )
+    upsert = sqlite_insert(sequences).values(id=slot, table_name=table.name, last_id=live_max + count)
+    # Writing first takes SQLite's write lock, so concurrent writers cannot read the same mark.
+    execute(upsert.on_conflict_do_update(index_elements=[sequences.c.id], set_={"last_id": sequences.c.last_id + count}))
+    last = execute(select(sequences.c.last_id).where(sequences.c.id == slot)).scalar_one()
+    return range(last - count + 1, last + 1)
+
+
+def bucket_for_row(table_name: str, values: Mapping) -> int:
+    """Bucket of a row about to be written, from its id or its owner's id."""
+    if values.get("id") is not None:
+        return bucket_of(values["id"])
+    if table_name == "users":
+        return bucket_for_email(values["email"])
+    column = OWNER_COLUMNS.get(table_name)
+    owner = values.get(column) if column else None
+    if owner is None:
+        raise ValueError(f"Cannot place a {table_name} row without its {column or 'id'}")
+    return bucket_of(owner)
+
+
+def _instance_bucket(mapper, instance) -> int:
+    table_name = mapper.local_table.name
+    column = OWNER_COLUMNS.get(table_name)
+    values = {"id": instance.id}
+    if table_name == "users":
+        values["email"] = instance.email
+    elif column:
+        values[column] = getattr(instance, column)
+    return bucket_for_row(table_name, values)
+
+
+class ShardMap:
+    """Bucket -> shard assignment, persisted as JSON next to the shard files."""
+
+    def __init__(self, shards: int, assignments: Optional[Dict[int, int]] = None) -> None:
+        if shards < 1:
+            raise ValueError("At least one shard is required")
+        self.shards = shards
+        self.assignments = assignments or {bucket: bucket % shards for bucket in range(BUCKETS)}
+
+    def shard_for_bucket(self, bucket: int) -> int:
+        return self.assignments[bucket]
+
+    def buckets_on(self, shard: int) -> List[int]:
+        return [bucket for bucket, owner in self.assignments.items() if owner == shard]
+
+    @classmethod
+    def load(cls, path: Path, shards: int) -> "ShardMap":
+        if not path.exists():
+            return cls(shards)
+        data = json.loads(path.read_text())
+        return cls(data["shards"], {int(bucket): shard for bucket, shard in data["buckets"].items()})
+
+    def save(self, path: Path) -> None:
+        # Write-then-rename so a crash never leaves a truncated map behind.
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        payload = {"shards": self.shards, "buckets": {str(b): s for b, s in sorted(self.assignments.items())}}
+        tmp_path.write_text(json.dumps(payload))
+        os.replace(tmp_path, path)
+
+
+class ShardRouter:
+    """Engines for every shard file plus the map deciding where each bucket lives."""
+
+    def __init__(self, directory: Path, shard_map: ShardMap) -> None:
+        self.directory = Path(directory)
+        self.shard_map = shard_map
+        self.engines = {index: self._create_engine(index) for index in range(shard_map.shards)}
+
+    @classmethod
+    def open(cls, directory: Path, shards: int) -> "ShardRouter":
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        shard_map = ShardMap.load(directory / SHARD_MAP_FILE, shards)
+        return cls(directory, shard_map)
+
+    def _create_engine(self, index: int):
+        path = self.directory / SHARD_FILE.format(index=index)
+        return create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+
+    def create_all(self, metadata) -> None:
+        from .database import create_schema
+
+        for engine in self.engines.values():
+            create_schema(metadata, engine)
+
+    def dispose(self) -> None:
+        for engine in self.engines.values():
+            engine.dispose()
+
+    def shard_for_id(self, row_id: int) -> int:
+        return self.shard_map.shard_for_bucket(bucket_of(row_id))
+
+    def shard_for_params(self, params: Mapping[str, str]) -> Optional[int]:
+        """Shard named by a request's path parameters, or None to fan out."""
+        for name in ROUTING_PARAMS:
+            try:
+                return self.shard_for_id(int(params[name]))
+            except (KeyError, ValueError):
+                continue
+        return None
+
+    def sessionmaker(self) -> sessionmaker:
+        def shard_chooser(mapper, instance, clause=None):
+            if instance is not None:
+                return self.shard_map.shard_for_bucket(_instance_bucket(mapper, instance))
+            return 0
+
+        def id_chooser(query, ident):
+            return [self.shard_for_id(ident[0])]
+
+        def execute_chooser(context):
+            hint = context.session.info.get(SHARD_HINT)
+            return [hint] if hint is not None else list(self.engines)
+
+        return sessionmaker(
+            class_=ShardedSession,
+            autocommit=False,
+            autoflush=False,
+            shards=self.engines,
+            shard_chooser=shard_chooser,
+            id_chooser=id_chooser,
+            execute_chooser=execute_chooser,
+            info={ROUTER: self},
+        )
+
+
+@event.listens_for(Mapper, "before_insert")
+def _allocate_bucket_id(mapper, connection, target) -> None:
+    """Give rows written through a sharded session an id inside their bucket."""
+    session = object_session(target)
+    if session is None or ROUTER not in session.info or target.id is not None:
+        return
+    table = mapper.local_table
+    target.id = _reserve_ids(connection.execute, table, _instance_bucket(mapper, target), 1).start
+
+
+def bulk_insert(db: Session, table, rows: List[Dict]) -> None:
+    """executemany ``rows`` into ``table``, one statement per bucket in sharded sessions."""
+    router: Optional[ShardRouter] = db.info.get(ROUTER)
+    if router is None:
+        db.execute(insert(table), rows)
+        return
+    by_bucket: Dict[int, List[Dict]] = defaultdict(list)
+    for row in rows:
+        by_bucket[bucket_for_row(table.name, row)].append(row)
+    for bucket, bucket_rows in by_bucket.items():
+        bind_arguments = {"shard_id": router.shard_map.shard_for_bucket(bucket)}
+        ids = _reserve_ids(partial(db.execute, bind_arguments=bind_arguments), table, bucket, len(bucket_rows))
+        db.execute(
+            insert(table),
+            [dict(row, id=row_id) for row, row_id in zip(bucket_rows, ids)],
+            bind_arguments=bind_arguments,
+        )
+
+
+def _copy_bucket(metadata, source, target, bucket: int) -> int:
+    """Copy one bucket's rows into ``target``, replacing any partial earlier copy."""
+    ids = id_range(bucket)
+    copied = 0
+    with source.connect() as reader, target.begin() as writer:
+        for table in reversed(metadata.sorted_tables):
+            writer.execute(delete(table).where(table.c.id >= ids.start, table.c.id < ids.stop))
+        for table in metadata.sorted_tables:
+            rows = reader.execute(
+                select(table).where(table.c.id >= ids.start, table.c.id < ids.stop)
+            ).mappings().all()
+            if rows:
+                writer.execute(insert(table), [dict(row) for row in rows])
+                copied += len(rows)
+    return copied
+
+
+def _drop_bucket(metadata, engine, bucket: int) -> None:
+    ids = id_range(bucket)
+    with engine.begin() as conn:
+        for table in reversed(metadata.sorted_tables):
+            conn.execute(delete(table).where(table.c.id >= ids.start, table.c.id < ids.stop))
+
+
+def rebalance(router: ShardRouter, metadata, shards: int, buckets: Optional[Iterable[int]] = None) -> Dict[int, int]:
+    """Spread buckets evenly over ``shards`` files; returns rows moved per bucket.
+
+    Each bucket is copied, the map is saved, and only then is the old copy
+    dropped, so an interrupted run can simply be repeated. Run it while the API
+    is stopped: servers read the map once at start-up.
+    """
+    target_map = ShardMap(shards)
+    for index in range(shards):
+        if index not in router.engines:
+            router.engines[index] = router._create_engine(index)
+    router.create_all(metadata)
+
+    moved: Dict[int, int] = {}
+    for bucket in buckets if buckets is not None else range(BUCKETS):
+        source = router.shard_map.shard_for_bucket(bucket)
+        destination = target_map.shard_for_bucket(bucket)
+        if source == destination:
+            continue
+        moved[bucket] = _copy_bucket(metadata, router.engines[source], router.engines[destination], bucket)
+        router.shard_map.assignments[bucket] = destination
+        router.shard_map.save(router.directory / SHARD_MAP_FILE)
+        _drop_bucket(metadata, router.engines[source], bucket)
+
+    router.shard_map.shards = shards
+    router.shard_map.save(router.directory / SHARD_MAP_FILE)
+    for index in [index for index in router.engines if index >= shards]:
+        router.engines.pop(index).dispose()
+    return moved
+
+
+def main() -> None:
+    from . import models  # noqa: F401 - registers the tables on Base.metadata
+    from .database import SHARD_DIR, SHARDS, Base
+
+    parser = argparse.ArgumentParser(description="Shard maintenance")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    rebalance_parser = subparsers.add_parser("rebalance", help="Move buckets onto a new number of shards")
+    rebalance_parser.add_argument("--shards", type=int, required=True)
+    subparsers.add_parser("status", help="Print buckets and users per shard")
+    args = parser.parse_args()
+
+    router = ShardRouter.open(Path(SHARD_DIR), SHARDS)
+    try:
+        if args.command == "rebalance":
+            moved = rebalance(router, Base.metadata, args.shards)
+            print(f"Moved {len(moved)} buckets ({sum(moved.values())} rows) onto {args.shards} shards")
+        else:
+            router.create_all(Base.metadata)
+            for index, engine in sorted(router.engines.items()):
+                with engine.connect() as conn:
+                    users = conn.execute(select(func.count()).select_from(models.User.__table__)).scalar()
+                buckets = len(router.shard_map.buckets_on(index))
+                print(f"shard {index:02d}: {buckets} buckets, {users} users")
+    finally:
+        router.dispose()
+
+
+if __name__ == "__main__":
+    main()
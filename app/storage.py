@@ -1,11 +1,32 @@
+import argparse
 import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import dataclass
 from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Dict, Iterable
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .writer import FSYNC_POLICY, GroupCommitWriter, shared_writer, writer_for
 
 DATA_DIR = Path(__file__).resolve().parent.parent / "data"
-LOG_FILE = DATA_DIR / "photo_logs.jsonl"
+LOG_NAME = "photo_logs"
 FEEDBACK_FILE = DATA_DIR / "feedback.jsonl"
+REVERSE_BLOCK_SIZE = 64 * 1024
+SEGMENT_MAX_BYTES = 8 * 1024 * 1024
+SEGMENT_MAX_SECONDS = 24 * 60 * 60
+COMPACT_INTERVAL_SECONDS = 5 * 60
+# Cursors pack the compaction generation above the segment number above the
+# byte offset within the segment.
+CURSOR_OFFSET_BITS = 40
+CURSOR_SEGMENT_BITS = 20
+
+logger = logging.getLogger(__name__)
 
 
 def _ensure_data_dir() -> None:
@@ -22,18 +43,533 @@ def append_jsonl(path: Path, record: Dict[str, Any]) -> None:
         handle.write(json.dumps(record, ensure_ascii=False) + "\n")
 
 
-def log_photo(record: Dict[str, Any]) -> None:
+class CursorExpiredError(LookupError):
+    def __init__(self, cursor: int):
+        super().__init__("Cursor predates the last photo log compaction")
+        self.cursor = cursor
+
+
+@dataclass(frozen=True)
+class IndexEntry:
+    segment: str
+    offset: int
+    status: Optional[str]
+
+
+@dataclass(frozen=True)
+class CompactionReport:
+    segments: int
+    records_before: int
+    records_after: int
+    bytes_before: int
+    bytes_after: int
+    scan_seconds_before: float
+    scan_seconds_after: float
+
+    @property
+    def reclaimed_bytes(self) -> int:
+        return self.bytes_before - self.bytes_after
+
+
+class PhotoLogStore:
+    """Photo logs in rotated JSONL segments with a persistent ``log_id`` index.
+
+    Appends are group-committed by a shared :class:`GroupCommitWriter` (the
+    store is its sink) to the newest ("active") segment, which is sealed once
+    it reaches ``max_segment_bytes`` or ``max_segment_seconds``. The segments
+    stay the source of truth. Each append also writes an ``IndexEntry``
+    pointing at the log's latest line to a sidecar index file, loaded into a
+    dict on first use. Lines the index has not seen yet (a crash between the
+    two writes, or another process appending) are picked up by scanning only
+    past the last indexed position.
+
+    ``compact`` folds every record of a log in the sealed segments into one
+    line holding its merged state. Only sealed segments are rewritten, so
+    appends carry on meanwhile. The segment it compacted through and a
+    generation counter are kept in a sidecar file; cursors carry the
+    generation, so one pointing into segments rewritten since it was issued
+    is rejected instead of skipping or repeating records.
+    """
+
+    def __init__(
+        self,
+        directory: Path = DATA_DIR,
+        name: str = LOG_NAME,
+        max_segment_bytes: int = SEGMENT_MAX_BYTES,
+        max_segment_seconds: float = SEGMENT_MAX_SECONDS,
+        fsync_policy: str = FSYNC_POLICY,
+    ) -> None:
+        self.directory = directory
+        self.name = name
+        self.index_path = directory / f"{name}.index.jsonl"
+        self.compaction_path = directory / f"{name}.compaction.json"
+        self.max_segment_bytes = max_segment_bytes
+        self.max_segment_seconds = max_segment_seconds
+        self.fsync_policy = fsync_policy
+        self.last_compaction: Optional[CompactionReport] = None
+        self._segment_pattern = re.compile(rf"^{re.escape(name)}\.(\d+)\.jsonl$")
+        self._index: Dict[str, IndexEntry] = {}
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._active = 0
+        self._active_since = time.monotonic()
+        self._scanned = (0, 0)
+        self._compacted_through = -1
+        self._generation = 0
+        self._loaded = False
+        self._lock = threading.Lock()
+        self._handle = None
+        self._handle_segment = 0
+        self._compactor: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def segment_path(self, segment: int) -> Path:
+        return self.directory / f"{self.name}.{segment:06d}.jsonl"
+
+    def segments(self) -> List[int]:
+        if not self.directory.exists():
+            return []
+        found = (self._segment_pattern.match(path.name) for path in self.directory.iterdir())
+        return sorted(int(match.group(1)) for match in found if match)
+
+    def submit(self, record: Dict[str, Any]) -> Future:
+        """Queue ``record`` for the next group commit; the future resolves to its ``IndexEntry``."""
+        writer = shared_writer(
+            self,
+            lambda: GroupCommitWriter(self, self.fsync_policy, name=f"{self.name}-writer"),
+        )
+        log_id = record.get("log_id")
+        if log_id is not None:
+            # Visible to exists()/get() before the writer thread gets to it.
+            with self._lock:
+                self._pending[log_id] = record
+        return writer.submit(record)
+
+    def append(self, record: Dict[str, Any]) -> Optional[IndexEntry]:
+        """Submit and block until the record is durable under the fsync policy."""
+        return self.submit(record).result()
+
+    def write_batch(self, records: List[Dict[str, Any]]) -> List[Optional[IndexEntry]]:
+        """Called from the writer thread: append a batch, rotating segments as needed."""
+        with self._lock:
+            try:
+                return self._write_locked(records)
+            finally:
+                for record in records:
+                    if self._pending.get(record.get("log_id")) is record:
+                        del self._pending[record["log_id"]]
+
+    def _write_locked(self, records: List[Dict[str, Any]]) -> List[Optional[IndexEntry]]:
+        self._ensure_loaded()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._catch_up()
+        entries: List[Optional[IndexEntry]] = []
+        persisted: List[Tuple[str, IndexEntry]] = []
+        size = self._open_active()
+        chunk: List[bytes] = []
+        for record in records:
+            line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+            # Segment age is counted from when this process loaded or rotated it.
+            expired = time.monotonic() - self._active_since >= self.max_segment_seconds
+            if size and (size + len(line) > self.max_segment_bytes or expired):
+                self._handle.write(b"".join(chunk))
+                chunk = []
+                self._active += 1
+                self._active_since = time.monotonic()
+                size = self._open_active()
+            chunk.append(line)
+            entry = self._remember(record.get("log_id"), self._active, size, record.get("status"))
+            entries.append(entry)
+            if entry is not None:
+                persisted.append((record["log_id"], entry))
+            size += len(line)
+        self._handle.write(b"".join(chunk))
+        self._scanned = (self._active, size)
+        if persisted:
+            self._persist(persisted)
+        return entries
+
+    def sync(self) -> None:
+        with self._lock:
+            if self._handle is not None:
+                os.fsync(self._handle.fileno())
+
+    def close(self) -> None:
+        with self._lock:
+            if self._handle is not None:
+                self._handle.close()
+                self._handle = None
+
+    def exists(self, log_id: str) -> bool:
+        return log_id in self._pending or self.lookup(log_id) is not None
+
+    def status(self, log_id: str) -> Optional[str]:
+        """Status of the latest record for ``log_id``, including ones still queued."""
+        pending = self._pending.get(log_id)
+        if pending is not None:
+            return pending.get("status")
+        entry = self.lookup(log_id)
+        return entry.status if entry else None
+
+    def lookup(self, log_id: str) -> Optional[IndexEntry]:
+        with self._lock:
+            self._ensure_loaded()
+            entry = self._index.get(log_id)
+            if entry is None:
+                self._catch_up()
+                entry = self._index.get(log_id)
+            return entry
+
+    def get(self, log_id: str) -> Optional[Dict[str, Any]]:
+        """Latest record for ``log_id``, read with a single seek once written."""
+        with self._lock:
+            if log_id in self._pending:
+                return dict(self._pending[log_id])
+            self._ensure_loaded()
+            entry = self._index.get(log_id)
+            if entry is None:
+                self._catch_up()
+                entry = self._index.get(log_id)
+            if entry is None:
+                return None
+            # Read under the lock so compaction cannot swap the segment underneath.
+            with (self.directory / entry.segment).open("rb") as handle:
+                handle.seek(entry.offset)
+                return json.loads(handle.readline())
+
+    def iter_recent(self, before: Optional[int] = None) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """Records newest first as ``(cursor, record)``; pass a cursor back as ``before``.
+
+        Raises ``CursorExpiredError`` straight away when ``before`` points into
+        a segment compacted after the cursor was handed out.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            generation, compacted_through = self._generation, self._compacted_through
+        last_segment = last_offset = None
+        if before is not None:
+            cursor_generation, last_segment, last_offset = self._split_cursor(before)
+            if cursor_generation != generation and last_segment <= compacted_through:
+                raise CursorExpiredError(before)
+        return self._iter_recent(generation, last_segment, last_offset)
+
+    def _iter_recent(
+        self,
+        generation: int,
+        last_segment: Optional[int],
+        last_offset: Optional[int],
+    ) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        for segment in reversed(self.segments()):
+            if last_segment is not None and segment > last_segment:
+                continue
+            offset = last_offset if segment == last_segment else None
+            for start, record in iter_jsonl_reverse(self.segment_path(segment), offset):
+                yield self._make_cursor(generation, segment, start), record
+
+    @staticmethod
+    def _make_cursor(generation: int, segment: int, offset: int) -> int:
+        return (((generation << CURSOR_SEGMENT_BITS) | segment) << CURSOR_OFFSET_BITS) | offset
+
+    @staticmethod
+    def _split_cursor(cursor: int) -> Tuple[int, int, int]:
+        position = cursor >> CURSOR_OFFSET_BITS
+        return (
+            position >> CURSOR_SEGMENT_BITS,
+            position & ((1 << CURSOR_SEGMENT_BITS) - 1),
+            cursor & ((1 << CURSOR_OFFSET_BITS) - 1),
+        )
+
+    def _open_active(self) -> int:
+        """Point the append handle at the active segment; returns its size."""
+        if self._handle is not None and self._handle_segment != self._active:
+            # Sealed: make it durable before letting go of it.
+            os.fsync(self._handle.fileno())
+            self._handle.close()
+            self._handle = None
+        if self._handle is None:
+            self._handle = self.segment_path(self._active).open("ab", buffering=0)
+            self._handle_segment = self._active
+        return self._handle.seek(0, os.SEEK_END)
+
+    def _remember(
+        self,
+        log_id: Optional[str],
+        segment: int,
+        offset: int,
+        status: Optional[str],
+    ) -> Optional[IndexEntry]:
+        if log_id is None:
+            return None
+        entry = IndexEntry(segment=self.segment_path(segment).name, offset=offset, status=status)
+        self._index[log_id] = entry
+        return entry
+
+    def _persist(self, entries: List[Tuple[str, IndexEntry]]) -> None:
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        with self.index_path.open("a", encoding="utf-8") as handle:
+            for log_id, entry in entries:
+                handle.write(json.dumps({"log_id": log_id, **entry.__dict__}) + "\n")
+
+    def _segment_number(self, name: str) -> int:
+        return int(self._segment_pattern.match(name).group(1))
+
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+        legacy = self.directory / f"{self.name}.jsonl"
+        if legacy.exists() and not self.segments():
+            # Adopt a pre-segmentation log as segment 0; its offsets are unchanged.
+            os.replace(legacy, self.segment_path(0))
+            self.index_path.unlink(missing_ok=True)
+        if self.compaction_path.exists():
+            watermark = json.loads(self.compaction_path.read_text())
+            self._compacted_through = watermark["through"]
+            self._generation = watermark["generation"]
+        segments = self.segments()
+        self._active = segments[-1] if segments else 0
+        if not self.index_path.exists():
+            self._catch_up()
+            return
+        with self.index_path.open("r", encoding="utf-8") as handle:
+            for line in handle:
+                try:
+                    data = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn final line; the segment scan below recovers it.
+                    break
+                entry = IndexEntry(data["segment"], data["offset"], data["status"])
+                self._index[data["log_id"]] = entry
+                self._scanned = max(self._scanned, (self._segment_number(entry.segment), entry.offset))
+        segment, offset = self._scanned
+        if self._index and self.segment_path(segment).exists():
+            # Step over the last indexed line itself.
+            with self.segment_path(segment).open("rb") as handle:
+                handle.seek(offset)
+                self._scanned = (segment, offset + len(handle.readline()))
+        self._catch_up()
+
+    def _catch_up(self) -> None:
+        found: List[Tuple[str, IndexEntry]] = []
+        for segment in self.segments():
+            if segment < self._scanned[0]:
+                continue
+            if segment > self._scanned[0]:
+                self._scanned = (segment, 0)
+            with self.segment_path(segment).open("rb") as handle:
+                handle.seek(self._scanned[1])
+                for line in iter(handle.readline, b""):
+                    if not line.endswith(b"\n"):
+                        # Partially written by a concurrent appender; retry next time.
+                        break
+                    offset = self._scanned[1]
+                    self._scanned = (segment, offset + len(line))
+                    if line.strip():
+                        record = json.loads(line)
+                        entry = self._remember(record.get("log_id"), segment, offset, record.get("status"))
+                        if entry is not None:
+                            found.append((record["log_id"], entry))
+            self._active = max(self._active, segment)
+        if found:
+            self._persist(found)
+
+    def compact(self) -> Optional[CompactionReport]:
+        """Merge the records of every sealed segment into one segment per log.
+
+        The merged file is written beside the newest sealed segment and
+        renamed over it; only then are the older sealed segments deleted. The
+        index is dropped before the swap and rewritten after it, so a crash at
+        any point leaves either the old files or a state the index is rebuilt
+        from on the next start. The new watermark is saved before the swap, so
+        a crash can only expire cursors early, never let a stale one through.
+        """
+        with self._lock:
+            self._ensure_loaded()
+            self._catch_up()
+            sealed = [segment for segment in self.segments() if segment < self._active]
+        if not sealed or (len(sealed) == 1 and sealed[0] <= self._compacted_through):
+            return None
+
+        started = time.perf_counter()
+        merged: "OrderedDict[Any, Dict[str, Any]]" = OrderedDict()
+        records_before = bytes_before = 0
+        for segment in sealed:
+            bytes_before += self.segment_path(segment).stat().st_size
+            for record in iter_jsonl(self.segment_path(segment)):
+                records_before += 1
+                key = record.get("log_id") or ("", records_before)
+                merged[key] = {**merged.pop(key, {}), **record}
+        scan_seconds_before = time.perf_counter() - started
+
+        target = self.segment_path(sealed[-1])
+        tmp_path = target.with_suffix(".jsonl.tmp")
+        offsets: Dict[str, Tuple[int, Optional[str]]] = {}
+        with tmp_path.open("wb") as handle:
+            for key, record in merged.items():
+                if isinstance(key, str):
+                    offsets[key] = (handle.tell(), record.get("status"))
+                handle.write((json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8"))
+            handle.flush()
+            os.fsync(handle.fileno())
+        bytes_after = tmp_path.stat().st_size
+
+        sealed_names = {self.segment_path(segment).name for segment in sealed}
+        with self._lock:
+            self._save_watermark(sealed[-1], self._generation + 1)
+            self.index_path.unlink(missing_ok=True)
+            os.replace(tmp_path, target)
+            for segment in sealed[:-1]:
+                self.segment_path(segment).unlink(missing_ok=True)
+            for log_id, entry in self._index.items():
+                if entry.segment in sealed_names:
+                    offset, status = offsets[log_id]
+                    self._index[log_id] = IndexEntry(target.name, offset, status)
+            index_tmp = self.index_path.with_suffix(".jsonl.tmp")
+            with index_tmp.open("w", encoding="utf-8") as handle:
+                for log_id, entry in self._index.items():
+                    handle.write(json.dumps({"log_id": log_id, **entry.__dict__}) + "\n")
+            os.replace(index_tmp, self.index_path)
+
+        started = time.perf_counter()
+        records_after = sum(1 for _ in iter_jsonl(target))
+        report = CompactionReport(
+            segments=len(sealed),
+            records_before=records_before,
+            records_after=records_after,
+            bytes_before=bytes_before,
+            bytes_after=bytes_after,
+            scan_seconds_before=scan_seconds_before,
+            scan_seconds_after=time.perf_counter() - started,
+        )
+        self.last_compaction = report
+        return report
+
+    def _save_watermark(self, through: int, generation: int) -> None:
+        tmp_path = self.compaction_path.with_suffix(".json.tmp")
+        with tmp_path.open("w", encoding="utf-8") as handle:
+            json.dump({"through": through, "generation": generation}, handle)
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(tmp_path, self.compaction_path)
+        self._compacted_through, self._generation = through, generation
+
+    def start_compactor(self, interval: float = COMPACT_INTERVAL_SECONDS) -> None:
+        if self._compactor is not None:
+            return
+        self._stop.clear()
+        self._compactor = threading.Thread(
+            target=self._compact_periodically,
+            args=(interval,),
+            name=f"{self.name}-compactor",
+            daemon=True,
+        )
+        self._compactor.start()
+
+    def stop_compactor(self) -> None:
+        if self._compactor is None:
+            return
+        self._stop.set()
+        self._compactor.join()
+        self._compactor = None
+
+    def _compact_periodically(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            try:
+                report = self.compact()
+            except Exception:
+                logger.exception("Photo log compaction failed")
+                continue
+            if report is not None:
+                logger.info(
+                    "Compacted %d photo log segments: %d -> %d records, %d bytes reclaimed",
+                    report.segments,
+                    report.records_before,
+                    report.records_after,
+                    report.reclaimed_bytes,
+                )
+
+
+photo_log_store = PhotoLogStore()
+
+
+def log_photo(record: Dict[str, Any]) -> Future:
     record = {"created_at": _utc_now(), **record}
-    append_jsonl(LOG_FILE, record)
+    return photo_log_store.submit(record)
 
 
-def log_feedback(record: Dict[str, Any]) -> None:
+def log_feedback(record: Dict[str, Any]) -> Future:
     record = {"created_at": _utc_now(), **record}
-    append_jsonl(FEEDBACK_FILE, record)
+    return writer_for(FEEDBACK_FILE).submit(record)
 
 
-def iter_jsonl(path: Path) -> Iterable[Dict[str, Any]]:
+def iter_jsonl(path: Path) -> Iterator[Dict[str, Any]]:
     if not path.exists():
-        return []
+        return
     with path.open("r", encoding="utf-8") as handle:
-        return [json.loads(line) for line in handle if line.strip()]
+        for line in handle:
+            if line.strip():
+                yield json.loads(line)
+
+
+def iter_jsonl_reverse(
+    path: Path,
+    before: Optional[int] = None,
+    block_size: int = REVERSE_BLOCK_SIZE,
+) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """Yield ``(offset, record)`` newest first, reading backwards from EOF in blocks.
+
+    ``before`` is the offset of a line already returned; only lines starting
+    before it are yielded. A trailing line without its newline is still being
+    written and is skipped.
+    """
+    if not path.exists():
+        return
+    with path.open("rb") as handle:
+        position = handle.seek(0, os.SEEK_END)
+        if before is not None:
+            position = min(position, before)
+        buffer = b""
+        complete = before is not None and position > 0
+        while position > 0 or buffer:
+            if position > 0:
+                read = min(block_size, position)
+                position -= read
+                handle.seek(position)
+                buffer = handle.read(read) + buffer
+            if not complete:
+                newline = buffer.rfind(b"\n")
+                if newline == -1 and position > 0:
+                    continue
+                buffer = buffer[: newline + 1]
+                complete = True
+            while buffer:
+                newline = buffer.rfind(b"\n", 0, len(buffer) - 1)
+                if newline == -1:
+                    if position > 0:
+                        break
+                    line, start, buffer = buffer, 0, b""
+                else:
+                    line, start, buffer = buffer[newline + 1 :], position + newline + 1, buffer[: newline + 1]
+                if line.strip():
+                    yield start, json.loads(line)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Photo log maintenance")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("compact", help="Merge sealed photo log segments")
+    args = parser.parse_args()
+
+    if args.command == "compact":
+        report = photo_log_store.compact()
+        if report is None:
+            print("Nothing to compact")
+            return
+        print(
+            f"Compacted {report.segments} segments: {report.records_before} -> {report.records_after} records, "
+            f"{report.reclaimed_bytes} bytes reclaimed, full scan "
+            f"{report.scan_seconds_before * 1000:.1f}ms -> {report.scan_seconds_after * 1000:.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+"""Apply batches of offline mutations replayed by a reconnecting client.
+
+Every mutation carries a client-generated idempotency key and the time it was
+made on the device. A batch is applied in a single transaction: replays of a
+key return the recorded outcome, writes older than the row they target lose
+(last writer wins on ``updated_at``, with device times in the future clamped
+to the server's clock), and macro totals are recomputed once per
+affected daily log.
+"""
+from datetime import date, datetime, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from pydantic import BaseModel, Field, ValidationError
+from sqlalchemy.orm import Session
+
+from . import crud, models, schemas
+
+APPLIED = "applied"
+DUPLICATE = "duplicate"
+STALE = "stale"
+NOT_FOUND = "not_found"
+REJECTED = "rejected"
+
+
+class WeightEntryPayload(BaseModel):
+    entry_date: date
+    weight: float
+    note: Optional[str] = None
+
+
+class WeightEntryKey(BaseModel):
+    entry_date: date
+
+
+class FoodItemPayload(schemas.FoodItemCreate):
+    meal_id: int
+
+
+class FoodItemUpdatePayload(BaseModel):
+    item_id: int
+    name: Optional[str] = None
+    calories: Optional[int] = None
+    protein: Optional[float] = None
+    carbs: Optional[float] = None
+    fat: Optional[float] = None
+    quantity: Optional[float] = Field(default=None, ge=0)
+
+
+class FoodItemKey(BaseModel):
+    item_id: int
+
+
+class _Batch:
+    """Rows touched by a batch, prefetched so each mutation is a dict lookup."""
+
+    def __init__(self, db: Session, user_id: int, mutations: List[schemas.SyncMutationIn]) -> None:
+        self.db = db
+        self.user_id = user_id
+        self.affected_logs: Set[int] = set()
+        entry_dates: Set[date] = set()
+        item_ids: Set[int] = set()
+        meal_ids: Set[int] = set()
+        for mutation in mutations:
+            payload = mutation.payload
+            if "entry_date" in payload:
+                try:
+                    entry_dates.add(date.fromisoformat(str(payload["entry_date"])))
+                except ValueError:
+                    pass
+            if isinstance(payload.get("item_id"), int):
+                item_ids.add(payload["item_id"])
+            if isinstance(payload.get("meal_id"), int):
+                meal_ids.add(payload["meal_id"])
+
+        self.weight_entries: Dict[date, models.WeightEntry] = {}
+        if entry_dates:
+            rows = (
+                db.query(models.WeightEntry)
+                .filter(
+                    models.WeightEntry.user_id == user_id,
+                    models.WeightEntry.entry_date.in_(entry_dates),
+                )
+                .all()
+            )
+            self.weight_entries = {row.entry_date: row for row in rows}
+
+        self.food_items: Dict[int, Tuple[models.FoodItem, int]] = {}
+        if item_ids:
+            rows = (
+                db.query(models.FoodItem, models.Meal.daily_log_id)
+                .join(models.Meal, models.Meal.id == models.FoodItem.meal_id)
+                .join(models.DailyLog, models.DailyLog.id == models.Meal.daily_log_id)
+                .filter(models.FoodItem.id.in_(item_ids), models.DailyLog.user_id == user_id)
+                .all()
+            )
+            self.food_items = {item.id: (item, daily_log_id) for item, daily_log_id in rows}
+
+        self.meals: Dict[int, models.Meal] = {}
+        if meal_ids:
+            rows = (
+                db.query(models.Meal)
+                .join(models.DailyLog, models.DailyLog.id == models.Meal.daily_log_id)
+                .filter(models.Meal.id.in_(meal_ids), models.DailyLog.user_id == user_id)
+                .all()
+            )
+            self.meals = {row.id: row for row in rows}
+
+
+def _naive_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _is_stale(row_updated_at: Optional[datetime], client_timestamp: datetime) -> bool:
+    return row_updated_at is not None and _naive_utc(row_updated_at) > client_timestamp
+
+
+def _upsert_weight_entry(batch: _Batch, data: Dict, client_timestamp: datetime) -> Tuple[str, Optional[int]]:
+    payload = WeightEntryPayload(**data)
+    entry = batch.weight_entries.get(payload.entry_date)
+    op = crud.UPDATE
+    if entry is None:
+        entry = models.WeightEntry(user_id=batch.user_id, entry_date=payload.entry_date)
+        batch.db.add(entry)
+        batch.weight_entries[payload.entry_date] = entry
+        op = crud.INSERT
+    elif _is_stale(entry.updated_at, client_timestamp):
+        return STALE, entry.id
+    entry.weight = payload.weight
+    entry.note = payload.note
+    entry.updated_at = client_timestamp
+    batch.db.flush()
+    crud.record_change(batch.db, batch.user_id, "weight_entry", entry.id, op)
+    return APPLIED, entry.id
+
+
+def _delete_weight_entry(batch: _Batch, data: Dict, client_timestamp: datetime) -> Tuple[str, Optional[int]]:
+    payload = WeightEntryKey(**data)
+    entry = batch.weight_entries.get(payload.entry_date)
+    if entry is None:
+        return NOT_FOUND, None
+    if _is_stale(entry.updated_at, client_timestamp):
+        return STALE, entry.id
+    crud.record_change(batch.db, batch.user_id, "weight_entry", entry.id, crud.DELETE)
+    batch.db.delete(entry)
+    batch.db.flush()
+    del batch.weight_entries[payload.entry_date]
+    return APPLIED, entry.id
+
+
+def _create_food_item(batch: _Batch, data: Dict, client_timestamp: datetime) -> Tuple[str, Optional[int]]:
+    payload = FoodItemPayload(**data)
+    meal = batch.meals.get(payload.meal_id)
+    if meal is None:
+        return NOT_FOUND, None
+    item = models.FoodItem(**payload.dict(), updated_at=client_timestamp)
+    batch.db.add(item)
+    batch.db.flush()
+    crud.record_change(batch.db, batch.user_id, "food_item", item.id, crud.INSERT)
+    batch.food_items[item.id] = (item, meal.daily_log_id)
+    batch.affected_logs.add(meal.daily_log_id)
+    return APPLIED, item.id
+
+
+def _update_food_item(batch: _Batch, data: Dict, client_timestamp: datetime) -> Tuple[str, Optional[int]]:
+    payload = FoodItemUpdatePayload(**data)
+    found = batch.food_items.get(payload.item_id)
+    if found is None:
+        return NOT_FOUND, None
+    item, daily_log_id = found
+    if _is_stale(item.updated_at, client_timestamp):
+        return STALE, item.id
+    for key, value in payload.dict(exclude={"item_id"}, exclude_unset=True).items():
+        setattr(item, key, value)
+    item.updated_at = client_timestamp
+    crud.record_change(batch.db, batch.user_id, "food_item", item.id, crud.UPDATE)
+    batch.affected_logs.add(daily_log_id)
+    return APPLIED, item.id
+
+
+def _delete_food_item(batch: _Batch, data: Dict, client_timestamp: datetime) -> Tuple[str, Optional[int]]:
+    payload = FoodItemKey(**data)
+    found = batch.food_items.get(payload.item_id)
+    if found is None:
+        return NOT_FOUND, None
+    item, daily_log_id = found
+    if _is_stale(item.updated_at, client_timestamp):
+        return STALE, item.id
+    crud.record_change(batch.db, batch.user_id, "food_item", item.id, crud.DELETE)
+    batch.db.delete(item)
+    batch.db.flush()
+    del batch.food_items[item.id]
+    batch.affected_logs.add(daily_log_id)
+    return APPLIED, item.id
+
+
+HANDLERS: Dict[str, Callable[[_Batch, Dict, datetime], Tuple[str, Optional[int]]]] = {
+    "upsert_weight_entry": _upsert_weight_entry,
+    "delete_weight_entry": _delete_weight_entry,
+    "create_food_item": _create_food_item,
+    "update_food_item": _update_food_item,
+    "delete_food_item": _delete_food_item,
+}
+
+
+def _recorded_mutations(db: Session, user_id: int, keys: Iterable[str]) -> Dict[str, models.SyncMutation]:
+    keys = list(keys)
+    if not keys:
+        return {}
+    rows = (
+        db.query(models.SyncMutation)
+        .filter(models.SyncMutation.user_id == user_id, models.SyncMutation.idempotency_key.in_(keys))
+        .all()
+    )
+    return {row.idempotency_key: row for row in rows}
+
+
+class _MutationFailed(Exception):
+    def __init__(self, key: str, detail: str) -> None:
+        super().__init__(detail)
+        self.key = key
+        self.detail = detail
+
+
+def apply_mutations(
+    db: Session,
+    user_id: int,
+    mutations: List[schemas.SyncMutationIn],
+) -> Tuple[List[schemas.SyncMutationResult], List[models.MacroTotals]]:
+    """Apply ``mutations`` in one transaction.
+
+    A mutation that fails with anything but a payload validation error (an
+    integrity violation, say) may leave the session unusable, so the batch is
+    rolled back and replayed with that mutation recorded as rejected; the rest
+    of the batch still applies.
+    """
+    failed: Dict[str, str] = {}
+    while True:
+        try:
+            return _apply_batch(db, user_id, mutations, failed)
+        except _MutationFailed as exc:
+            db.rollback()
+            failed[exc.key] = exc.detail
+
+
+def _apply_batch(
+    db: Session,
+    user_id: int,
+    mutations: List[schemas.SyncMutationIn],
+    failed: Dict[str, str],
+) -> Tuple[List[schemas.SyncMutationResult], List[models.MacroTotals]]:
+    recorded = _recorded_mutations(db, user_id, {mutation.idempotency_key for mutation in mutations})
+    pending = [mutation for mutation in mutations if mutation.idempotency_key not in recorded]
+    batch = _Batch(db, user_id, pending)
+
+    outcomes: Dict[int, schemas.SyncMutationResult] = {}
+    now = datetime.utcnow()
+    # Replay in device order so later edits in the same batch win.
+    ordered = sorted(enumerate(mutations), key=lambda pair: _naive_utc(pair[1].client_timestamp))
+    for index, mutation in ordered:
+        key = mutation.idempotency_key
+        previous = recorded.get(key)
+        if previous is not None:
+            outcomes[index] = schemas.SyncMutationResult(
+                idempotency_key=key,
+                op=previous.op,
+                status=DUPLICATE,
+                entity_id=previous.entity_id,
+                detail=previous.status,
+            )
+            continue
+        # A device clock running ahead must not win last-writer-wins for the row forever.
+        client_timestamp = min(_naive_utc(mutation.client_timestamp), now)
+        handler = HANDLERS.get(mutation.op)
+        detail = None
+        if handler is None:
+            status, entity_id, detail = REJECTED, None, f"Unknown op: {mutation.op}"
+        elif key in failed:
+            status, entity_id, detail = REJECTED, None, failed[key]
+        else:
+            try:
+                status, entity_id = handler(batch, mutation.payload, client_timestamp)
+                # Flush here so a database error is pinned on this mutation, not on the commit.
+                db.flush()
+            except ValidationError as exc:
+                status, entity_id, detail = REJECTED, None, str(exc)
+            except Exception as exc:
+                # Database errors carry the driver's message on ``orig``, without the SQL.
+                reason = getattr(exc, "orig", None) or exc
+                raise _MutationFailed(key, f"{type(exc).__name__}: {reason}") from exc
+        record = models.SyncMutation(
+            user_id=user_id,
+            idempotency_key=key,
+            op=mutation.op,
+            status=status,
+            entity_id=entity_id,
+            detail=detail,
+            client_timestamp=client_timestamp,
+        )
+        db.add(record)
+        recorded[key] = record
+        outcomes[index] = schemas.SyncMutationResult(
+            idempotency_key=key,
+            op=mutation.op,
+            status=status,
+            entity_id=entity_id,
+            detail=detail,
+        )
+
+    totals = [
+        crud.recompute_macro_totals(db, daily_log_id, user_id) for daily_log_id in sorted(batch.affected_logs)
+    ]
+    db.commit()
+    for row in totals:
+        db.refresh(row)
+    return [outcomes[index] for index in range(len(mutations))], totals
@@ -0,0 +1,218 @@
+"""Bounded-memory handling of photo uploads.
+
+An upload is read in fixed-size chunks and hashed as it arrives. Up to
+``UPLOAD_SPOOL_BYTES`` are held in memory; anything larger is spooled to a
+temporary file that inference workers map instead of receiving a copy.
+Bodies over ``MAX_UPLOAD_BYTES`` are refused, from the ``Content-Length``
+header when the client sends one and otherwise as soon as the bytes received
+pass the limit, before the multipart parser spools the rest.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from typing import Any, Dict, Iterable, Optional, Union
+
+from fastapi import UploadFile
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse
+
+from .inference import PayloadFile
+
+MAX_UPLOAD_BYTES = int(os.getenv("CALORIE_TRACKER_MAX_UPLOAD_BYTES", str(5 * 1024 * 1024)))
+UPLOAD_CHUNK_BYTES = 64 * 1024
+UPLOAD_SPOOL_BYTES = 1024 * 1024
+# Room for the multipart boundary and part headers around the photo itself.
+UPLOAD_OVERHEAD_BYTES = 16 * 1024
+
+
+class UploadTooLarge(ValueError):
+    def __init__(self, limit: int):
+        super().__init__(f"Photo exceeds the {limit} byte limit")
+        self.limit = limit
+
+
+class BodyTooLarge(HTTPException):
+    """Raised from the wrapped ``receive`` once a request body passes the limit."""
+
+    def __init__(self) -> None:
+        super().__init__(status_code=413, detail="Photo is too large.")
+
+
+class SpooledUpload:
+    """Upload bytes plus their SHA-256, in memory until ``spool_bytes`` then on disk."""
+
+    def __init__(self, spool_bytes: int = UPLOAD_SPOOL_BYTES) -> None:
+        self.spool_bytes = spool_bytes
+        self.size = 0
+        self.peak_memory = 0
+        self._hash = hashlib.sha256()
+        self._buffer: Optional[bytearray] = bytearray()
+        self._file = None
+
+    @property
+    def digest(self) -> str:
+        return self._hash.hexdigest()
+
+    @property
+    def spooled(self) -> bool:
+        return self._file is not None
+
+    def write(self, chunk: bytes) -> None:
+        self._hash.update(chunk)
+        self.size += len(chunk)
+        if self._file is None and self.size > self.spool_bytes:
+            self._file = tempfile.NamedTemporaryFile(prefix="photo-", suffix=".upload", delete=False)
+            self._file.write(self._buffer)
+            self._buffer = None
+        if self._file is not None:
+            self._file.write(chunk)
+            resident = len(chunk)
+        else:
+            self._buffer.extend(chunk)
+            resident = len(self._buffer)
+        self.peak_memory = max(self.peak_memory, resident)
+
+    def payload(self) -> Union[bytearray, PayloadFile]:
+        """What to hand to inference: the buffer itself, or the spool file to map."""
+        if self._file is None:
+            return self._buffer
+        self._file.flush()
+        return PayloadFile(self._file.name, self.size)
+
+    def chunks(self, size: int = UPLOAD_CHUNK_BYTES) -> Iterable[memoryview]:
+        if self._file is None:
+            view = memoryview(self._buffer)
+            for start in range(0, self.size, size):
+                yield view[start : start + size]
+            return
+        self._file.flush()
+        with open(self._file.name, "rb") as handle:
+            for chunk in iter(lambda: handle.read(size), b""):
+                yield memoryview(chunk)
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            os.unlink(self._file.name)
+            self._file = None
+        self._buffer = None
+
+    def __enter__(self) -> "SpooledUpload":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class UploadStats:
+    def __init__(self) -> None:
+        self.uploads = 0
+        self.rejected = 0
+        self.spooled = 0
+        self.bytes = 0
+        self.peak_memory = 0
+        self._lock = threading.Lock()
+
+    def record(self, upload: Optional[SpooledUpload]) -> None:
+        with self._lock:
+            if upload is None:
+                self.rejected += 1
+                return
+            self.uploads += 1
+            self.spooled += upload.spooled
+            self.bytes += upload.size
+            self.peak_memory = max(self.peak_memory, upload.peak_memory)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "uploads": self.uploads,
+            "rejected_too_large": self.rejected,
+            "spooled": self.spooled,
+            "bytes": self.bytes,
+            "peak_memory_bytes": self.peak_memory,
+        }
+
+
+upload_stats = UploadStats()
+
+
+async def read_upload(
+    upload: UploadFile,
+    max_bytes: int = MAX_UPLOAD_BYTES,
+    chunk_size: int = UPLOAD_CHUNK_BYTES,
+    spool_bytes: int = UPLOAD_SPOOL_BYTES,
+) -> SpooledUpload:
+    spooled = SpooledUpload(spool_bytes)
+    try:
+        while True:
+            chunk = await upload.read(chunk_size)
+            if not chunk:
+                break
+            if spooled.size + len(chunk) > max_bytes:
+                raise UploadTooLarge(max_bytes)
+            spooled.write(chunk)
+    except UploadTooLarge:
+        spooled.close()
+        upload_stats.record(None)
+        raise
+    except BaseException:
+        spooled.close()
+        raise
+    upload_stats.record(spooled)
+    return spooled
+
+
+class UploadLimitMiddleware:
+    """Answer 413 when a body on ``paths`` exceeds ``max_bytes``.
+
+    A too-big ``Content-Length`` is refused before the body is read. Chunked
+    bodies carry no length, so ``receive`` is wrapped to count the bytes and
+    raise ``BodyTooLarge`` from inside the parser once they pass the limit.
+    """
+
+    def __init__(self, app, paths: Iterable[str], max_bytes: int = MAX_UPLOAD_BYTES + UPLOAD_OVERHEAD_BYTES) -> None:
+        self.app = app
+        self.paths = tuple(paths)
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] == "http" and scope["method"] == "POST" and scope["path"] in self.paths:
+            length = dict(scope["headers"]).get(b"content-length")
+            if length is not None and length.isdigit() and int(length) > self.max_bytes:
+                upload_stats.record(None)
+                response = JSONResponse({"detail": "Photo is too large."}, status_code=413)
+                await response(scope, receive, send)
+                return
+            await self._limited(scope, receive, send)
+            return
+        await self.app(scope, receive, send)
+
+    async def _limited(self, scope, receive, send) -> None:
+        received = 0
+        started = False
+
+        async def counting_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    raise BodyTooLarge()
+            return message
+
+        async def tracking_send(message) -> None:
+            nonlocal started
+            started = True
+            await send(message)
+
+        try:
+            await self.app(scope, counting_receive, tracking_send)
+        except BodyTooLarge as exc:
+            # Only reached if nothing downstream turned it into a response.
+            if started:
+                raise
+            await JSONResponse({"detail": exc.detail}, status_code=exc.status_code)(scope, receive, send)
+        finally:
+            if received > self.max_bytes:
+                upload_stats.record(None)
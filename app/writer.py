@@ -0,0 +1,211 @@
+"""Group-commit appends to JSONL files from a dedicated flush thread.
+
+Request handlers ``submit`` records to a shared writer per file and get a
+``concurrent.futures.Future`` back. The flush thread drains everything queued
+since its last pass, writes it with one ``write`` call and resolves the
+futures once the batch is as durable as the fsync policy promises:
+
+* ``none``: handed to the OS (fsync only on close),
+* ``interval``: fsynced at most ``fsync_interval`` seconds later,
+* ``batch``: fsynced before any future in the batch resolves.
+
+Async callers can ``await asyncio.wrap_future(future)``; others may call
+``future.result()`` or ignore it.
+"""
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Protocol, Tuple
+
+FSYNC_NONE = "none"
+FSYNC_INTERVAL = "interval"
+FSYNC_BATCH = "batch"
+FSYNC_POLICIES = (FSYNC_NONE, FSYNC_INTERVAL, FSYNC_BATCH)
+FSYNC_POLICY = os.getenv("CALORIE_TRACKER_FSYNC", FSYNC_INTERVAL)
+FSYNC_INTERVAL_SECONDS = 1.0
+WRITE_BATCH_MAX = 512
+
+
+class BatchSink(Protocol):
+    def write_batch(self, records: List[Dict[str, Any]]) -> List[Any]:
+        """Write ``records`` in order; returns one result per record for its future."""
+
+    def sync(self) -> None:
+        ...
+
+    def close(self) -> None:
+        ...
+
+
+class JsonlFile:
+    """Plain append-only JSONL sink; a record's result is its byte offset."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._handle = None
+
+    def write_batch(self, records: List[Dict[str, Any]]) -> List[int]:
+        if self._handle is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._handle = self.path.open("ab", buffering=0)
+        offset = self._handle.seek(0, os.SEEK_END)
+        offsets = []
+        lines = []
+        for record in records:
+            line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+            offsets.append(offset)
+            lines.append(line)
+            offset += len(line)
+        self._handle.write(b"".join(lines))
+        return offsets
+
+    def sync(self) -> None:
+        if self._handle is not None:
+            os.fsync(self._handle.fileno())
+
+    def close(self) -> None:
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+
+
+def _resolve(future: Future, result: Any) -> None:
+    if not future.done():
+        future.set_result(result)
+
+
+class GroupCommitWriter:
+    def __init__(
+        self,
+        sink: BatchSink,
+        fsync_policy: str = FSYNC_POLICY,
+        fsync_interval: float = FSYNC_INTERVAL_SECONDS,
+        max_batch: int = WRITE_BATCH_MAX,
+        name: str = "jsonl-writer",
+    ) -> None:
+        if fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(f"Unknown fsync policy {fsync_policy!r}; expected one of {FSYNC_POLICIES}")
+        self.sink = sink
+        self.fsync_policy = fsync_policy
+        self.fsync_interval = fsync_interval
+        self.max_batch = max_batch
+        self.name = name
+        self.batches = 0
+        self.records = 0
+        self.fsyncs = 0
+        self._queue: "queue.Queue[Optional[Tuple[Dict[str, Any], Future]]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def submit(self, record: Dict[str, Any]) -> Future:
+        future: Future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError(f"{self.name} is closed")
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+            self._queue.put((record, future))
+        return future
+
+    def close(self) -> None:
+        """Flush and fsync everything submitted so far, then stop the thread."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            thread = self._thread
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+        self.sink.close()
+
+    def _run(self) -> None:
+        unsynced: List[Tuple[Future, Any]] = []
+        last_sync = time.monotonic()
+        stopping = False
+        while not stopping:
+            timeout = None
+            if unsynced and self.fsync_policy == FSYNC_INTERVAL:
+                timeout = max(0.0, last_sync + self.fsync_interval - time.monotonic())
+            batch: List[Tuple[Dict[str, Any], Future]] = []
+            try:
+                item = self._queue.get(timeout=timeout)
+                while True:
+                    if item is None:
+                        stopping = True
+                        break
+                    batch.append(item)
+                    if len(batch) >= self.max_batch:
+                        break
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                pass
+
+            if batch:
+                try:
+                    results = self.sink.write_batch([record for record, _ in batch])
+                except Exception as exc:
+                    for _, future in batch:
+                        if not future.done():
+                            future.set_exception(exc)
+                else:
+                    self.batches += 1
+                    self.records += len(batch)
+                    written = [(future, result) for (_, future), result in zip(batch, results)]
+                    if self.fsync_policy == FSYNC_NONE:
+                        for future, result in written:
+                            _resolve(future, result)
+                    else:
+                        unsynced.extend(written)
+
+            due = self.fsync_policy == FSYNC_BATCH or time.monotonic() - last_sync >= self.fsync_interval
+            # On close only the unsynced tail is left; with FSYNC_NONE that is everything.
+            if (unsynced and (due or stopping)) or (stopping and self.fsync_policy == FSYNC_NONE):
+                try:
+                    self.sink.sync()
+                except Exception as exc:
+                    for future, _ in unsynced:
+                        if not future.done():
+                            future.set_exception(exc)
+                else:
+                    self.fsyncs += 1
+                    for future, result in unsynced:
+                        _resolve(future, result)
+                last_sync = time.monotonic()
+                unsynced = []
+
+
+_writers: Dict[Any, GroupCommitWriter] = {}
+_writers_lock = threading.Lock()
+
+
+def shared_writer(key: Any, factory) -> GroupCommitWriter:
+    """The live writer registered under ``key``, created with ``factory()`` if needed."""
+    with _writers_lock:
+        writer = _writers.get(key)
+        if writer is None:
+            writer = _writers[key] = factory()
+        return writer
+
+
+def writer_for(path: Path) -> GroupCommitWriter:
+    return shared_writer(path, lambda: GroupCommitWriter(JsonlFile(path), name=f"{path.name}-writer"))
+
+
+def close_writers() -> None:
+    """Flush-on-shutdown hook: drain and close every shared writer."""
+    with _writers_lock:
+        writers = list(_writers.values())
+        _writers.clear()
+    for writer in writers:
+        writer.close()
+
+
+atexit.register(close_writers)
@@ -0,0 +1,234 @@
+from __future__ import annotations
+
+import json
+import math
+import mmap
+import os
+import struct
+import zlib
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .schema import FoodItem, NutrientProfile, Portion, SourceInfo, VersionInfo
+
+MAGIC = b"CTCAT\x00\x01\x00"
+HEADER = struct.Struct("<8sIIQQQ")
+# Byte offset and length of a string in the string table; NONE_LENGTH marks None.
+NONE_LENGTH = 0xFFFFFFFF
+NUTRIENT_FIELDS = ("calories_kcal", "protein_g", "fat_g", "carbs_g", "fiber_g", "sugar_g", "sodium_mg")
+# key, id, name, brand, locale, updated_at, sources JSON, portions JSON string refs; confidence;
+# nutrients (NaN for None); revision; raw content hash.
+RECORD = struct.Struct("<" + "II" * 8 + "d" + "d" * len(NUTRIENT_FIELDS) + "I32s")
+SLOT = struct.Struct("<I")
+
+
+class CatalogFormatError(ValueError):
+    pass
+
+
+def _slots_for(count: int) -> int:
+    slots = 8
+    while slots < count * 2:
+        slots *= 2
+    return slots
+
+
+def _hash(text: bytes) -> int:
+    return zlib.crc32(text)
+
+
+def _build_index(values: List[bytes]) -> bytearray:
+    """Open-addressing table of record numbers + 1 (0 is an empty slot)."""
+    slots = _slots_for(len(values))
+    table = [0] * slots
+    for number, value in enumerate(values):
+        slot = _hash(value) & (slots - 1)
+        while table[slot]:
+            slot = (slot + 1) & (slots - 1)
+        table[slot] = number + 1
+    return bytearray(struct.pack(f"<{slots}I", *table))
+
+
+def write_binary_catalog(items: List[FoodItem], output_path: Path, key_for) -> None:
+    """Write ``items`` as a memory-mappable catalog; ``key_for(item)`` gives each item's merge key."""
+    strings = bytearray()
+    string_refs: Dict[bytes, Tuple[int, int]] = {}
+
+    def ref(text: Optional[str]) -> Tuple[int, int]:
+        if text is None:
+            return 0, NONE_LENGTH
+        encoded = text.encode("utf-8")
+        if encoded not in string_refs:
+            string_refs[encoded] = (len(strings), len(encoded))
+            strings.extend(encoded)
+        return string_refs[encoded]
+
+    records = bytearray()
+    keys: List[bytes] = []
+    ids: List[bytes] = []
+    for item in items:
+        key = key_for(item)
+        keys.append(key.encode("utf-8"))
+        ids.append(item.id.encode("utf-8"))
+        nutrients = item.nutrients_per_100g
+        refs = (
+            ref(key),
+            ref(item.id),
+            ref(item.name),
+            ref(item.brand),
+            ref(item.locale),
+            ref(item.version.updated_at),
+            ref(json.dumps([source.__dict__ for source in item.sources], separators=(",", ":"))),
+            ref(json.dumps([portion.__dict__ for portion in item.portions], separators=(",", ":"))),
+        )
+        values = [getattr(nutrients, name) for name in NUTRIENT_FIELDS]
+        records.extend(
+            RECORD.pack(
+                *(part for pair in refs for part in pair),
+                item.confidence,
+                *(math.nan if value is None else value for value in values),
+                item.version.revision,
+                bytes.fromhex(item.version.content_hash),
+            )
+        )
+
+    key_index = _build_index(keys)
+    id_index = _build_index(ids)
+    records_offset = HEADER.size
+    strings_offset = records_offset + len(records)
+    key_index_offset = strings_offset + len(strings)
+    id_index_offset = key_index_offset + len(key_index)
+    slots = len(key_index) // SLOT.size
+    header = HEADER.pack(MAGIC, len(items), slots, strings_offset, key_index_offset, id_index_offset)
+
+    # Write-then-rename: readers keep mapping the old file until they reopen.
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = output_path.with_suffix(output_path.suffix + ".tmp")
+    with tmp_path.open("wb") as handle:
+        for part in (header, records, strings, key_index, id_index):
+            handle.write(part)
+        handle.flush()
+        os.fsync(handle.fileno())
+    os.replace(tmp_path, output_path)
+
+
+def is_binary_catalog(path: Path) -> bool:
+    with path.open("rb") as handle:
+        return handle.read(len(MAGIC)) == MAGIC
+
+
+class BinaryCatalog(Mapping):
+    """Read-only catalog over an mmap, keyed by merge key.
+
+    Opening only reads the header; items are decoded one at a time when
+    looked up, and ``get_by_id`` / ``__getitem__`` probe hash indexes.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        with path.open("rb") as handle:
+            self._map = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) < HEADER.size:
+            raise CatalogFormatError(f"Not a binary catalog: {path}")
+        magic, count, slots, strings, key_index, id_index = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise CatalogFormatError(f"Not a binary catalog: {path}")
+        self._count = count
+        self._slots = slots
+        self._strings = strings
+        self._key_index = key_index
+        self._id_index = id_index
+
+    def close(self) -> None:
+        self._map.close()
+
+    def __enter__(self) -> "BinaryCatalog":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _record(self, number: int) -> tuple:
+        return RECORD.unpack_from(self._map, HEADER.size + number * RECORD.size)
+
+    def _bytes(self, offset: int, length: int) -> Optional[bytes]:
+        if length == NONE_LENGTH:
+            return None
+        start = self._strings + offset
+        return self._map[start : start + length]
+
+    def _string(self, offset: int, length: int) -> Optional[str]:
+        raw = self._bytes(offset, length)
+        return None if raw is None else raw.decode("utf-8")
+
+    def _find(self, index_offset: int, field: int, value: str) -> Optional[int]:
+        if not self._count:
+            return None
+        wanted = value.encode("utf-8")
+        mask = self._slots - 1
+        slot = _hash(wanted) & mask
+        while True:
+            number = SLOT.unpack_from(self._map, index_offset + slot * SLOT.size)[0]
+            if not number:
+                return None
+            record = self._record(number - 1)
+            if self._bytes(record[field * 2], record[field * 2 + 1]) == wanted:
+                return number - 1
+            slot = (slot + 1) & mask
+
+    def item(self, number: int) -> FoodItem:
+        record = self._record(number)
+        strings = [self._string(record[index], record[index + 1]) for index in range(0, 16, 2)]
+        _, item_id, name, brand, locale, updated_at, sources, portions = strings
+        confidence = record[16]
+        nutrients = [None if math.isnan(value) else value for value in record[17 : 17 + len(NUTRIENT_FIELDS)]]
+        revision, digest = record[17 + len(NUTRIENT_FIELDS) :]
+        return FoodItem(
+            id=item_id,
+            name=name,
+            brand=brand,
+            locale=locale,
+            confidence=confidence,
+            sources=[SourceInfo(**source) for source in json.loads(sources)],
+            portions=[Portion(**portion) for portion in json.loads(portions)],
+            nutrients_per_100g=NutrientProfile(**dict(zip(NUTRIENT_FIELDS, nutrients))),
+            version=VersionInfo(revision=revision, content_hash=digest.hex(), updated_at=updated_at),
+        )
+
+    def key(self, number: int) -> str:
+        record = self._record(number)
+        return self._string(record[0], record[1])
+
+    def name(self, number: int) -> str:
+        record = self._record(number)
+        return self._string(record[4], record[5])
+
+    def get_by_id(self, item_id: str) -> Optional[FoodItem]:
+        number = self._find(self._id_index, 1, item_id)
+        return None if number is None else self.item(number)
+
+    def version_for(self, key: str) -> Optional[Tuple[str, VersionInfo]]:
+        """Id and version of ``key`` without decoding the rest of the item."""
+        number = self._find(self._key_index, 0, key)
+        if number is None:
+            return None
+        record = self._record(number)
+        revision, digest = record[17 + len(NUTRIENT_FIELDS) :]
+        updated_at = self._string(record[10], record[11])
+        return self._string(record[2], record[3]), VersionInfo(revision, digest.hex(), updated_at)
+
+    def __getitem__(self, key: str) -> FoodItem:
+        number = self._find(self._key_index, 0, key)
+        if number is None:
+            raise KeyError(key)
+        return self.item(number)
+
+    def __contains__(self, key: object) -> bool:
+        return isinstance(key, str) and self._find(self._key_index, 0, key) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        return (self.key(number) for number in range(self._count))
@@ -1,9 +1,10 @@
 from __future__ import annotations
 
 import argparse
+import time
 from pathlib import Path
 
-from .pipeline import run_import
+from .pipeline import import_catalog
 
 
 def build_parser() -> argparse.ArgumentParser:
@@ -22,6 +23,37 @@ def build_parser() -> argparse.ArgumentParser:
         required=True,
         help="Path to output catalog JSON file",
     )
+    import_parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Processes to merge sources with (partitioned by item key)",
+    )
+    import_parser.add_argument(
+        "--format",
+        choices=("json", "binary"),
+        default="json",
+        help="Catalog file format (binary is memory-mappable with key and id indexes)",
+    )
+    import_parser.add_argument(
+        "--validation-report",
+        help="Write every validation issue to this JSONL file",
+    )
+    import_parser.add_argument(
+        "--shard-by-locale",
+        action="store_true",
+        help="Write one catalog file per locale; --output becomes the shard directory",
+    )
+    import_parser.add_argument(
+        "--dedup",
+        choices=("report", "merge"),
+        help="Find near-duplicate items: write merge suggestions, or also merge the confident ones",
+    )
+    import_parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Ignore the import manifest and re-merge every source",
+    )
     return parser
 
 
@@ -32,8 +64,27 @@ def main() -> None:
     if args.command == "import":
         source_paths = [Path(path) for path in args.source]
         output_path = Path(args.output)
-        count, location = run_import(source_paths, output_path)
-        print(f"Imported {count} items into {location}")
+        started = time.perf_counter()
+        report_path = Path(args.validation_report) if args.validation_report else None
+        result = import_catalog(
+            source_paths,
+            output_path,
+            workers=args.workers,
+            incremental=not args.full,
+            fmt=args.format,
+            report_path=report_path,
+            dedup=args.dedup,
+            shard_by_locale=args.shard_by_locale,
+        )
+        elapsed = time.perf_counter() - started
+        mode = "full" if result.full else "incremental"
+        print(
+            f"Imported {result.count} items into {result.path} in {elapsed:.2f}s ({mode}: "
+            f"{result.sources_read}/{len(source_paths)} sources read, {result.remerged} merged, "
+            f"{result.reused} reused, {result.warnings} validation warnings, {result.duplicates} duplicate clusters, {args.workers} worker(s))"
+        )
+        delta = result.delta
+        print(f"Delta: {len(delta.added)} added, {len(delta.revised)} revised, {len(delta.removed)} removed")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,207 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import random
+import re
+from dataclasses import dataclass, replace
+from functools import lru_cache
+from itertools import combinations
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from .schema import FoodItem, SourceInfo
+
+# 20 bands of 3 rows: pairs at 0.5 similarity share a band ~93% of the time, pairs at 0.2 ~15%.
+LSH_BANDS = 20
+LSH_ROWS = 3
+MINHASH_PERMUTATIONS = LSH_BANDS * LSH_ROWS
+# Name-token Jaccard similarity for a pair to be reported, and to be merged automatically.
+REPORT_SIMILARITY = 0.5
+MERGE_SIMILARITY = 0.8
+# Largest mean relative difference of calories and macros for two items to be the same food.
+MAX_NUTRIENT_DISTANCE = 0.15
+# Descriptors that do not distinguish one food from another.
+IGNORED_TOKENS = frozenset({"raw", "fresh", "the", "a", "of"})
+
+_PRIME = (1 << 61) - 1
+_rng = random.Random(0x5EED)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(_PRIME)) for _ in range(MINHASH_PERMUTATIONS)]
+_EMPTY_SIGNATURE = (_PRIME,) * MINHASH_PERMUTATIONS
+
+
+def name_tokens(name: str) -> frozenset:
+    tokens = frozenset(re.findall(r"[a-z0-9]+", name.lower())) - IGNORED_TOKENS
+    return tokens or frozenset(re.findall(r"[a-z0-9]+", name.lower()))
+
+
+@lru_cache(maxsize=65536)
+def _token_signature(token: str) -> Tuple[int, ...]:
+    value = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+    return tuple((a * value + b) % _PRIME for a, b in _PERMUTATIONS)
+
+
+def minhash(tokens: frozenset) -> Tuple[int, ...]:
+    # Names share a small vocabulary, so each token is permuted once and item signatures are element-wise minima.
+    return tuple(map(min, _EMPTY_SIGNATURE, *(_token_signature(token) for token in tokens)))
+
+
+def jaccard(left: frozenset, right: frozenset) -> float:
+    union = left | right
+    return len(left & right) / len(union) if union else 1.0
+
+
+def nutrient_distance(left: FoodItem, right: FoodItem) -> Optional[float]:
+    """Mean relative difference of calories and macros, or None if either lacks one."""
+    differences = []
+    for name in ("calories_kcal", "protein_g", "fat_g", "carbs_g"):
+        a = getattr(left.nutrients_per_100g, name)
+        b = getattr(right.nutrients_per_100g, name)
+        if a is None or b is None:
+            return None
+        differences.append(abs(a - b) / max(abs(a), abs(b), 1.0))
+    return sum(differences) / len(differences)
+
+
+@dataclass(frozen=True)
+class DuplicatePair:
+    left: int
+    right: int
+    similarity: float
+    distance: float
+
+
+@dataclass(frozen=True)
+class DuplicateCluster:
+    members: List[int]
+    pairs: List[DuplicatePair]
+
+    @property
+    def mergeable(self) -> bool:
+        return all(pair.similarity >= MERGE_SIMILARITY for pair in self.pairs)
+
+
+def _candidate_pairs(items: Sequence[FoodItem], tokens: List[frozenset]) -> Set[Tuple[int, int]]:
+    """Pairs sharing at least one LSH band, blocked by locale."""
+    buckets: Dict[Tuple[str, int, Tuple[int, ...]], List[int]] = {}
+    for index, item in enumerate(items):
+        signature = minhash(tokens[index])
+        for band in range(LSH_BANDS):
+            key = (item.locale.lower(), band, signature[band * LSH_ROWS : (band + 1) * LSH_ROWS])
+            buckets.setdefault(key, []).append(index)
+    pairs: Set[Tuple[int, int]] = set()
+    for members in buckets.values():
+        if len(members) > 1:
+            pairs.update(combinations(members, 2))
+    return pairs
+
+
+def find_duplicates(items: Sequence[FoodItem]) -> List[DuplicateCluster]:
+    """Clusters of items that look like the same food from different sources.
+
+    MinHash signatures of name tokens are banded so only items sharing a band
+    are compared; each candidate pair is then verified by exact token
+    similarity, compatible brands and nutrient distance.
+    """
+    tokens = [name_tokens(item.name) for item in items]
+    parent = list(range(len(items)))
+
+    def find(index: int) -> int:
+        while parent[index] != index:
+            parent[index] = parent[parent[index]]
+            index = parent[index]
+        return index
+
+    verified: List[DuplicatePair] = []
+    for left, right in sorted(_candidate_pairs(items, tokens)):
+        a, b = items[left], items[right]
+        if a.brand and b.brand and a.brand.strip().lower() != b.brand.strip().lower():
+            continue
+        similarity = jaccard(tokens[left], tokens[right])
+        if similarity < REPORT_SIMILARITY:
+            continue
+        distance = nutrient_distance(a, b)
+        if distance is None or distance > MAX_NUTRIENT_DISTANCE:
+            continue
+        verified.append(DuplicatePair(left, right, similarity, distance))
+        parent[find(right)] = find(left)
+
+    clusters: Dict[int, List[DuplicatePair]] = {}
+    for pair in verified:
+        clusters.setdefault(find(pair.left), []).append(pair)
+    return [
+        DuplicateCluster(sorted({index for pair in pairs for index in (pair.left, pair.right)}), pairs)
+        for _, pairs in sorted(clusters.items())
+    ]
+
+
+def merge_duplicates(items: List[FoodItem], clusters: Sequence[DuplicateCluster]) -> List[FoodItem]:
+    """Fold every mergeable cluster into its most confident item, keeping catalog order."""
+    replaced: Dict[int, FoodItem] = {}
+    dropped: Set[int] = set()
+    for cluster in clusters:
+        if not cluster.mergeable:
+            continue
+        survivor = max(cluster.members, key=lambda index: (items[index].confidence, -index))
+        sources: Dict[str, SourceInfo] = {}
+        for index in [survivor, *cluster.members]:
+            for source in items[index].sources:
+                sources.setdefault(source.name, source)
+        replaced[survivor] = replace(
+            items[survivor],
+            sources=list(sources.values()),
+            confidence=max(items[index].confidence for index in cluster.members),
+        )
+        dropped.update(index for index in cluster.members if index != survivor)
+    return [replaced.get(index, item) for index, item in enumerate(items) if index not in dropped]
+
+
+def report_path_for(catalog_path: Path) -> Path:
+    return catalog_path.with_suffix(".duplicates.json")
+
+
+def write_report(items: Sequence[FoodItem], clusters: Sequence[DuplicateCluster], path: Path) -> None:
+    def describe(index: int) -> Dict[str, object]:
+        item = items[index]
+        return {
+            "id": item.id,
+            "name": item.name,
+            "brand": item.brand,
+            "locale": item.locale,
+            "sources": [source.name for source in item.sources],
+        }
+
+    payload = {
+        "clusters": [
+            {
+                "mergeable": cluster.mergeable,
+                "items": [describe(index) for index in cluster.members],
+                "pairs": [
+                    {
+                        "left": items[pair.left].id,
+                        "right": items[pair.right].id,
+                        "similarity": round(pair.similarity, 3),
+                        "nutrient_distance": round(pair.distance, 3),
+                    }
+                    for pair in cluster.pairs
+                ],
+            }
+            for cluster in clusters
+        ]
+    }
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(payload, indent=2))
+
+
+def deduplicate(
+    items: List[FoodItem], mode: str, report_path: Optional[Path] = None
+) -> Tuple[List[FoodItem], List[DuplicateCluster]]:
+    """Find near-duplicates; ``mode`` "report" only writes suggestions, "merge" also folds mergeable clusters."""
+    if mode not in ("report", "merge"):
+        raise ValueError(f"Unknown dedup mode: {mode}")
+    clusters = find_duplicates(items)
+    if report_path is not None:
+        write_report(items, clusters, report_path)
+    if mode == "merge":
+        items = merge_duplicates(items, clusters)
+    return items, clusters
@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import json
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Optional
+
+from .schema import FoodItem, item_from_dict, item_to_dict
+
+
+def delta_path_for(catalog_path: Path) -> Path:
+    return catalog_path.with_suffix(".delta.json")
+
+
+@dataclass(frozen=True)
+class CatalogDelta:
+    """Items an import added, revised or removed, relative to the catalog it replaced.
+
+    ``base_sha256`` is the hash of the catalog the delta applies to (None for a
+    first import) and ``catalog_sha256`` the hash of the catalog it produces,
+    so a reader can tell whether it can apply the delta or must reload.
+    """
+
+    base_sha256: Optional[str]
+    catalog_sha256: str
+    added: List[FoodItem] = field(default_factory=list)
+    revised: List[FoodItem] = field(default_factory=list)
+    # Ids of removed items.
+    removed: List[str] = field(default_factory=list)
+
+    def __len__(self) -> int:
+        return len(self.added) + len(self.revised) + len(self.removed)
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["CatalogDelta"]:
+        if not path.exists():
+            return None
+        data = json.loads(path.read_text())
+        return cls(
+            data.get("base_sha256"),
+            data["catalog_sha256"],
+            [item_from_dict(entry) for entry in data["added"]],
+            [item_from_dict(entry) for entry in data["revised"]],
+            list(data["removed"]),
+        )
+
+    def save(self, path: Path) -> None:
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        payload = {
+            "base_sha256": self.base_sha256,
+            "catalog_sha256": self.catalog_sha256,
+            "added": [item_to_dict(item) for item in self.added],
+            "revised": [item_to_dict(item) for item in self.revised],
+            "removed": self.removed,
+        }
+        tmp_path.write_text(json.dumps(payload, sort_keys=True))
+        os.replace(tmp_path, path)
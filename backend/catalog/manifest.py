@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+HASH_CHUNK_BYTES = 1024 * 1024
+
+
+def file_hash(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as handle:
+        for chunk in iter(lambda: handle.read(HASH_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def manifest_path_for(catalog_path: Path) -> Path:
+    return catalog_path.with_suffix(".manifest.json")
+
+
+@dataclass(frozen=True)
+class SourceEntry:
+    path: str
+    sha256: str
+    keys: List[str]
+
+
+@dataclass(frozen=True)
+class ImportManifest:
+    """What the last import read: each source's content hash and the item keys it
+    contributed (in order of first appearance), plus the hash of the catalog it wrote
+    and the dedup mode it ran with."""
+
+    sources: List[SourceEntry]
+    catalog_sha256: str = ""
+    dedup: Optional[str] = None
+    by_path: Dict[str, SourceEntry] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        object.__setattr__(self, "by_path", {entry.path: entry for entry in self.sources})
+
+    def ordered_keys(self) -> List[str]:
+        """Keys in the order a full import would emit them."""
+        seen: Dict[str, None] = {}
+        for entry in self.sources:
+            for key in entry.keys:
+                seen.setdefault(key, None)
+        return list(seen)
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["ImportManifest"]:
+        if not path.exists():
+            return None
+        data = json.loads(path.read_text())
+        return cls(
+            [SourceEntry(**entry) for entry in data["sources"]],
+            data.get("catalog_sha256", ""),
+            data.get("dedup"),
+        )
+
+    def save(self, path: Path) -> None:
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        payload = {
+            "catalog_sha256": self.catalog_sha256,
+            "dedup": self.dedup,
+            "sources": [entry.__dict__ for entry in self.sources],
+        }
+        tmp_path.write_text(json.dumps(payload))
+        os.replace(tmp_path, path)
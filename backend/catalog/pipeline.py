@@ -1,17 +1,41 @@
 from __future__ import annotations
 
 import json
+import multiprocessing
+import os
 import uuid
+import zlib
+from dataclasses import dataclass
+from datetime import datetime
+from multiprocessing.connection import Connection
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, FrozenSet, Iterable, Iterator, List, Mapping, Optional, Set, Tuple
 
+from .binary import BinaryCatalog, is_binary_catalog, write_binary_catalog
+from .dedup import deduplicate, report_path_for
+from .delta import CatalogDelta, delta_path_for
+from .manifest import ImportManifest, SourceEntry, file_hash, manifest_path_for
 from .normalization import to_grams
-from .schema import FoodItem, NutrientProfile, Portion, SourceInfo, VersionInfo
-from .sources import load_sources
+from .schema import FoodItem, NutrientProfile, Portion, SourceInfo, VersionInfo, item_from_dict, item_to_dict
+from .shards import (
+    ShardDirectory,
+    ShardedCatalog,
+    ShardEntry,
+    is_shard_directory,
+    normalize_locales,
+    shard_path_for,
+)
+from .sources import open_sources
 from .validation import validate_catalog
 from .versioning import content_hash
 
 
+# New items get ids derived from their key, so repeated or parallel imports agree.
+CATALOG_NAMESPACE = uuid.UUID("5b0c2f0e-6d1a-4c55-9a8e-1f3c7d2b9e41")
+# Items sent to a merge worker at a time.
+MERGE_BATCH_ITEMS = 1024
+
+
 def _build_key(name: str, brand: Optional[str], locale: str) -> str:
     key = f"{name.strip().lower()}::{(brand or '').strip().lower()}::{locale.strip().lower()}"
     return key
@@ -53,20 +77,6 @@ def _nutrients_from_payload(payload: Dict[str, Any]) -> NutrientProfile:
     )
 
 
-def _serialize_item(item: FoodItem) -> Dict[str, Any]:
-    return {
-        "id": item.id,
-        "name": item.name,
-        "brand": item.brand,
-        "locale": item.locale,
-        "confidence": item.confidence,
-        "sources": [source.__dict__ for source in item.sources],
-        "portions": [portion.__dict__ for portion in item.portions],
-        "nutrients_per_100g": item.nutrients_per_100g.__dict__,
-        "version": item.version.__dict__,
-    }
-
-
 def _merge_payload(
     existing: Optional[Dict[str, Any]],
     payload: Dict[str, Any],
@@ -115,83 +125,463 @@ def _content_payload(item_data: Dict[str, Any]) -> Dict[str, Any]:
     }
 
 
-def load_existing_catalog(path: Path) -> Dict[str, FoodItem]:
+def load_existing_catalog(path: Path, locales: Optional[Iterable[str]] = None) -> Mapping[str, FoodItem]:
+    """Catalog items by merge key; binary catalogs are mapped and decoded lazily.
+
+    With ``locales``, a sharded catalog opens only those locales' shards and a
+    JSON catalog keeps only their items. A single binary file is mapped whole,
+    since unused records cost nothing until they are read.
+    """
     if not path.exists():
         return {}
+    if is_shard_directory(path):
+        directory = ShardDirectory.load(path)
+        return ShardedCatalog(
+            {entry.locale: load_existing_catalog(path.with_name(entry.path)) for entry in directory.select(locales)}
+        )
+    if is_binary_catalog(path):
+        return BinaryCatalog(path)
+    wanted = normalize_locales(locales)
     data = json.loads(path.read_text())
     items = {}
     for entry in data.get("items", []):
-        item = FoodItem(
-            id=entry["id"],
-            name=entry["name"],
-            brand=entry.get("brand"),
-            locale=entry["locale"],
-            confidence=entry["confidence"],
-            sources=[SourceInfo(**source) for source in entry["sources"]],
-            portions=[Portion(**portion) for portion in entry["portions"]],
-            nutrients_per_100g=NutrientProfile(**entry["nutrients_per_100g"]),
-            version=VersionInfo(**entry["version"]),
-        )
+        if wanted is not None and entry["locale"].lower() not in wanted:
+            continue
+        item = item_from_dict(entry)
         key = _build_key(item.name, item.brand, item.locale)
         items[key] = item
     return items
 
 
-def ingest_sources(source_paths: List[Path], existing_path: Path) -> List[FoodItem]:
-    source_payloads = load_sources(source_paths)
-    existing = load_existing_catalog(existing_path)
+@dataclass(frozen=True)
+class MergedItem:
+    first_seen: int
+    key: str
+    data: Dict[str, Any]
+    content_hash: str
+    # Source index -> position of the key's first item in that source.
+    appearances: Dict[int, int]
+
+
+@dataclass(frozen=True)
+class ImportResult:
+    count: int
+    path: Path
+    remerged: int
+    reused: int
+    sources_read: int
+    full: bool
+    warnings: int = 0
+    duplicates: int = 0
+    delta: Optional[CatalogDelta] = None
+
+
+def _iter_payloads(
+    source_paths: List[Path], skip: FrozenSet[int] = frozenset()
+) -> Iterator[Tuple[int, int, SourceInfo, Dict[str, Any]]]:
+    """``(position, source index, source, payload)`` for every item, in source order.
+
+    ``position`` counts items across all sources read. Sources whose index is
+    in ``skip`` are not opened.
+    """
+    position = 0
+    streams = open_sources([path for index, path in enumerate(source_paths) if index not in skip])
+    indices = [index for index in range(len(source_paths)) if index not in skip]
+    for index, stream in zip(indices, streams):
+        source_info = SourceInfo(**stream.source)
+        for item_payload in stream.items():
+            position += 1
+            yield position, index, source_info, item_payload
+
+
+def _merge_payloads(
+    entries: Iterable[Tuple[int, int, SourceInfo, Dict[str, Any]]],
+    keys: Optional[Set[str]] = None,
+) -> List[MergedItem]:
+    """Merge the items of ``entries`` (only those whose key is in ``keys``, if given), in order.
+
+    Rows come out in order of ``first_seen``, the position of a key's first item.
+    """
     merged: Dict[str, Dict[str, Any]] = {}
+    first_seen: Dict[str, int] = {}
+    appearances: Dict[str, Dict[int, int]] = {}
+    for position, index, source_info, item_payload in entries:
+        key = _build_key(
+            item_payload["name"],
+            item_payload.get("brand"),
+            item_payload.get("locale", "en-US"),
+        )
+        if keys is not None and key not in keys:
+            continue
+        first_seen.setdefault(key, position)
+        appearances.setdefault(key, {}).setdefault(index, position)
+        merged[key] = _merge_payload(merged.get(key), item_payload, source_info)
+    return [
+        MergedItem(first_seen[key], key, item_data, content_hash(_content_payload(item_data)), appearances[key])
+        for key, item_data in merged.items()
+    ]
 
-    for payload in source_payloads:
-        source_info = SourceInfo(**payload["source"])
-        for item_payload in payload["items"]:
-            key = _build_key(
-                item_payload["name"],
-                item_payload.get("brand"),
-                item_payload.get("locale", "en-US"),
-            )
-            merged[key] = _merge_payload(merged.get(key), item_payload, source_info)
-
-    catalog: List[FoodItem] = []
-    for key, item_data in merged.items():
-        hash_payload = _content_payload(item_data)
-        new_hash = content_hash(hash_payload)
-        if key in existing:
-            existing_item = existing[key]
-            revision = existing_item.version.revision
-            if existing_item.version.content_hash != new_hash:
+
+def _merge_sources(
+    source_paths: List[Path], keys: Optional[Set[str]] = None, skip: FrozenSet[int] = frozenset()
+) -> List[MergedItem]:
+    return _merge_payloads(_iter_payloads(source_paths, skip), keys)
+
+
+def _partition_of(key: str, partitions: int) -> int:
+    return zlib.crc32(key.encode("utf-8")) % partitions
+
+
+def _received_payloads(
+    connection: Connection, sources: List[SourceInfo]
+) -> Iterator[Tuple[int, int, SourceInfo, Dict[str, Any]]]:
+    while True:
+        batch = connection.recv()
+        if batch is None:
+            return
+        for position, index, text in batch:
+            yield position, index, sources[index], json.loads(text)
+
+
+def _merge_worker(connection: Connection, sources: List[SourceInfo]) -> None:
+    """Merge every item sent down ``connection``; send the rows back after the closing ``None``."""
+    try:
+        rows = _merge_payloads(_received_payloads(connection, sources))
+    except Exception as exc:
+        # Keep reading so the parent can finish sending, then report the error in place of the rows.
+        while connection.recv() is not None:
+            pass
+        connection.send(exc)
+    else:
+        connection.send(rows)
+    finally:
+        connection.close()
+
+
+def _merge_parallel(source_paths: List[Path], workers: int) -> List[MergedItem]:
+    """Parse every source once here and merge each key's items in the worker owning the key.
+
+    Keys are partitioned by a hash, so a worker sees all items of its keys
+    and returns each key once. Items travel as their JSON text, which is
+    much cheaper to pass between processes than decoded dicts; workers
+    decode it again, normalise, merge and hash in parallel.
+    """
+    streams = open_sources(source_paths)
+    sources = [SourceInfo(**stream.source) for stream in streams]
+    context = multiprocessing.get_context("spawn")
+    connections: List[Connection] = []
+    processes = []
+    try:
+        for _ in range(workers):
+            parent_end, child_end = context.Pipe()
+            process = context.Process(target=_merge_worker, args=(child_end, sources), daemon=True)
+            process.start()
+            child_end.close()
+            connections.append(parent_end)
+            processes.append(process)
+        batches: List[List[Tuple[int, int, str]]] = [[] for _ in range(workers)]
+        position = 0
+        for index, stream in enumerate(streams):
+            for item_payload, text in stream.raw_items():
+                position += 1
+                key = _build_key(item_payload["name"], item_payload.get("brand"), item_payload.get("locale", "en-US"))
+                partition = _partition_of(key, workers)
+                batches[partition].append((position, index, text))
+                if len(batches[partition]) >= MERGE_BATCH_ITEMS:
+                    connections[partition].send(batches[partition])
+                    batches[partition] = []
+        for connection, batch in zip(connections, batches):
+            if batch:
+                connection.send(batch)
+            connection.send(None)
+        results = [connection.recv() for connection in connections]
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+        rows = [row for result in results for row in result]
+    finally:
+        for connection in connections:
+            connection.close()
+        for process in processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+    rows.sort(key=lambda row: row.first_seen)
+    return rows
+
+
+def _merge_all(source_paths: List[Path], workers: int) -> List[MergedItem]:
+    return _merge_parallel(source_paths, workers) if workers > 1 else _merge_sources(source_paths)
+
+
+def _existing_version(existing: Mapping[str, FoodItem], key: str) -> Optional[Tuple[str, VersionInfo]]:
+    if isinstance(existing, (BinaryCatalog, ShardedCatalog)):
+        return existing.version_for(key)
+    item = existing.get(key)
+    return None if item is None else (item.id, item.version)
+
+
+def _build_items(
+    rows: List[MergedItem], existing: Mapping[str, FoodItem], updated_at: Optional[str] = None
+) -> Dict[str, FoodItem]:
+    updated_at = updated_at or datetime.utcnow().isoformat()
+    items: Dict[str, FoodItem] = {}
+    for row in rows:
+        item_data = row.data
+        previous = _existing_version(existing, row.key)
+        if previous is not None:
+            item_id, version = previous
+            revision = version.revision
+            if version.content_hash != row.content_hash:
                 revision += 1
-            item_id = existing_item.id
         else:
             revision = 1
-            item_id = str(uuid.uuid4())
-        catalog.append(
-            FoodItem(
-                id=item_id,
-                name=item_data["name"],
-                brand=item_data["brand"],
-                locale=item_data["locale"],
-                confidence=item_data["confidence"],
-                sources=list(item_data["sources"].values()),
-                portions=item_data["portions"],
-                nutrients_per_100g=item_data["nutrients"],
-                version=VersionInfo(revision=revision, content_hash=new_hash),
-            )
+            item_id = str(uuid.uuid5(CATALOG_NAMESPACE, row.key))
+        items[row.key] = FoodItem(
+            id=item_id,
+            name=item_data["name"],
+            brand=item_data["brand"],
+            locale=item_data["locale"],
+            confidence=item_data["confidence"],
+            sources=list(item_data["sources"].values()),
+            portions=item_data["portions"],
+            nutrients_per_100g=item_data["nutrients"],
+            version=VersionInfo(revision=revision, content_hash=row.content_hash, updated_at=updated_at),
         )
+    return items
+
+
+def close_catalog(catalog: Mapping[str, FoodItem]) -> None:
+    """Unmap a catalog from ``load_existing_catalog``; decoded JSON catalogs hold nothing to release."""
+    if isinstance(catalog, (BinaryCatalog, ShardedCatalog)):
+        catalog.close()
 
+
+def ingest_sources(source_paths: List[Path], existing_path: Path, workers: int = 1) -> List[FoodItem]:
+    # Every header is checked before any item is read; items are then streamed one at a time.
+    open_sources(source_paths)
+    existing = load_existing_catalog(existing_path)
+    try:
+        catalog = list(_build_items(_merge_all(source_paths, workers), existing).values())
+    finally:
+        close_catalog(existing)
     validate_catalog(catalog)
     return catalog
 
 
-def write_catalog(items: List[FoodItem], output_path: Path) -> None:
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    payload = {
-        "items": [_serialize_item(item) for item in items],
+def _source_keys(rows: List[MergedItem], sources: int) -> List[List[str]]:
+    """Keys each source contributed, in order of first appearance."""
+    positions: List[List[Tuple[int, str]]] = [[] for _ in range(sources)]
+    for row in rows:
+        for index, position in row.appearances.items():
+            positions[index].append((position, row.key))
+    return [[key for _, key in sorted(entries)] for entries in positions]
+
+
+def _ingest_incremental(
+    source_paths: List[Path],
+    hashes: List[str],
+    manifest: ImportManifest,
+    existing: Mapping[str, FoodItem],
+) -> Tuple[List[FoodItem], ImportManifest, int, int, int]:
+    """Re-merge only the keys touched by changed sources; reuse every other item as stored."""
+    entries_before = [manifest.by_path[str(path)] for path in source_paths]
+    changed = {index for index, entry in enumerate(entries_before) if entry.sha256 != hashes[index]}
+    affected: Set[str] = set()
+    for index in changed:
+        affected.update(entries_before[index].keys)
+    changed_rows = _merge_sources(source_paths, skip=frozenset(range(len(source_paths))) - frozenset(changed))
+    affected.update(row.key for row in changed_rows)
+
+    # Unchanged sources are read only if they contribute to an affected key.
+    needed = {
+        index for index, entry in enumerate(entries_before) if index in changed or affected.intersection(entry.keys)
     }
-    output_path.write_text(json.dumps(payload, indent=2, sort_keys=True))
+    if needed == changed:
+        rows = changed_rows
+    else:
+        rows = _merge_sources(source_paths, keys=affected, skip=frozenset(range(len(source_paths))) - needed)
+    remerged = _build_items(rows, existing)
+
+    source_keys = _source_keys(rows, len(source_paths))
+    entries = []
+    for index, path in enumerate(source_paths):
+        keys = source_keys[index] if index in changed else entries_before[index].keys
+        entries.append(SourceEntry(str(path), hashes[index], keys))
+    new_manifest = ImportManifest(entries)
+
+    catalog = []
+    for key in new_manifest.ordered_keys():
+        item = remerged.get(key) if key in affected else existing.get(key)
+        if item is not None:
+            catalog.append(item)
+    return catalog, new_manifest, len(remerged), len(catalog) - len(remerged), len(needed)
+
+
+def _catalog_delta(
+    existing: Mapping[str, FoodItem], catalog: List[FoodItem], base_sha256: Optional[str], catalog_sha256: str
+) -> CatalogDelta:
+    """Compare ``catalog`` with the one it replaces by key, revision and content hash."""
+    delta = CatalogDelta(base_sha256, catalog_sha256)
+    keys = set()
+    for item in catalog:
+        key = _build_key(item.name, item.brand, item.locale)
+        keys.add(key)
+        previous = _existing_version(existing, key)
+        if previous is None:
+            delta.added.append(item)
+        elif (previous[1].revision, previous[1].content_hash) != (item.version.revision, item.version.content_hash):
+            delta.revised.append(item)
+    for key in existing:
+        if key not in keys:
+            delta.removed.append(_existing_version(existing, key)[0])
+    return delta
+
+
+def _write_shards(items: List[FoodItem], output_path: Path, staged: Path, fmt: str) -> None:
+    """One catalog file per locale next to ``output_path``, and the shard directory listing them at ``staged``."""
+    by_locale: Dict[str, List[FoodItem]] = {}
+    for item in items:
+        by_locale.setdefault(item.locale.strip().lower(), []).append(item)
+    shard_paths: Dict[Path, str] = {}
+    for locale in sorted(by_locale):
+        shard_path = shard_path_for(output_path, locale)
+        if shard_path in shard_paths:
+            raise ValueError(f"Locales {shard_paths[shard_path]!r} and {locale!r} would share shard {shard_path.name}")
+        shard_paths[shard_path] = locale
+    entries = []
+    for shard_path, locale in shard_paths.items():
+        shard_items = by_locale[locale]
+        write_catalog(shard_items, shard_path, fmt)
+        entries.append(ShardEntry(shard_items[0].locale, shard_path.name, len(shard_items), file_hash(shard_path)))
+    ShardDirectory(fmt, entries).save(staged)
+
+
+def stage_catalog(
+    items: List[FoodItem], output_path: Path, fmt: str = "json", shard_by_locale: bool = False
+) -> Path:
+    """Write the catalog for ``output_path`` to a temp file beside it, for ``publish_catalog``.
+
+    Shards are written under their own names; only the directory listing them
+    is staged, so it never lists a shard that has not been written.
+    """
+    if fmt not in ("json", "binary"):
+        raise ValueError(f"Unknown catalog format: {fmt}")
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    staged = output_path.with_suffix(output_path.suffix + ".tmp")
+    if shard_by_locale:
+        _write_shards(items, output_path, staged, fmt)
+    elif fmt == "binary":
+        write_binary_catalog(items, staged, lambda item: _build_key(item.name, item.brand, item.locale))
+    else:
+        payload = {
+            "items": [item_to_dict(item) for item in items],
+        }
+        staged.write_text(json.dumps(payload, indent=2, sort_keys=True))
+    return staged
+
+
+def publish_catalog(staged: Path, output_path: Path) -> None:
+    """Rename ``staged`` over ``output_path``, then delete shards only the replaced directory listed."""
+    previous = ShardDirectory.load(output_path) if output_path.exists() and is_shard_directory(output_path) else None
+    # Write-then-rename so a reader mapping the previous catalog is never truncated underneath.
+    os.replace(staged, output_path)
+    if previous is not None:
+        # Readers still mapping a deleted shard keep their copy.
+        current = ShardDirectory.load(output_path).shards if is_shard_directory(output_path) else []
+        kept = {entry.path for entry in current}
+        for entry in previous.shards:
+            if entry.path not in kept:
+                output_path.with_name(entry.path).unlink(missing_ok=True)
+
+
+def write_catalog(items: List[FoodItem], output_path: Path, fmt: str = "json", shard_by_locale: bool = False) -> None:
+    publish_catalog(stage_catalog(items, output_path, fmt, shard_by_locale), output_path)
+
+
+def import_catalog(
+    source_paths: List[Path],
+    output_path: Path,
+    workers: int = 1,
+    incremental: bool = True,
+    fmt: str = "json",
+    report_path: Optional[Path] = None,
+    dedup: Optional[str] = None,
+    shard_by_locale: bool = False,
+) -> ImportResult:
+    """Import into ``output_path``, re-reading only what changed since the last import.
+
+    A manifest next to the catalog records each source's hash and keys. When
+    the same sources are imported again into an untouched catalog, unchanged
+    sources are skipped and only keys contributed by changed ones are
+    re-merged; anything else falls back to a full import. So does switching
+    ``dedup`` to or from "merge": the stored catalog lacks the items a merge
+    folded away, so it cannot be reused when they should come back.
+
+    Every import also writes ``catalog.delta.json``: the items added, revised
+    or removed relative to the catalog it replaced, for servers to apply live.
+
+    With ``shard_by_locale``, ``output_path`` is a small directory file and
+    each locale's items go to their own shard beside it.
+
+    With ``dedup`` set, near-duplicate items are written as merge suggestions
+    next to the catalog ("report") or folded together as well ("merge").
+    """
+    open_sources(source_paths)
+    manifest_path = manifest_path_for(output_path)
+    manifest = ImportManifest.load(manifest_path) if incremental else None
+    hashes = [file_hash(path) for path in source_paths]
+    base_sha256 = file_hash(output_path) if output_path.exists() else None
+    usable = (
+        manifest is not None
+        and base_sha256 is not None
+        and [entry.path for entry in manifest.sources] == [str(path) for path in source_paths]
+        and manifest.catalog_sha256 == base_sha256
+        # Only "merge" changes the items; "report" and no dedup share a catalog.
+        and (manifest.dedup == "merge") == (dedup == "merge")
+    )
+    existing = load_existing_catalog(output_path)
+    try:
+        if usable:
+            catalog, manifest, remerged, reused, sources_read = _ingest_incremental(
+                source_paths, hashes, manifest, existing
+            )
+        else:
+            rows = _merge_all(source_paths, workers)
+            catalog = list(_build_items(rows, existing).values())
+            source_keys = _source_keys(rows, len(source_paths))
+            manifest = ImportManifest(
+                [SourceEntry(str(path), hashes[index], source_keys[index]) for index, path in enumerate(source_paths)]
+            )
+            remerged, reused, sources_read = len(catalog), 0, len(source_paths)
+
+        clusters = []
+        if dedup is not None:
+            catalog, clusters = deduplicate(catalog, dedup, report_path_for(output_path))
+        validation = validate_catalog(catalog, report_path)
+        staged = stage_catalog(catalog, output_path, fmt, shard_by_locale)
+        catalog_sha256 = file_hash(staged)
+        delta = _catalog_delta(existing, catalog, base_sha256, catalog_sha256)
+    finally:
+        close_catalog(existing)
+    # The delta goes out first: a server reloading in between applies it to the catalog it still
+    # serves (its base), and then finds the published catalog already current.
+    delta.save(delta_path_for(output_path))
+    publish_catalog(staged, output_path)
+    ImportManifest(manifest.sources, catalog_sha256, dedup).save(manifest_path)
+    return ImportResult(
+        len(catalog),
+        output_path,
+        remerged,
+        reused,
+        sources_read,
+        not usable,
+        validation.warnings,
+        len(clusters),
+        delta,
+    )
 
 
-def run_import(source_paths: List[Path], output_path: Path) -> Tuple[int, Path]:
-    catalog = ingest_sources(source_paths, output_path)
-    write_catalog(catalog, output_path)
-    return len(catalog), output_path
+def run_import(source_paths: List[Path], output_path: Path, workers: int = 1) -> Tuple[int, Path]:
+    result = import_catalog(source_paths, output_path, workers)
+    return result.count, result.path
@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from dataclasses import dataclass, field
 from datetime import datetime
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 
 
 @dataclass(frozen=True)
@@ -50,3 +50,31 @@ class FoodItem:
     portions: List[Portion]
     nutrients_per_100g: NutrientProfile
     version: VersionInfo
+
+
+def item_to_dict(item: FoodItem) -> Dict[str, Any]:
+    return {
+        "id": item.id,
+        "name": item.name,
+        "brand": item.brand,
+        "locale": item.locale,
+        "confidence": item.confidence,
+        "sources": [source.__dict__ for source in item.sources],
+        "portions": [portion.__dict__ for portion in item.portions],
+        "nutrients_per_100g": item.nutrients_per_100g.__dict__,
+        "version": item.version.__dict__,
+    }
+
+
+def item_from_dict(entry: Dict[str, Any]) -> FoodItem:
+    return FoodItem(
+        id=entry["id"],
+        name=entry["name"],
+        brand=entry.get("brand"),
+        locale=entry["locale"],
+        confidence=entry["confidence"],
+        sources=[SourceInfo(**source) for source in entry["sources"]],
+        portions=[Portion(**portion) for portion in entry["portions"]],
+        nutrients_per_100g=NutrientProfile(**entry["nutrients_per_100g"]),
+        version=VersionInfo(**entry["version"]),
+    )
@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import json
+import os
+import re
+from collections.abc import Mapping
+from dataclasses import dataclass
+from itertools import chain
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .binary import BinaryCatalog
+from .schema import FoodItem, VersionInfo
+
+# A shard directory is written with this key first, so it can be told apart from a catalog cheaply.
+DIRECTORY_MAGIC = b'{"catalog_shards"'
+DIRECTORY_VERSION = 1
+
+
+def shard_path_for(catalog_path: Path, locale: str) -> Path:
+    slug = re.sub(r"[^a-z0-9_-]+", "_", locale.strip().lower())
+    return catalog_path.with_name(f"{catalog_path.stem}.{slug}{catalog_path.suffix}")
+
+
+def is_shard_directory(path: Path) -> bool:
+    with path.open("rb") as handle:
+        return handle.read(len(DIRECTORY_MAGIC)) == DIRECTORY_MAGIC
+
+
+def normalize_locales(locales: Optional[Iterable[str]]) -> Optional[frozenset]:
+    return None if locales is None else frozenset(locale.strip().lower() for locale in locales)
+
+
+@dataclass(frozen=True)
+class ShardEntry:
+    locale: str
+    # File name, relative to the directory file.
+    path: str
+    items: int
+    sha256: str
+
+
+@dataclass(frozen=True)
+class ShardDirectory:
+    """Per-locale catalog shards. Each entry carries its shard's hash, so the
+    directory file changes whenever any shard does."""
+
+    format: str
+    shards: List[ShardEntry]
+
+    def select(self, locales: Optional[Iterable[str]] = None) -> List[ShardEntry]:
+        wanted = normalize_locales(locales)
+        return [entry for entry in self.shards if wanted is None or entry.locale.lower() in wanted]
+
+    @classmethod
+    def load(cls, path: Path) -> "ShardDirectory":
+        data = json.loads(path.read_text())
+        return cls(data["format"], [ShardEntry(**entry) for entry in data["shards"]])
+
+    def save(self, path: Path) -> None:
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        payload = {
+            "catalog_shards": DIRECTORY_VERSION,
+            "format": self.format,
+            "shards": [entry.__dict__ for entry in self.shards],
+        }
+        tmp_path.write_text(json.dumps(payload))
+        os.replace(tmp_path, path)
+
+
+class ShardedCatalog(Mapping):
+    """Read-only view over the opened shards, keyed by merge key.
+
+    The locale is the last part of a merge key, so lookups go straight to the
+    one shard that can hold the key.
+    """
+
+    def __init__(self, shards: Dict[str, Mapping]) -> None:
+        self.shards = {locale.lower(): shard for locale, shard in shards.items()}
+
+    def _shard_for(self, key: str) -> Optional[Mapping]:
+        return self.shards.get(key.rsplit("::", 1)[-1])
+
+    def __getitem__(self, key: str) -> FoodItem:
+        shard = self._shard_for(key)
+        if shard is None:
+            raise KeyError(key)
+        return shard[key]
+
+    def __contains__(self, key: object) -> bool:
+        if not isinstance(key, str):
+            return False
+        shard = self._shard_for(key)
+        return shard is not None and key in shard
+
+    def __iter__(self) -> Iterator[str]:
+        return chain.from_iterable(self.shards.values())
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self.shards.values())
+
+    def version_for(self, key: str) -> Optional[Tuple[str, VersionInfo]]:
+        shard = self._shard_for(key)
+        if isinstance(shard, BinaryCatalog):
+            return shard.version_for(key)
+        item = shard.get(key) if shard is not None else None
+        return None if item is None else (item.id, item.version)
+
+    def get_by_id(self, item_id: str) -> Optional[FoodItem]:
+        for shard in self.shards.values():
+            if isinstance(shard, BinaryCatalog):
+                item = shard.get_by_id(item_id)
+            else:
+                item = next((item for item in shard.values() if item.id == item_id), None)
+            if item is not None:
+                return item
+        return None
+
+    def close(self) -> None:
+        for shard in self.shards.values():
+            if isinstance(shard, BinaryCatalog):
+                shard.close()
@@ -1,25 +1,205 @@
 from __future__ import annotations
 
 import json
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, IO, Iterator, List, Optional, Tuple
+
+READ_CHUNK_CHARS = 64 * 1024
+NDJSON_SUFFIXES = (".ndjson", ".jsonl")
+REQUIRED_SOURCE_FIELDS = ("name", "dataset", "version")
 
 
 class SourceLoadError(ValueError):
     pass
 
 
-def load_json_source(path: Path) -> Dict[str, Any]:
+class _JsonReader:
+    """Incremental tokenizer over a JSON text file, decoding one value at a time."""
+
+    def __init__(self, handle: IO[str], path: Path, chunk_chars: int = READ_CHUNK_CHARS) -> None:
+        self.handle = handle
+        self.path = path
+        self.chunk_chars = chunk_chars
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self._decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.handle.read(self.chunk_chars)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos :] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char: str) -> None:
+        if self.peek() != char:
+            raise SourceLoadError(f"Invalid JSON in source: {self.path} (expected {char!r})")
+        self.pos += 1
+
+    def value(self) -> Any:
+        return self.raw_value()[0]
+
+    def raw_value(self) -> Tuple[Any, str]:
+        """The next value and the JSON text it was decoded from."""
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError as exc:
+                if not self._fill():
+                    raise SourceLoadError(f"Invalid JSON in source: {self.path}") from exc
+                continue
+            # A number running into the end of the buffer may have more digits to come.
+            if end == len(self.buffer) and self._fill():
+                continue
+            text = self.buffer[self.pos : end]
+            self.pos = end
+            return value, text
+
+    def members(self) -> Iterator[str]:
+        """Keys of the top-level object; the caller consumes each value."""
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            if not isinstance(key, str):
+                raise SourceLoadError(f"Invalid JSON in source: {self.path}")
+            self.expect(":")
+            yield key
+            if self.peek() == ",":
+                self.pos += 1
+                continue
+            self.expect("}")
+            return
+
+    def elements(self) -> Iterator[Any]:
+        for value, _ in self.raw_elements():
+            yield value
+
+    def raw_elements(self) -> Iterator[Tuple[Any, str]]:
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.raw_value()
+            if self.peek() == ",":
+                self.pos += 1
+                continue
+            self.expect("]")
+            return
+
+
+def _check_source(source: Any, path: Path) -> Dict[str, Any]:
+    if not isinstance(source, dict):
+        raise SourceLoadError(f"Source missing source block: {path}")
+    missing = [name for name in REQUIRED_SOURCE_FIELDS if not source.get(name)]
+    if missing:
+        raise SourceLoadError(f"Source block missing {', '.join(missing)}: {path}")
+    return source
+
+
+@dataclass(frozen=True)
+class SourceStream:
+    """A source whose header has been checked and whose items are read on demand.
+
+    JSON sources are ``{"source": {...}, "items": [...]}``; NDJSON sources
+    (``.ndjson``/``.jsonl``) hold the ``{"source": {...}}`` header on the first
+    line and one item per following line.
+    """
+
+    path: Path
+    source: Dict[str, Any]
+    ndjson: bool
+
+    def items(self) -> Iterator[Dict[str, Any]]:
+        for item, _ in self.raw_items():
+            yield item
+
+    def raw_items(self) -> Iterator[Tuple[Dict[str, Any], str]]:
+        """Items together with their JSON text, for handing on without pickling the decoded dicts."""
+        try:
+            with self.path.open(encoding="utf-8") as handle:
+                if self.ndjson:
+                    yield from self._ndjson_items(handle)
+                    return
+                reader = _JsonReader(handle, self.path)
+                for key in reader.members():
+                    if key != "items":
+                        reader.value()
+                        continue
+                    yield from reader.raw_elements()
+                    return
+        except OSError as exc:
+            raise SourceLoadError(f"Unable to read source: {self.path}") from exc
+
+    def _ndjson_items(self, handle: IO[str]) -> Iterator[Tuple[Dict[str, Any], str]]:
+        handle.readline()
+        for number, line in enumerate(handle, start=2):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line), line
+            except json.JSONDecodeError as exc:
+                raise SourceLoadError(f"Invalid JSON in source: {self.path} line {number}") from exc
+
+
+def _json_header(path: Path, handle: IO[str]) -> Tuple[Optional[Any], bool]:
+    reader = _JsonReader(handle, path)
+    source, has_items = None, False
+    for key in reader.members():
+        if key == "items":
+            has_items = True
+            if source is not None:
+                break
+            # Items ahead of the source block: skip them now, stream them on a second pass.
+            for _ in reader.elements():
+                pass
+        elif key == "source":
+            source = reader.value()
+            if has_items:
+                break
+        else:
+            reader.value()
+    return source, has_items
+
+
+def open_source(path: Path) -> SourceStream:
+    """Check a source's header without reading its items."""
+    ndjson = path.suffix.lower() in NDJSON_SUFFIXES
     try:
-        data = json.loads(path.read_text())
+        with path.open(encoding="utf-8") as handle:
+            if ndjson:
+                try:
+                    header = json.loads(handle.readline() or "null")
+                except json.JSONDecodeError as exc:
+                    raise SourceLoadError(f"Invalid JSON in source: {path}") from exc
+                source = header.get("source") if isinstance(header, dict) else None
+            else:
+                source, has_items = _json_header(path, handle)
+                if not has_items:
+                    raise SourceLoadError(f"Source missing items: {path}")
     except OSError as exc:
         raise SourceLoadError(f"Unable to read source: {path}") from exc
-    except json.JSONDecodeError as exc:
-        raise SourceLoadError(f"Invalid JSON in source: {path}") from exc
-    if "items" not in data:
-        raise SourceLoadError(f"Source missing items: {path}")
-    return data
+    return SourceStream(path, _check_source(source, path), ndjson)
 
 
-def load_sources(paths: List[Path]) -> List[Dict[str, Any]]:
-    return [load_json_source(path) for path in paths]
+def open_sources(paths: List[Path]) -> List[SourceStream]:
+    return [open_source(path) for path in paths]
@@ -1,7 +1,12 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import List
+import math
+from array import array
+from dataclasses import dataclass, field
+from itertools import compress, count
+from json.encoder import encode_basestring
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 
 from .schema import FoodItem
 
@@ -14,6 +19,8 @@ class ValidationIssue:
 
 
 class ValidationError(ValueError):
+    """Raised when a catalog has errors; ``issues`` holds warnings as well, as it always has."""
+
     def __init__(self, issues: List[ValidationIssue]):
         super().__init__("Validation failed")
         self.issues = issues
@@ -21,51 +28,180 @@ class ValidationError(ValueError):
 
 MAX_CALORIES_PER_100G = 1000
 MIN_MACRO_VALUE = 0
+KCAL_PER_G_PROTEIN = 4
+KCAL_PER_G_CARBS = 4
+KCAL_PER_G_FAT = 9
+# Atwater estimates may differ from the label by this much (fibre, polyols, rounding).
+ENERGY_TOLERANCE_KCAL = 20.0
+ENERGY_TOLERANCE_RATIO = 0.2
+# Macros may exceed 100 g per 100 g by rounding only.
+MACRO_SUM_TOLERANCE_G = 1.0
+MAX_PORTION_GRAMS = 5000
+# Issues kept on ValidationError; the full list goes to the report file.
+MAX_RAISED_ISSUES = 1000
 
+MACROS = ("protein_g", "fat_g", "carbs_g")
+NUTRIENTS = ("calories_kcal", "protein_g", "fat_g", "carbs_g", "fiber_g", "sugar_g", "sodium_mg")
 
-def validate_food_item(item: FoodItem) -> List[ValidationIssue]:
-    issues: List[ValidationIssue] = []
-    nutrients = item.nutrients_per_100g
-    for macro_name, value in (
-        ("protein_g", nutrients.protein_g),
-        ("fat_g", nutrients.fat_g),
-        ("carbs_g", nutrients.carbs_g),
-    ):
-        if value is None:
-            issues.append(
-                ValidationIssue(
-                    item.id,
-                    f"Missing macro nutrient: {macro_name}",
-                    "error",
-                )
-            )
-        elif value < MIN_MACRO_VALUE:
-            issues.append(
-                ValidationIssue(
-                    item.id,
-                    f"Negative macro nutrient: {macro_name}",
-                    "error",
-                )
-            )
-    if nutrients.calories_kcal is None:
-        issues.append(
-            ValidationIssue(item.id, "Missing calories", "error")
-        )
-    elif nutrients.calories_kcal > MAX_CALORIES_PER_100G:
-        issues.append(
-            ValidationIssue(
-                item.id,
-                f"Calories outlier (> {MAX_CALORIES_PER_100G} per 100g)",
-                "warning",
-            )
+
+def _column(values: Iterable[Optional[float]]) -> array:
+    return array("d", (math.nan if value is None else value for value in values))
+
+
+@dataclass
+class NutrientColumns:
+    """Catalog nutrients as float64 columns (NaN for missing) plus flattened portions.
+
+    The columns are stdlib arrays: compact, but each rule still visits them a
+    row at a time in Python, through ``map``/``compress`` or a plain loop.
+    """
+
+    ids: List[str]
+    nutrients: Dict[str, array]
+    portion_owner: array = field(default_factory=lambda: array("l"))
+    portion_grams: array = field(default_factory=lambda: array("d"))
+
+    @classmethod
+    def from_items(cls, items: Sequence[FoodItem]) -> "NutrientColumns":
+        profiles = [item.nutrients_per_100g for item in items]
+        owners, grams = array("l"), array("d")
+        for index, item in enumerate(items):
+            for portion in item.portions:
+                owners.append(index)
+                grams.append(portion.gram_weight)
+        return cls(
+            ids=[item.id for item in items],
+            nutrients={name: _column(getattr(profile, name) for profile in profiles) for name in NUTRIENTS},
+            portion_owner=owners,
+            portion_grams=grams,
         )
-    return issues
 
 
-def validate_catalog(items: List[FoodItem]) -> None:
-    issues: List[ValidationIssue] = []
-    for item in items:
-        issues.extend(validate_food_item(item))
-    errors = [issue for issue in issues if issue.severity == "error"]
-    if errors:
-        raise ValidationError(issues)
+# A rule yields (row, message) for every failing row of the columns.
+Check = Callable[[NutrientColumns], Iterator[Tuple[int, str]]]
+
+
+@dataclass(frozen=True)
+class Rule:
+    name: str
+    severity: str
+    check: Check
+
+
+def _rows(mask: Iterable[bool], message: str) -> Iterator[Tuple[int, str]]:
+    """(row, message) for every true entry of a column-wide mask."""
+    return ((row, message) for row in compress(count(), mask))
+
+
+def _missing_macros(columns: NutrientColumns) -> Iterator[Tuple[int, str]]:
+    for name in MACROS:
+        yield from _rows(map(math.isnan, columns.nutrients[name]), f"Missing macro nutrient: {name}")
+
+
+def _negative_macros(columns: NutrientColumns) -> Iterator[Tuple[int, str]]:
+    below = float(MIN_MACRO_VALUE).__gt__
+    for name in MACROS:
+        yield from _rows(map(below, columns.nutrients[name]), f"Negative macro nutrient: {name}")
+
+
+def _missing_calories(columns: NutrientColumns) -> Iterator[Tuple[int, str]]:
+    return _rows(map(math.isnan, columns.nutrients["calories_kcal"]), "Missing calories")
+
+
+def _calorie_outliers(columns: NutrientColumns) -> Iterator[Tuple[int, str]]:
+    above = float(MAX_CALORIES_PER_100G).__lt__
+    message = f"Calories outlier (> {MAX_CALORIES_PER_100G} per 100g)"
+    return _rows(map(above, columns.nutrients["calories_kcal"]), message)
+
+
+def _energy_mismatch(columns: NutrientColumns) -> Iterator[Tuple[int, str]]:
+    nutrients = columns.nutrients
+    rows = zip(nutrients["calories_kcal"], nutrients["protein_g"], nutrients["carbs_g"], nutrients["fat_g"])
+    for row, (kcal, protein, carbs, fat) in enumerate(rows):
+        estimate = KCAL_PER_G_PROTEIN * protein + KCAL_PER_G_CARBS * carbs + KCAL_PER_G_FAT * fat
+        # NaN compares False, so rows with a missing value are left to the missing-value rules.
+        if abs(estimate - kcal) > max(ENERGY_TOLERANCE_KCAL, ENERGY_TOLERANCE_RATIO * kcal):
+            yield row, f"Energy mismatch: {kcal:g} kcal vs {estimate:.0f} kcal from 4/4/9 macros"
+
+
+def _macro_sum(columns: NutrientColumns) -> Iterator[Tuple[int, str]]:
+    nutrients = columns.nutrients
+    for row, total in enumerate(map(math.fsum, zip(*(nutrients[name] for name in MACROS)))):
+        if total > 100 + MACRO_SUM_TOLERANCE_G:
+            yield row, f"Macros sum to {total:g} g per 100g"
+
+
+def _portion_weights(columns: NutrientColumns) -> Iterator[Tuple[int, str]]:
+    for owner, grams in zip(columns.portion_owner, columns.portion_grams):
+        if not grams > 0:
+            yield owner, f"Portion gram weight must be positive (got {grams:g})"
+        elif grams > MAX_PORTION_GRAMS:
+            yield owner, f"Portion gram weight {grams:g} g exceeds {MAX_PORTION_GRAMS} g"
+
+
+# Error rules come first, so the issues kept on ValidationError start with every error found.
+# Rules added after the original missing/negative/outlier checks only warn, so catalogs
+# that used to import still do.
+DEFAULT_RULES: Tuple[Rule, ...] = (
+    Rule("missing_macros", "error", _missing_macros),
+    Rule("negative_macros", "error", _negative_macros),
+    Rule("missing_calories", "error", _missing_calories),
+    Rule("calorie_outlier", "warning", _calorie_outliers),
+    Rule("energy_mismatch", "warning", _energy_mismatch),
+    Rule("macro_sum", "warning", _macro_sum),
+    Rule("portion_weight", "warning", _portion_weights),
+)
+
+
+@dataclass
+class ValidationSummary:
+    errors: int = 0
+    warnings: int = 0
+    by_rule: Dict[str, int] = field(default_factory=dict)
+    first_issues: List[ValidationIssue] = field(default_factory=list)
+
+
+class ValidationEngine:
+    """Runs a rule set one rule at a time over the whole catalog, streaming issues out as they are found."""
+
+    def __init__(self, rules: Sequence[Rule] = DEFAULT_RULES) -> None:
+        self.rules = tuple(rules)
+
+    def iter_issues(self, columns: NutrientColumns) -> Iterator[Tuple[Rule, ValidationIssue]]:
+        for rule in self.rules:
+            for row, message in rule.check(columns):
+                yield rule, ValidationIssue(columns.ids[row], message, rule.severity)
+
+    def run(self, columns: NutrientColumns, report_path: Optional[Path] = None) -> ValidationSummary:
+        """Count issues per rule, writing each one as a JSON line to ``report_path`` if given."""
+        summary = ValidationSummary()
+        report = report_path.open("w", encoding="utf-8") if report_path is not None else None
+        try:
+            for rule, issue in self.iter_issues(columns):
+                summary.by_rule[rule.name] = summary.by_rule.get(rule.name, 0) + 1
+                if issue.severity == "error":
+                    summary.errors += 1
+                else:
+                    summary.warnings += 1
+                if len(summary.first_issues) < MAX_RAISED_ISSUES:
+                    summary.first_issues.append(issue)
+                if report is not None:
+                    report.write(
+                        f'{{"rule": "{rule.name}", "item_id": {encode_basestring(issue.item_id)}, '
+                        f'"message": {encode_basestring(issue.message)}, "severity": "{issue.severity}"}}\n'
+                    )
+        finally:
+            if report is not None:
+                report.close()
+        return summary
+
+
+def validate_food_item(item: FoodItem) -> List[ValidationIssue]:
+    return [issue for _, issue in ValidationEngine().iter_issues(NutrientColumns.from_items([item]))]
+
+
+def validate_catalog(items: List[FoodItem], report_path: Optional[Path] = None) -> ValidationSummary:
+    summary = ValidationEngine().run(NutrientColumns.from_items(items), report_path)
+    if summary.errors:
+        raise ValidationError(summary.first_issues)
+    return summary
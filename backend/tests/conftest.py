@@ -1,6 +1,58 @@
+import os
 import sys
+from contextlib import contextmanager
 from pathlib import Path
 
+import pytest
+
 ROOT = Path(__file__).resolve().parents[2]
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
+
+# Keep the API modules from creating ./calorie_tracker.db when they are imported.
+os.environ.setdefault("CALORIE_TRACKER_DATABASE_URL", "sqlite://")
+
+
+@pytest.fixture
+def db_session(tmp_path: Path):
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    from app.cache import user_cache
+    from app.database import Base
+
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'test.db'}",
+        connect_args={"check_same_thread": False},
+    )
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    user_cache.clear()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
+        user_cache.clear()
+
+
+@pytest.fixture
+def assert_statements():
+    """Return a context manager asserting how many SQL statements a block issues."""
+    from sqlalchemy import event
+
+    @contextmanager
+    def _assert_statements(engine, expected: int):
+        statements = []
+
+        def _record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", _record)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, "before_cursor_execute", _record)
+        assert len(statements) == expected, "\n".join(statements)
+
+    return _assert_statements
@@ -0,0 +1,18 @@
+from fastapi.testclient import TestClient
+
+from app import async_main
+
+
+def test_async_api_round_trip() -> None:
+    with TestClient(async_main.app) as client:
+        user = client.post("/users", json={"name": "Ada", "email": "async@example.com"}).json()
+        log = client.post(f"/users/{user['id']}/daily-logs", json={"log_date": "2024-01-01"}).json()
+        meal = client.post(f"/daily-logs/{log['id']}/meals", json={"name": "Lunch"}).json()
+        client.post(
+            f"/meals/{meal['id']}/food-items",
+            json={"name": "Rice", "calories": 130, "carbs": 28.0, "quantity": 2},
+        )
+
+        totals = client.get(f"/daily-logs/{log['id']}/macro-totals").json()
+        assert totals["calories_total"] == 260
+        assert client.get("/users/999999").status_code == 404
@@ -0,0 +1,30 @@
+from dataclasses import replace
+from pathlib import Path
+
+from backend.catalog.binary import BinaryCatalog
+from backend.catalog.pipeline import import_catalog, ingest_sources, load_existing_catalog
+
+SOURCES = [Path("backend/catalog/data/source_usda.json"), Path("backend/catalog/data/source_brand.json")]
+
+
+def test_binary_catalog_round_trips_and_indexes_keys_and_ids(tmp_path: Path) -> None:
+    json_path, binary_path = tmp_path / "catalog.json", tmp_path / "catalog.bin"
+    import_catalog(SOURCES, json_path)
+    import_catalog(SOURCES, binary_path, fmt="binary")
+    expected = load_existing_catalog(json_path)
+
+    with BinaryCatalog(binary_path) as catalog:
+        assert list(catalog) == list(expected)
+        # Separate imports differ only in their updated_at timestamps.
+        assert dict(catalog.items()) == {key: replace(item, version=catalog[key].version) for key, item in expected.items()}
+        oat_milk = catalog["oat milk::oaty::en-us"]
+        assert oat_milk.brand == "Oaty" and oat_milk.portions[0].unit == "ml"
+        assert catalog.get_by_id(oat_milk.id) == oat_milk
+        assert catalog.version_for("oat milk::oaty::en-us") == (oat_milk.id, oat_milk.version)
+        assert "missing::::en-us" not in catalog and catalog.get_by_id("missing") is None
+        assert catalog["banana::::en-us"].brand is None
+
+    # The pipeline reads previous versions straight from the binary file.
+    again = import_catalog(SOURCES, binary_path, fmt="binary", incremental=False)
+    assert again.count == 3
+    assert all(item.version.revision == 1 for item in ingest_sources(SOURCES, binary_path))
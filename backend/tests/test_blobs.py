@@ -0,0 +1,91 @@
+import asyncio
+import os
+import threading
+
+from fastapi.testclient import TestClient
+
+from app import blobs, main, storage
+from app.blobs import BlobResponse, BlobStore
+from app.inference_cache import InferenceCache
+from app.storage import PhotoLogStore
+
+
+def test_duplicates_share_one_blob_until_the_last_reference_goes(tmp_path) -> None:
+    store = BlobStore(tmp_path)
+    assert store.put("ab" * 32, [b"plate ", b"bytes"], "log-1", owner="7")
+    assert not store.put("ab" * 32, [b"plate bytes"], "log-2", owner="8")
+    assert store.refcount("ab" * 32) == 2
+    with store.open("ab" * 32) as view:
+        assert bytes(view) == b"plate bytes"
+
+    assert store.release("log-1") == []
+    assert store.release_owner("8") == ["ab" * 32]
+    assert not store.exists("ab" * 32)
+    assert [name for _, _, files in os.walk(tmp_path / "ab") for name in files] == []
+    store.close()
+
+
+def test_concurrent_puts_write_outside_the_lock_and_dedup_on_the_rename(tmp_path) -> None:
+    store = BlobStore(tmp_path)
+    # Each writer waits for the other mid-write, which only works if neither holds the lock.
+    barrier = threading.Barrier(2, timeout=10)
+
+    def chunks():
+        yield b"plate "
+        barrier.wait()
+        yield b"bytes"
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda ref=ref: results.append(store.put("cd" * 32, chunks(), ref))) for ref in "ab"
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(results) == [False, True] and store.refcount("cd" * 32) == 2
+    assert [name for _, _, files in os.walk(tmp_path / "cd") for name in files] == ["cd" * 32]
+    store.close()
+
+def test_photo_is_served_and_deleted_per_account(tmp_path, monkeypatch) -> None:
+    log_store = PhotoLogStore(tmp_path, fsync_policy="batch")
+    monkeypatch.setattr(storage, "photo_log_store", log_store)
+    monkeypatch.setattr(main, "photo_log_store", log_store)
+    monkeypatch.setattr(main, "inference_cache", InferenceCache(tmp_path / "cache.sqlite3"))
+    monkeypatch.setattr(main, "blob_store", BlobStore(tmp_path / "blobs"))
+    client = TestClient(main.app)
+
+    log_id = client.post(
+        "/photo-log", files={"photo": ("plate.jpg", b"jpeg bytes", "image/jpeg")}, data={"user_id": "3"}
+    ).json()["log_id"]
+    photo = client.get(f"/photo-log/{log_id}/photo")
+    assert photo.content == b"jpeg bytes" and photo.headers["content-type"] == "image/jpeg"
+
+    assert client.delete("/users/3/photos").json() == {"user_id": 3, "blobs_deleted": 1}
+    assert client.get(f"/photo-log/{log_id}/photo").status_code == 404
+
+
+def test_blob_response_sends_the_path_or_mapped_slices(tmp_path, monkeypatch) -> None:
+    monkeypatch.setattr(blobs, "BLOB_SEND_CHUNK", 4)
+    store = BlobStore(tmp_path)
+    store.put("cd" * 32, [b"plate bytes"], "log-1")
+    response = BlobResponse(store.path_for("cd" * 32), "cd" * 32, media_type="image/jpeg")
+
+    def serve(extensions: dict) -> list:
+        sent = []
+
+        async def send(message) -> None:
+            sent.append(message)
+
+        asyncio.run(response({"type": "http", "method": "GET", "extensions": extensions}, None, send))
+        return sent
+
+    start, *body = serve({})
+    assert (b"content-length", b"11") in start["headers"] and (b"etag", b'"' + b"cd" * 32 + b'"') in start["headers"]
+    assert [type(message["body"]) for message in body] == [memoryview] * 3
+    assert b"".join(bytes(message["body"]) for message in body) == b"plate bytes"
+    assert [message["more_body"] for message in body] == [True, True, False]
+
+    _, pathsend = serve({"http.response.pathsend": {}})
+    assert pathsend == {"type": "http.response.pathsend", "path": str(store.path_for("cd" * 32))}
+    store.close()
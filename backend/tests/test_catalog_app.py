@@ -0,0 +1,75 @@
+import importlib.util
+import json
+import sys
+from pathlib import Path
+
+from backend.catalog.pipeline import import_catalog
+
+ROOT = Path(__file__).resolve().parents[2]
+
+
+def load_flask_app(monkeypatch, catalog_path: Path, name: str):
+    """Import the Flask app (shadowed by the ``app`` package) against ``catalog_path``."""
+    monkeypatch.setenv("CALORIE_TRACKER_CATALOG", str(catalog_path))
+    spec = importlib.util.spec_from_file_location(name, ROOT / "app.py")
+    module = importlib.util.module_from_spec(spec)
+    monkeypatch.setitem(sys.modules, name, module)
+    spec.loader.exec_module(module)
+    return module
+
+
+def write_source(path: Path, names: list, locale: str = "en-US") -> None:
+    header = {"name": "Test", "dataset": "Test", "version": "1", "url": None}
+    nutrients = {"calories_kcal": 89, "protein_g": 1.1, "fat_g": 0.3, "carbs_g": 22.8}
+    items = [
+        {"name": name, "locale": locale, "portions": [{"amount": 100, "unit": "g"}], "nutrients_per_100g": nutrients}
+        for name in names
+    ]
+    path.write_text(json.dumps({"source": header, "items": items}))
+
+
+def search(client, query: str) -> dict:
+    return client.get("/api/search", query_string={"q": query, "user_id": "u"}).get_json()
+
+
+def test_search_uses_view_token_index_and_reload_swaps_the_cache(tmp_path: Path, monkeypatch) -> None:
+    source, catalog_path = tmp_path / "source.json", tmp_path / "catalog.bin"
+    write_source(source, ["Banana Bread", "Green Lentils", "Red Lentil Soup"])
+    import_catalog([source], catalog_path, fmt="binary")
+    flask_app = load_flask_app(monkeypatch, catalog_path, "flask_app_index")
+    client = flask_app.app.test_client()
+
+    assert {item["name"] for item in search(client, "lentil")["results"]} == {"Green Lentils", "Red Lentil Soup"}
+    # Substrings inside a token and across tokens match as before.
+    assert [item["name"] for item in search(client, "nana")["results"]] == ["Banana Bread"]
+    assert [item["name"] for item in search(client, "na bre")["results"]] == ["Banana Bread"]
+    assert search(client, "lentils")["results"][0]["name"] == "Green Lentils"
+    assert search(client, "lentils")["cached"]
+    old_view = flask_app.catalog_view
+
+    write_source(source, ["Banana Bread", "Green Lentils", "Lentil Curry"])
+    import_catalog([source], catalog_path, fmt="binary")
+    assert client.post("/api/catalog/reload").get_json()["mode"] == "delta"
+    assert flask_app.catalog_view.search_cache == {} and old_view.search_cache
+
+    result = search(client, "lentil")
+    assert not result["cached"]
+    assert {item["name"] for item in result["results"]} == {"Green Lentils", "Lentil Curry"}
+    assert "Red Lentil Soup" not in {item["name"] for item in search(client, "soup")["results"]}
+
+
+def test_search_and_resolve_over_json_locale_shards(tmp_path: Path, monkeypatch) -> None:
+    english, german, catalog_path = tmp_path / "en.json", tmp_path / "de.json", tmp_path / "catalog.json"
+    write_source(english, ["Green Lentils", "Banana Bread"])
+    write_source(german, ["Linsen Suppe", "Lentils Mit Speck"], locale="de-DE")
+    import_catalog([english, german], catalog_path, shard_by_locale=True)
+    monkeypatch.setenv("CALORIE_TRACKER_CATALOG_LOCALES", "de-DE")
+    flask_app = load_flask_app(monkeypatch, catalog_path, "flask_app_shards")
+    client = flask_app.app.test_client()
+
+    results = search(client, "lentils")["results"]
+    assert [item["name"] for item in results] == ["Lentils Mit Speck"]
+    item_id = results[0]["id"]
+    assert client.post("/api/favorites", query_string={"user_id": "u"}, json={"item_id": item_id}).status_code == 200
+    favorites = client.get("/api/favorites", query_string={"user_id": "u"}).get_json()["favorites"]
+    assert [item["name"] for item in favorites] == ["Lentils Mit Speck"]
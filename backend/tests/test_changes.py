@@ -0,0 +1,78 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from app import changes, crud
+
+
+def test_change_feed_coalesces_since_cursor(db_session) -> None:
+    user = crud.create_user(db_session, "Ada", "ada@example.com", "UTC")
+    log = crud.upsert_daily_log(db_session, user, date(2024, 1, 1), "UTC")
+    meal = crud.create_meal(db_session, log, {"name": "Lunch"})
+    cursor = changes.list_changes(db_session, user.id).cursor
+
+    item = crud.create_food_item(db_session, meal, {"name": "Rice", "calories": 130})
+    crud.update_food_item(db_session, item, {"calories": 140})
+    scratch = crud.create_food_item(db_session, meal, {"name": "Gum", "calories": 5})
+    crud.delete_food_item(db_session, scratch)
+    crud.delete_weight_entry(db_session, crud.upsert_weight_entry(db_session, user.id, date(2024, 1, 1), {"weight": 70}))
+
+    feed = changes.list_changes(db_session, user.id, since=cursor)
+    by_entity = {(change.entity, change.op): change for change in feed.changes}
+    assert by_entity[("food_item", "insert")].data["calories"] == 140
+    assert by_entity[("macro_totals", "update")].data["calories_total"] == 140
+    assert not any(change.entity in {"weight_entry"} for change in feed.changes)
+    assert not any(change.entity_id == scratch.id and change.entity == "food_item" for change in feed.changes)
+    assert changes.list_changes(db_session, user.id, since=feed.cursor).changes == []
+
+
+def test_compaction_expires_old_cursors(db_session) -> None:
+    user = crud.create_user(db_session, "Ada", "ada@example.com", "UTC")
+    crud.upsert_weight_entry(db_session, user.id, date(2024, 1, 1), {"weight": 70})
+
+    removed = changes.compact_change_log(db_session, timedelta(days=1), now=datetime.utcnow() + timedelta(days=2))
+    assert removed == 2
+    with pytest.raises(changes.CursorExpiredError):
+        changes.list_changes(db_session, user.id, since=0)
+
+
+def test_cursors_keep_growing_after_compaction_empties_the_log(db_session) -> None:
+    user = crud.create_user(db_session, "Ada", "ada@example.com", "UTC")
+    entry = crud.upsert_weight_entry(db_session, user.id, date(2024, 1, 1), {"weight": 70})
+    through = changes.head_cursor(db_session, user.id)
+    assert changes.compact_change_log(db_session, timedelta(days=1), now=datetime.utcnow() + timedelta(days=2)) == 2
+
+    crud.upsert_weight_entry(db_session, user.id, entry.entry_date, {"weight": 69})
+    head = changes.head_cursor(db_session, user.id)
+    assert head > through
+    assert changes.list_changes(db_session, user.id, since=head).changes == []
+    feed = changes.list_changes(db_session, user.id, since=through)
+    assert [(change.entity, change.op) for change in feed.changes] == [("weight_entry", "update")]
+
+
+def test_create_schema_rebuilds_change_log_without_autoincrement(tmp_path) -> None:
+    from sqlalchemy import create_engine, text
+
+    from app import models
+    from app.database import Base, create_schema
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "CREATE TABLE change_log (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, entity VARCHAR NOT NULL, "
+                "entity_id INTEGER NOT NULL, op VARCHAR NOT NULL, changed_at DATETIME NOT NULL)"
+            )
+        )
+        conn.execute(text("CREATE INDEX ix_change_log_user_cursor ON change_log (user_id, id)"))
+        conn.execute(text("INSERT INTO change_log VALUES (1, 1, 'user', 1, 'insert', '2024-01-01')"))
+    Base.metadata.tables["change_log_checkpoint"].create(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO change_log_checkpoint VALUES (0, 5, '2024-01-02')"))
+
+    create_schema(Base.metadata, engine)
+    with engine.begin() as conn:
+        row = {"user_id": 1, "entity": "user", "entity_id": 1, "op": "update"}
+        conn.execute(models.ChangeLogEntry.__table__.insert(), row)
+        assert [row.id for row in conn.execute(text("SELECT id FROM change_log ORDER BY id"))] == [1, 6]
+    engine.dispose()
@@ -0,0 +1,38 @@
+import json
+import uuid
+
+from app.dataset import FeedbackDataset, compile_feedback
+
+
+def _append(path, *records, tail: bytes = b"") -> None:
+    with path.open("ab") as handle:
+        for record in records:
+            handle.write(json.dumps(record).encode() + b"\n")
+        handle.write(tail)
+
+
+def test_compile_appends_only_the_new_tail(tmp_path) -> None:
+    source, out = tmp_path / "feedback.jsonl", tmp_path / "dataset"
+    ids = [str(uuid.uuid4()) for _ in range(3)]
+    _append(
+        source,
+        {"log_id": ids[0], "confirmed_label": "miso soup", "portion_grams": 250},
+        {"log_id": "not-a-uuid", "confirmed_label": "x", "portion_grams": 1},
+        tail=b'{"log_id": "',
+    )
+    first = compile_feedback(source, out)
+    assert (first.added, first.skipped, first.rows) == (1, 1, 1)
+
+    with source.open("ab") as handle:
+        handle.write(ids[1].encode() + b'", "confirmed_label": "sushi roll", "portion_grams": 180.5}\n')
+    _append(source, {"log_id": ids[2], "confirmed_label": "miso soup", "portion_grams": 90})
+    second = compile_feedback(source, out)
+    assert (second.added, second.rows, second.watermark) == (2, 3, source.stat().st_size)
+    assert compile_feedback(source, out).added == 0
+
+    with FeedbackDataset(out) as dataset:
+        assert len(dataset) == 3 and dataset.vocab == ["miso soup", "sushi roll"]
+        assert list(dataset.labels) == [0, 1, 0]
+        assert list(dataset.portions) == [250.0, 180.5, 90.0]
+        assert [dataset.log_id(row) for row in range(3)] == ids
+        assert dataset.label(1) == "sushi roll"
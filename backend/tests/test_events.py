@@ -0,0 +1,41 @@
+import asyncio
+from datetime import date
+
+from app import crud
+from app.events import MacroTotalsHub, macro_totals_hub, stream_macro_totals
+
+
+def test_commit_publishes_macro_totals(db_session) -> None:
+    user = crud.create_user(db_session, "Ada", "ada@example.com", "UTC")
+    log = crud.upsert_daily_log(db_session, user, date(2024, 1, 1), "UTC")
+    meal = crud.create_meal(db_session, log, {"name": "Lunch"})
+
+    async def scenario():
+        stream = stream_macro_totals(user.id)
+        assert (await stream.__anext__()).startswith("retry:")
+        next_event = asyncio.ensure_future(stream.__anext__())
+        await asyncio.sleep(0)
+        await asyncio.to_thread(crud.create_food_item, db_session, meal, {"name": "Rice", "calories": 130})
+        event = await asyncio.wait_for(next_event, timeout=1)
+        await stream.aclose()
+        return event
+
+    event = asyncio.run(scenario())
+    assert event.startswith("event: macro_totals")
+    assert '"calories_total": 130' in event
+    assert not macro_totals_hub.has_subscribers(user.id)
+
+
+def test_slow_subscriber_is_dropped() -> None:
+    hub = MacroTotalsHub(queue_size=2)
+
+    async def scenario():
+        subscription = hub.subscribe(1)
+        for index in range(3):
+            hub.publish(1, {"index": index})
+        await asyncio.sleep(0)
+        return await subscription.queue.get()
+
+    assert asyncio.run(scenario()) is None
+    assert hub.dropped == 1
+    assert not hub.has_subscribers(1)
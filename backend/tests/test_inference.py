@@ -0,0 +1,111 @@
+import os
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from app import inference
+from app.inference import (
+    Candidate,
+    InferenceBackend,
+    InferenceExecutor,
+    InferenceOverloaded,
+    backend_spec,
+    benchmark,
+    create_backend,
+    register_backend,
+    run_on_device_inference,
+)
+
+
+class ConstantBackend(InferenceBackend):
+    name = "constant"
+    loads = 0
+
+    def load(self) -> None:
+        ConstantBackend.loads += 1
+
+    def predict(self, filename, payload):
+        return [Candidate("miso soup", 1.0)]
+
+
+class CrashingBackend(ConstantBackend):
+    name = "crashing"
+
+    def predict(self, filename, payload):
+        if filename == "crash.jpg":
+            os._exit(1)
+        return super().predict(filename, payload)
+
+
+def test_micro_batches_match_direct_inference_and_shed_load() -> None:
+    executor = InferenceExecutor(workers=2, max_batch=4, max_wait=0.2, queue_size=8)
+    try:
+        uploads = [(f"photo{index}.jpg", bytes([index]) * 100) for index in range(8)]
+        futures = [executor.submit(filename, payload) for filename, payload in uploads]
+        with pytest.raises(InferenceOverloaded):
+            executor.submit("extra.jpg", b"x")
+        results = [future.result(timeout=30) for future in futures]
+    finally:
+        executor.shutdown()
+
+    assert results == [run_on_device_inference(filename, payload) for filename, payload in uploads]
+    stats = executor.stats()
+    assert stats["requests"] == 8 and stats["rejected"] == 1
+    assert stats["batches"] < 8 and stats["mean_batch_size"] > 1
+    assert stats["in_flight"] == 0 and stats["latency_ms"]["p99"] > 0
+
+
+def test_backends_are_pluggable_and_benchmarked(monkeypatch) -> None:
+    # Keep registrations made by this test out of the module-wide registry.
+    monkeypatch.setattr(inference, "_backends", dict(inference._backends))
+    register_backend("constant")(ConstantBackend)
+
+    result = benchmark("constant", [("a.jpg", b"a"), ("b.jpg", b"b")], warmup_runs=2, repeat=3)
+    assert ConstantBackend.loads == 1 and result["count"] == 6 and sum(result["buckets"].values()) == 6
+    assert create_backend("app.inference:HashBackend").predict("a.jpg", memoryview(b"a")) == (
+        run_on_device_inference("a.jpg", memoryview(b"a"))
+    )
+    with pytest.raises(ValueError):
+        create_backend("missing")
+    with pytest.raises(TypeError):
+        type("Incomplete", (InferenceBackend,), {})()
+
+    # A name registered outside app.inference reaches spawned workers as an import path.
+    assert backend_spec("constant") == f"{__name__}:ConstantBackend"
+    executor = InferenceExecutor(workers=1, backend="constant", warmup_runs=0)
+    try:
+        assert executor.submit("plate.jpg", b"plate").result(timeout=30) == [Candidate("miso soup", 1.0)]
+    finally:
+        executor.shutdown()
+
+    @register_backend("local")
+    class LocalBackend(ConstantBackend):
+        pass
+
+    with pytest.raises(ValueError, match="cannot be imported"):
+        InferenceExecutor(workers=1, backend="local").start()
+
+    executor = InferenceExecutor(workers=1, warmup_runs=1)
+    try:
+        executor.start(wait=True)
+        executor.submit("plate.jpg", b"plate").result(timeout=30)
+    finally:
+        executor.shutdown()
+    stats = executor.stats()
+    assert stats["backend"] == "hash" and stats["model_latency"]["hash"]["count"] == 1
+
+
+def test_a_dead_worker_is_replaced_and_later_requests_succeed(monkeypatch) -> None:
+    monkeypatch.setattr(inference, "_backends", dict(inference._backends))
+    register_backend("crashing")(CrashingBackend)
+    executor = InferenceExecutor(workers=1, max_wait=0, queue_size=2, backend="crashing", warmup_runs=0)
+    try:
+        executor.start(wait=True)
+        # The batch is retried once on a new pool, whose worker dies as well.
+        with pytest.raises(BrokenProcessPool):
+            executor.submit("crash.jpg", b"plate").result(timeout=60)
+        for _ in range(3):
+            assert executor.submit("plate.jpg", b"plate").result(timeout=60) == [Candidate("miso soup", 1.0)]
+    finally:
+        executor.shutdown()
+    assert executor.stats()["in_flight"] == 0
@@ -0,0 +1,69 @@
+from fastapi.testclient import TestClient
+
+from app import inference_cache, main, storage
+from app.blobs import BlobStore
+from app.inference import Candidate
+from app.inference_cache import InferenceCache
+from app.storage import PhotoLogStore
+
+
+def test_lru_falls_back_to_disk_and_survives_restart(tmp_path) -> None:
+    path = tmp_path / "cache.sqlite3"
+    cache = InferenceCache(path, max_entries=1)
+    cache.put("a", [Candidate("miso soup", 0.72)], "log-a")
+    cache.put("b", [Candidate("sushi roll", 0.61)])
+    assert cache.get("a").log_id == "log-a"
+    assert cache.get("missing") is None
+    assert cache.stats() == {"hits": 1, "misses": 1, "hit_ratio": 0.5, "entries": 1, "evicted": 0}
+    cache.close()
+
+    reopened = InferenceCache(path)
+    assert reopened.get("b").candidates == [Candidate("sushi roll", 0.61)]
+    reopened.close()
+
+
+def test_reupload_reuses_pending_log(tmp_path, monkeypatch) -> None:
+    store = PhotoLogStore(tmp_path, fsync_policy="batch")
+    monkeypatch.setattr(storage, "photo_log_store", store)
+    monkeypatch.setattr(storage, "FEEDBACK_FILE", tmp_path / "feedback.jsonl")
+    monkeypatch.setattr(main, "photo_log_store", store)
+    monkeypatch.setattr(main, "inference_cache", InferenceCache(tmp_path / "cache.sqlite3"))
+    monkeypatch.setattr(main, "blob_store", BlobStore(tmp_path / "blobs"))
+    client = TestClient(main.app)
+
+    def upload(user_id=1) -> dict:
+        files = {"photo": ("plate.jpg", b"same bytes", "image/jpeg")}
+        data = {} if user_id is None else {"user_id": str(user_id)}
+        return client.post("/photo-log", files=files, data=data).json()
+
+    first = upload()
+    assert upload()["log_id"] == first["log_id"]
+    client.post("/photo-log/confirm", json={"log_id": first["log_id"], "confirmed_label": "x", "portion_grams": 100})
+    third = upload()
+    assert third["log_id"] != first["log_id"] and third["candidates"] == first["candidates"]
+
+    # Another user, or an anonymous upload, gets a log (and a blob reference) of its own.
+    other = upload(user_id=2)
+    assert other["log_id"] != third["log_id"] and other["candidates"] == first["candidates"]
+    assert upload(user_id=None)["log_id"] not in {third["log_id"], other["log_id"]}
+    client.delete("/users/1/photos")
+    assert client.get(f"/photo-log/{other['log_id']}/photo").content == b"same bytes"
+    assert client.get("/inference/metrics").json()["cache"]["hits"] == 4
+
+
+def test_disk_tier_evicts_stale_and_least_recently_used(tmp_path, monkeypatch) -> None:
+    path = tmp_path / "cache.sqlite3"
+    clock = [1000.0]
+    monkeypatch.setattr(inference_cache.time, "time", lambda: clock[0])
+    cache = InferenceCache(path, max_entries=1, max_disk_entries=2, max_age_seconds=60)
+    for digest in "abc":
+        cache.put(digest, [Candidate(digest, 0.5)])
+        clock[0] += 1
+    cache.get("a")
+    assert cache.evict() == 1
+    assert cache.get("b") is None and cache.get("a") is not None
+
+    clock[0] += 120
+    assert cache.get("c") is None
+    assert cache.evict() == 2 and cache.stats()["evicted"] == 3
+    cache.close()
@@ -0,0 +1,28 @@
+import os
+from pathlib import Path
+
+from app import main
+from app.inference import Candidate
+from app.nutrition import CandidateNutritionMap
+from backend.catalog.pipeline import run_import
+
+SOURCES = [Path("backend/catalog/data/source_usda.json"), Path("backend/catalog/data/source_brand.json")]
+
+
+def test_candidates_carry_catalog_nutrition_and_follow_catalog_updates(tmp_path, monkeypatch) -> None:
+    catalog = tmp_path / "catalog.json"
+    nutrition = CandidateNutritionMap(catalog)
+    assert nutrition.resolve("greek yogurt") is None
+
+    run_import(SOURCES[:1], catalog)
+    monkeypatch.setattr(main, "candidate_nutrition", nutrition)
+    yogurt, unknown = main._candidates_out([Candidate("greek yogurt", 0.72), Candidate("miso soup", 0.61)])
+    assert yogurt.food_name == "Greek Yogurt" and yogurt.nutrients_per_100g.protein_g is not None
+    assert yogurt.portions and yogurt.portions[0].gram_weight > 0
+    assert unknown.food_id is None and unknown.portions == []
+    assert nutrition.resolve("oat milk") is None
+
+    run_import(SOURCES, catalog)
+    os.utime(catalog, ns=(0, 10**18))
+    assert nutrition.resolve("Oat Milk").brand == "Oaty"
+    assert nutrition.builds == 3
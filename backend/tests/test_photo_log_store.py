@@ -0,0 +1,103 @@
+import json
+
+import pytest
+
+from app.storage import CursorExpiredError, PhotoLogStore, iter_jsonl_reverse
+
+
+def test_index_points_at_latest_record_and_survives_restart(tmp_path) -> None:
+    store = PhotoLogStore(tmp_path, fsync_policy="batch")
+    store.append({"log_id": "a", "status": "pending_confirmation", "filename": "a.jpg"})
+    store.append({"log_id": "b", "status": "pending_confirmation", "filename": "b.jpg"})
+    store.append({"log_id": "a", "status": "confirmed", "confirmed_label": "sushi roll"})
+
+    assert store.get("a")["confirmed_label"] == "sushi roll"
+    assert store.lookup("b").status == "pending_confirmation"
+    assert not store.exists("missing")
+    queued = store.submit({"log_id": "d", "status": "pending_confirmation"})
+    assert store.exists("d") and store.get("d")["status"] == "pending_confirmation"
+    assert queued.result().segment == store.segment_path(0).name
+
+    # Another writer appends behind the index's back; a miss catches up.
+    with store.segment_path(0).open("a", encoding="utf-8") as handle:
+        handle.write(json.dumps({"log_id": "c", "status": "pending_confirmation"}) + "\n")
+    reopened = PhotoLogStore(tmp_path, fsync_policy="batch")
+    assert reopened.lookup("a").status == "confirmed"
+    assert reopened.get("c")["status"] == "pending_confirmation"
+
+    store.index_path.unlink()
+    rebuilt = PhotoLogStore(tmp_path, fsync_policy="batch")
+    assert {log_id: rebuilt.lookup(log_id).offset for log_id in "abcd"} == {
+        log_id: reopened.lookup(log_id).offset for log_id in "abcd"
+    }
+    assert store.index_path.exists()
+
+
+def test_reverse_reader_pages_from_the_tail(tmp_path) -> None:
+    store = PhotoLogStore(tmp_path, fsync_policy="batch")
+    for index in range(20):
+        store.append({"log_id": str(index), "status": "pending_confirmation", "note": "x" * index})
+    log_path = store.segment_path(0)
+    with log_path.open("a", encoding="utf-8") as handle:
+        handle.write('{"log_id": "torn"')
+
+    newest = list(iter_jsonl_reverse(log_path, block_size=7))
+    assert [record["log_id"] for _, record in newest] == [str(index) for index in reversed(range(20))]
+    assert [offset for offset, _ in newest] == [store.lookup(str(index)).offset for index in reversed(range(20))]
+
+    cursor = newest[4][0]
+    page = list(iter_jsonl_reverse(log_path, before=cursor, block_size=7))
+    assert [record["log_id"] for _, record in page] == [str(index) for index in reversed(range(15))]
+
+
+def test_compaction_merges_sealed_segments(tmp_path) -> None:
+    store = PhotoLogStore(tmp_path, max_segment_bytes=200, fsync_policy="batch")
+    for index in range(10):
+        store.append({"log_id": str(index), "status": "pending_confirmation", "candidates": ["a", "b"]})
+        store.append({"log_id": str(index), "status": "confirmed", "confirmed_label": "miso soup"})
+    assert len(store.segments()) > 2
+    cursors = [cursor for cursor, _ in store.iter_recent()]
+    assert len(cursors) == 20 and cursors == sorted(cursors, reverse=True)
+
+    report = store.compact()
+    assert report.records_after < report.records_before and report.reclaimed_bytes > 0
+    assert len(store.segments()) == 2
+    assert store.compact() is None
+
+    for index in range(9):
+        record = store.get(str(index))
+        assert record["status"] == "confirmed" and record["candidates"] == ["a", "b"]
+    assert PhotoLogStore(tmp_path, fsync_policy="batch").get("0") == store.get("0")
+    assert sorted(record["log_id"] for _, record in store.iter_recent()) == sorted(
+        [str(index) for index in range(9)] + ["9", "9"]
+    )
+
+
+def test_adopts_unsegmented_log(tmp_path) -> None:
+    (tmp_path / "photo_logs.jsonl").write_text(json.dumps({"log_id": "old", "status": "confirmed"}) + "\n")
+    store = PhotoLogStore(tmp_path, fsync_policy="batch")
+    assert store.exists("old")
+    assert store.segments() == [0]
+
+
+def test_cursors_from_before_a_compaction_expire(tmp_path) -> None:
+    store = PhotoLogStore(tmp_path, max_segment_bytes=200, fsync_policy="batch")
+    for index in range(10):
+        store.append({"log_id": str(index), "status": "pending_confirmation", "candidates": ["a", "b"]})
+        store.append({"log_id": str(index), "status": "confirmed", "confirmed_label": "miso soup"})
+    page = list(store.iter_recent())
+    newest, oldest = page[0][0], page[-1][0]
+
+    store.compact()
+    # The active segment was not rewritten, so a cursor into it still pages on.
+    assert list(store.iter_recent(newest)) == list(store.iter_recent())[1:]
+    with pytest.raises(CursorExpiredError):
+        store.iter_recent(oldest)
+
+    # The watermark survives a restart.
+    reopened = PhotoLogStore(tmp_path, max_segment_bytes=200, fsync_policy="batch")
+    with pytest.raises(CursorExpiredError):
+        reopened.iter_recent(oldest)
+    assert reopened.compact() is None
+    fresh = [cursor for cursor, _ in reopened.iter_recent()][-1]
+    assert list(reopened.iter_recent(fresh)) == []
@@ -1,9 +1,16 @@
+import json
+import re
 from pathlib import Path
 
 import pytest
 
-from backend.catalog.pipeline import ingest_sources, run_import
-from backend.catalog.validation import ValidationError
+from backend.catalog import pipeline
+from backend.catalog.binary import BinaryCatalog
+from backend.catalog.delta import CatalogDelta, delta_path_for
+from backend.catalog.manifest import file_hash
+from backend.catalog.pipeline import import_catalog, ingest_sources, load_existing_catalog, run_import, write_catalog
+from backend.catalog.schema import FoodItem, NutrientProfile, Portion, VersionInfo
+from backend.catalog.validation import ValidationError, validate_catalog
 
 
 def test_ingest_dedup_and_versioning(tmp_path: Path) -> None:
@@ -69,3 +76,234 @@ def test_validation_missing_macros(tmp_path: Path) -> None:
         ingest_sources([broken_source], output_path)
 
     assert any("Missing macro nutrient" in issue.message for issue in excinfo.value.issues)
+
+
+def test_parallel_import_matches_serial(tmp_path: Path, monkeypatch) -> None:
+    # One item per message, so each worker's stream interleaves with the others'.
+    monkeypatch.setattr(pipeline, "MERGE_BATCH_ITEMS", 1)
+    brand = json.loads(Path("backend/catalog/data/source_brand.json").read_text())
+    repeats = tmp_path / "repeats.json"
+    repeats.write_text(
+        json.dumps(
+            {
+                "source": dict(brand["source"], name="Repeats"),
+                "items": [
+                    dict(item, confidence=confidence, portions=[dict(item["portions"][0], amount=amount)])
+                    for item in brand["items"]
+                    for confidence, amount in ((0.9, 10), (0.5, 20), (0.9, 30))
+                ],
+            }
+        )
+    )
+    sources = [
+        Path("backend/catalog/data/source_usda.json"),
+        Path("backend/catalog/data/source_brand.json"),
+        repeats,
+    ]
+    serial_path, parallel_path = tmp_path / "serial.json", tmp_path / "parallel.json"
+    write_catalog(ingest_sources(sources, serial_path), serial_path)
+    write_catalog(ingest_sources(sources, parallel_path, workers=3), parallel_path)
+
+    def without_timestamps(path: Path) -> str:
+        return re.sub(r'"updated_at": "[^"]*"', "", path.read_text())
+
+    assert without_timestamps(serial_path) == without_timestamps(parallel_path)
+
+
+def test_incremental_import_only_remerges_changed_sources(tmp_path: Path) -> None:
+    usda, brand, extra = tmp_path / "usda.json", tmp_path / "brand.json", tmp_path / "extra.json"
+    usda.write_text(Path("backend/catalog/data/source_usda.json").read_text())
+    brand_payload = json.loads(Path("backend/catalog/data/source_brand.json").read_text())
+    brand.write_text(json.dumps(brand_payload))
+    extra_payload = {"source": dict(brand_payload["source"], name="Extra"), "items": brand_payload["items"][1:]}
+    extra_payload["items"][0] = dict(extra_payload["items"][0], name="Rice Milk")
+    extra.write_text(json.dumps(extra_payload))
+    sources, output_path = [usda, brand, extra], tmp_path / "catalog.json"
+
+    first = import_catalog(sources, output_path)
+    assert first.full and first.count == 4
+    again = import_catalog(sources, output_path)
+    assert (again.full, again.sources_read, again.reused) == (False, 0, 4)
+
+    before = tmp_path / "before.json"
+    before.write_text(output_path.read_text())
+    brand_payload["items"][0]["confidence"] = 0.99
+    brand_payload["items"][0]["nutrients_per_100g"]["calories_kcal"] = 95
+    brand.write_text(json.dumps(brand_payload))
+    changed = import_catalog(sources, output_path)
+    # Banana also comes from USDA, so that source is re-read; the extra source is not.
+    assert (changed.full, changed.sources_read, changed.remerged, changed.reused) == (False, 2, 2, 2)
+
+    expected = tmp_path / "expected.json"
+    write_catalog(ingest_sources(sources, before), expected)
+    strip = re.compile(r'"updated_at": "[^"]*"')
+    assert strip.sub("", output_path.read_text()) == strip.sub("", expected.read_text())
+    banana = [item for item in ingest_sources(sources, output_path) if item.name == "Banana"][0]
+    assert banana.version.revision == 2
+
+
+def test_validation_engine_streams_nutrient_rule_issues(tmp_path: Path) -> None:
+    def item(item_id: str, kcal, protein, fat, carbs, grams: float = 100.0) -> FoodItem:
+        return FoodItem(
+            id=item_id,
+            name=item_id,
+            brand=None,
+            locale="en-US",
+            confidence=0.8,
+            sources=[],
+            portions=[Portion("serving", 1, "g", grams)],
+            nutrients_per_100g=NutrientProfile(kcal, protein, fat, carbs),
+            version=VersionInfo(1, "0" * 64),
+        )
+
+    items = [
+        item("ok", 89, 1.1, 0.3, 22.8),
+        item("energy", 500, 1, 1, 1),
+        item("macros", 630, 60, 30, 30),
+        item("portion", 89, 1.1, 0.3, 22.8, grams=0),
+    ]
+    report = tmp_path / "issues.jsonl"
+    # The rules added with the engine only warn, so these still import.
+    summary = validate_catalog(items, report)
+    assert (summary.errors, summary.warnings) == (0, 3)
+    lines = [json.loads(line) for line in report.read_text().splitlines()]
+    assert {(line["rule"], line["item_id"], line["severity"]) for line in lines} == {
+        ("energy_mismatch", "energy", "warning"),
+        ("macro_sum", "macros", "warning"),
+        ("portion_weight", "portion", "warning"),
+    }
+
+    with pytest.raises(ValidationError) as excinfo:
+        validate_catalog([*items, item("calories", None, 1.1, 0.3, 22.8)])
+    assert [(issue.item_id, issue.severity) for issue in excinfo.value.issues] == [
+        ("calories", "error"),
+        ("energy", "warning"),
+        ("macros", "warning"),
+        ("portion", "warning"),
+    ]
+
+
+def test_dedup_reports_and_merges_near_duplicates(tmp_path: Path) -> None:
+    def food(name: str, kcal: float, protein: float, fat: float, carbs: float, confidence: float) -> dict:
+        nutrients = {"calories_kcal": kcal, "protein_g": protein, "fat_g": fat, "carbs_g": carbs}
+        portions = [{"description": "100g", "amount": 100, "unit": "g"}]
+        return {"name": name, "confidence": confidence, "portions": portions, "nutrients_per_100g": nutrients}
+
+    source = tmp_path / "source.json"
+    items = [
+        food("Banana, raw", 89, 1.1, 0.3, 22.8, 0.92),
+        food("Banana", 90, 1.1, 0.3, 23.0, 0.8),
+        food("Banana Chips", 519, 2.3, 33.6, 58.4, 0.9),
+        food("Greek Yogurt", 59, 10.2, 0.4, 3.6, 0.9),
+        food("Greek Yogurt Plain", 61, 10.0, 0.4, 3.8, 0.85),
+    ]
+    header = {"name": "Mixed", "dataset": "Test", "version": "1", "url": None}
+    source.write_text(json.dumps({"source": header, "items": items}))
+    output_path = tmp_path / "catalog.json"
+
+    reported = import_catalog([source], output_path, dedup="report")
+    assert (reported.count, reported.duplicates) == (5, 2)
+    clusters = json.loads((tmp_path / "catalog.duplicates.json").read_text())["clusters"]
+    names = [[item["name"] for item in cluster["items"]] for cluster in clusters]
+    assert names == [["Banana, raw", "Banana"], ["Greek Yogurt", "Greek Yogurt Plain"]]
+    assert [cluster["mergeable"] for cluster in clusters] == [True, False]
+
+    merged = import_catalog([source], output_path, dedup="merge", incremental=False)
+    assert merged.count == 4
+    catalog = json.loads(output_path.read_text())["items"]
+    assert "Banana" not in [item["name"] for item in catalog]
+    banana = [item for item in catalog if item["name"] == "Banana, raw"][0]
+    assert banana["confidence"] == 0.92
+    assert not import_catalog([source], output_path, dedup="merge").full
+
+    # Dropping the merge rebuilds the catalog instead of reusing the merged one.
+    restored = import_catalog([source], output_path)
+    assert restored.full and restored.count == 5
+    assert "Banana" in [item["name"] for item in json.loads(output_path.read_text())["items"]]
+    assert not import_catalog([source], output_path, dedup="report").full
+
+
+def test_import_writes_delta_against_previous_catalog(tmp_path: Path, monkeypatch) -> None:
+    source = tmp_path / "source.json"
+    payload = json.loads(Path("backend/catalog/data/source_brand.json").read_text())
+    source.write_text(json.dumps(payload))
+    output_path = tmp_path / "catalog.bin"
+
+    first = import_catalog([source], output_path, fmt="binary")
+    assert first.delta.base_sha256 is None
+    assert sorted(item.name for item in first.delta.added) == ["Banana", "Oat Milk"]
+
+    oat_milk_id = [item.id for item in first.delta.added if item.name == "Oat Milk"][0]
+    payload["items"][0]["nutrients_per_100g"]["calories_kcal"] = 95
+    payload["items"][1] = dict(payload["items"][1], name="Rice Milk")
+    source.write_text(json.dumps(payload))
+    published, closed = [], []
+    publish_catalog, close = pipeline.publish_catalog, BinaryCatalog.close
+
+    def publish(staged: Path, path: Path) -> None:
+        # The new delta is on disk, next to the catalog it applies to, before that catalog is replaced.
+        published.append((CatalogDelta.load(delta_path_for(path)), file_hash(staged), file_hash(path)))
+        publish_catalog(staged, path)
+
+    monkeypatch.setattr(pipeline, "publish_catalog", publish)
+    monkeypatch.setattr(BinaryCatalog, "close", lambda catalog: closed.append(catalog.path) or close(catalog))
+    second = import_catalog([source], output_path, fmt="binary")
+    [(on_disk, staged_sha256, served_sha256)] = published
+    assert (on_disk.base_sha256, on_disk.catalog_sha256) == (served_sha256, staged_sha256)
+    assert closed == [output_path]
+
+    delta = CatalogDelta.load(delta_path_for(output_path))
+    assert delta.base_sha256 == first.delta.catalog_sha256
+    assert [item.name for item in delta.added] == ["Rice Milk"]
+    assert [(item.name, item.version.revision) for item in delta.revised] == [("Banana", 2)]
+    assert delta.removed == [oat_milk_id]
+    assert len(delta) == len(second.delta) == 3
+
+
+def test_locale_sharded_catalog_loads_only_requested_locales(tmp_path: Path) -> None:
+    source = tmp_path / "source.json"
+    payload = json.loads(Path("backend/catalog/data/source_usda.json").read_text())
+    banana = payload["items"][0]
+    payload["items"] = [banana, dict(banana, locale="de-DE", name="Banane"), dict(banana, locale="fr-FR")]
+    source.write_text(json.dumps(payload))
+    output_path = tmp_path / "catalog.bin"
+
+    result = import_catalog([source], output_path, fmt="binary", shard_by_locale=True)
+    assert result.count == 3
+    directory = json.loads(output_path.read_text())
+    assert [(entry["locale"], entry["path"]) for entry in directory["shards"]] == [
+        ("de-DE", "catalog.de-de.bin"),
+        ("en-US", "catalog.en-us.bin"),
+        ("fr-FR", "catalog.fr-fr.bin"),
+    ]
+
+    german = load_existing_catalog(output_path, locales=["DE-de"])
+    assert list(german) == ["banane::::de-de"]
+    assert german["banane::::de-de"].name == "Banane"
+    assert "banana::::en-us" not in german
+    assert len(load_existing_catalog(output_path)) == 3
+
+    again = import_catalog([source], output_path, fmt="binary", shard_by_locale=True)
+    assert (again.full, again.reused, len(again.delta)) == (False, 3, 0)
+
+
+def test_locale_shards_reject_colliding_slugs_and_drop_stale_files(tmp_path: Path) -> None:
+    source = tmp_path / "source.json"
+    payload = json.loads(Path("backend/catalog/data/source_usda.json").read_text())
+    banana = payload["items"][0]
+    payload["items"] = [banana, dict(banana, locale="fr-FR")]
+    source.write_text(json.dumps(payload))
+    output_path = tmp_path / "catalog.json"
+    import_catalog([source], output_path, shard_by_locale=True)
+    assert (tmp_path / "catalog.fr-fr.json").exists()
+
+    payload["items"] = [banana]
+    source.write_text(json.dumps(payload))
+    import_catalog([source], output_path, shard_by_locale=True)
+    assert not (tmp_path / "catalog.fr-fr.json").exists()
+    assert (tmp_path / "catalog.en-us.json").exists()
+
+    payload["items"] = [dict(banana, locale="en.US"), dict(banana, locale="en_US")]
+    source.write_text(json.dumps(payload))
+    with pytest.raises(ValueError, match="share shard"):
+        import_catalog([source], output_path, shard_by_locale=True)
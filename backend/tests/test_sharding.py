@@ -0,0 +1,86 @@
+from datetime import date
+
+from app import changes, crud, models, sharding
+from app.database import Base
+
+
+def _open(router: sharding.ShardRouter, user_id=None):
+    db = router.sessionmaker()()
+    db.info[sharding.SHARD_HINT] = None if user_id is None else router.shard_for_id(user_id)
+    return db
+
+
+def test_user_rows_share_a_bucket_and_move_together(tmp_path) -> None:
+    router = sharding.ShardRouter.open(tmp_path, 4)
+    router.create_all(Base.metadata)
+    db = _open(router)
+    users = {}
+    for i in range(6):
+        user = crud.create_user(db, f"User {i}", f"user{i}@example.com", "UTC")
+        users[user.id] = user.email
+    db.close()
+
+    for user_id, email in users.items():
+        assert sharding.bucket_of(user_id) == sharding.bucket_for_email(email)
+        db = _open(router, user_id)
+        log = crud.upsert_daily_log(db, crud.get_user(db, user_id), date(2024, 1, 1), "UTC")
+        meal = crud.create_meal(db, log, {"name": "Lunch"})
+        item = crud.create_food_item(db, meal, {"name": "Rice", "calories": 130})
+        assert {sharding.bucket_of(row_id) for row_id in (log.id, meal.id, item.id)} == {sharding.bucket_of(user_id)}
+        assert len(changes.list_changes(db, user_id).changes) == 5
+        db.close()
+
+    moved = sharding.rebalance(router, Base.metadata, 2)
+    assert moved and sharding.ShardMap.load(tmp_path / sharding.SHARD_MAP_FILE, 4).shards == 2
+
+    reopened = sharding.ShardRouter.open(tmp_path, 4)
+    for user_id, email in users.items():
+        db = _open(reopened, user_id)
+        assert crud.get_user(db, user_id).email == email
+        assert crud.get_daily_log(db, user_id, date(2024, 1, 1)).macro_totals.calories_total == 130
+        assert changes.list_changes(db, user_id).cursor > sharding.id_range(sharding.bucket_of(user_id)).start
+        db.close()
+    counts = []
+    for engine in reopened.engines.values():
+        with engine.connect() as conn:
+            counts.append(conn.execute(models.User.__table__.select()).fetchall())
+    assert sum(len(rows) for rows in counts) == len(users)
+    router.dispose()
+    reopened.dispose()
+
+
+def test_bucket_ids_are_not_reused_after_deletes_or_compaction(tmp_path) -> None:
+    from datetime import datetime, timedelta
+
+    router = sharding.ShardRouter.open(tmp_path, 2)
+    router.create_all(Base.metadata)
+    db = _open(router)
+    user = crud.create_user(db, "Ada", "ada@example.com", "UTC")
+    db.close()
+
+    db = _open(router, user.id)
+    log = crud.upsert_daily_log(db, crud.get_user(db, user.id), date(2024, 1, 1), "UTC")
+    meal = crud.create_meal(db, log, {"name": "Lunch"})
+    first = crud.create_food_item(db, meal, {"name": "Rice", "calories": 130})
+    first_id = first.id
+    crud.delete_food_item(db, first)
+    second = crud.create_food_item(db, meal, {"name": "Egg", "calories": 70})
+    meal_id, second_id = meal.id, second.id
+    assert second_id > first_id
+
+    head = changes.head_cursor(db, user.id)
+    assert changes.compact_change_log(db, timedelta(days=1), now=datetime.utcnow() + timedelta(days=2))
+    crud.update_food_item(db, second, {"calories": 75})
+    assert changes.head_cursor(db, user.id) > head
+    feed = changes.list_changes(db, user.id, since=head)
+    assert ("food_item", "update") in {(change.entity, change.op) for change in feed.changes}
+    db.close()
+
+    # The high-water mark moves with its bucket.
+    sharding.rebalance(router, Base.metadata, 3, buckets=[sharding.bucket_of(user.id)])
+    db = _open(router, user.id)
+    crud.delete_food_item(db, crud.get_food_item(db, second_id))
+    third = crud.create_food_item(db, crud.get_meal(db, meal_id), {"name": "Tea", "calories": 2})
+    assert third.id > second_id
+    db.close()
+    router.dispose()
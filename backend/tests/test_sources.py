@@ -0,0 +1,64 @@
+import json
+import tracemalloc
+from pathlib import Path
+
+import pytest
+
+from backend.catalog.sources import SourceLoadError, _JsonReader, open_source
+
+SOURCE = {"name": "Bulk", "dataset": "Test", "version": "1", "url": None}
+
+
+def _item(index: int) -> dict:
+    return {
+        "name": f"Food {index}",
+        "portions": [{"description": "100g", "amount": 100, "unit": "g"}],
+        "nutrients_per_100g": {"calories_kcal": index % 900, "protein_g": 1, "fat_g": 1, "carbs_g": 1},
+    }
+
+
+def test_json_and_ndjson_sources_stream_the_same_items(tmp_path: Path) -> None:
+    items = [_item(index) for index in range(50)]
+    items_first = tmp_path / "items_first.json"
+    items_first.write_text(json.dumps({"items": items, "meta": [1, 2.5e3], "source": SOURCE}))
+    ndjson = tmp_path / "bulk.ndjson"
+    ndjson.write_text("\n".join(json.dumps(row) for row in [{"source": SOURCE}, *items]) + "\n")
+
+    for path in (items_first, ndjson):
+        stream = open_source(path)
+        assert stream.source == SOURCE
+        assert list(stream.items()) == items
+
+    with items_first.open() as handle:
+        reader = _JsonReader(handle, items_first, chunk_chars=7)
+        keys = []
+        for key in reader.members():
+            keys.append(key)
+            value = reader.value()
+        assert keys == ["items", "meta", "source"] and value == SOURCE
+
+
+def test_header_is_checked_before_items_are_read(tmp_path: Path) -> None:
+    missing = tmp_path / "missing.ndjson"
+    missing.write_text(json.dumps({"source": {"name": "x"}}) + "\n" + json.dumps(_item(0)) + "\n")
+    with pytest.raises(SourceLoadError, match="dataset, version"):
+        open_source(missing)
+    no_items = tmp_path / "no_items.json"
+    no_items.write_text(json.dumps({"source": SOURCE}))
+    with pytest.raises(SourceLoadError, match="missing items"):
+        open_source(no_items)
+
+
+def test_streaming_memory_is_independent_of_source_size(tmp_path: Path) -> None:
+    path = tmp_path / "large.json"
+    with path.open("w") as handle:
+        handle.write('{"source": ' + json.dumps(SOURCE) + ', "items": [')
+        handle.write(",".join(json.dumps(_item(index)) for index in range(40_000)))
+        handle.write("]}")
+
+    tracemalloc.start()
+    count = sum(1 for _ in open_source(path).items())
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert count == 40_000
+    assert peak < path.stat().st_size // 10
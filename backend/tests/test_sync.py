@@ -0,0 +1,148 @@
+from datetime import date, datetime
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import crud, main
+
+
+@pytest.fixture
+def client(db_session):
+    main.api_app.dependency_overrides[main.get_db] = lambda: db_session
+    try:
+        yield TestClient(main.api_app)
+    finally:
+        main.api_app.dependency_overrides.clear()
+
+
+def test_sync_batch_is_idempotent_and_last_writer_wins(client, db_session) -> None:
+    user = crud.create_user(db_session, "Ada", "ada@example.com", "UTC")
+    log = crud.upsert_daily_log(db_session, user, date(2024, 1, 1), "UTC")
+    meal = crud.create_meal(db_session, log, {"name": "Lunch"})
+    batch = {
+        "mutations": [
+            {
+                "idempotency_key": "w-2",
+                "client_timestamp": "2024-01-01T09:00:00Z",
+                "op": "upsert_weight_entry",
+                "payload": {"entry_date": "2024-01-01", "weight": 70.5},
+            },
+            {
+                "idempotency_key": "w-1",
+                "client_timestamp": "2024-01-01T08:00:00Z",
+                "op": "upsert_weight_entry",
+                "payload": {"entry_date": "2024-01-01", "weight": 71.0},
+            },
+            {
+                "idempotency_key": "f-1",
+                "client_timestamp": "2024-01-01T12:00:00Z",
+                "op": "create_food_item",
+                "payload": {"meal_id": meal.id, "name": "Rice", "calories": 130, "quantity": 2},
+            },
+            {
+                "idempotency_key": "f-2",
+                "client_timestamp": "2024-01-01T12:01:00Z",
+                "op": "create_food_item",
+                "payload": {"meal_id": meal.id, "name": "Egg", "calories": 70},
+            },
+        ]
+    }
+
+    response = client.post(f"/users/{user.id}/sync", json=batch).json()
+    assert [result["status"] for result in response["results"]] == ["applied"] * 4
+    assert response["macro_totals"][0]["calories_total"] == 330
+    assert crud.list_weight_entries(db_session, user.id)[0].weight == 70.5
+
+    replay = client.post(f"/users/{user.id}/sync", json=batch).json()
+    assert {result["status"] for result in replay["results"]} == {"duplicate"}
+    assert len(crud.list_food_items(db_session, meal.id)) == 2
+
+    stale = client.post(
+        f"/users/{user.id}/sync",
+        json={
+            "mutations": [
+                {
+                    "idempotency_key": "w-0",
+                    "client_timestamp": "2024-01-01T07:00:00Z",
+                    "op": "upsert_weight_entry",
+                    "payload": {"entry_date": "2024-01-01", "weight": 72.0},
+                }
+            ]
+        },
+    ).json()
+    assert stale["results"][0]["status"] == "stale"
+
+
+def test_sync_clamps_device_clocks_running_ahead(client, db_session) -> None:
+    user = crud.create_user(db_session, "Ada", "ada@example.com", "UTC")
+
+    def upsert(key: str, client_timestamp: str, weight: float) -> str:
+        mutation = {
+            "idempotency_key": key,
+            "client_timestamp": client_timestamp,
+            "op": "upsert_weight_entry",
+            "payload": {"entry_date": "2024-01-01", "weight": weight},
+        }
+        response = client.post(f"/users/{user.id}/sync", json={"mutations": [mutation]}).json()
+        return response["results"][0]["status"]
+
+    assert upsert("w-future", "2099-01-01T00:00:00Z", 80.0) == "applied"
+    assert crud.list_weight_entries(db_session, user.id)[0].updated_at < datetime(2099, 1, 1)
+    assert upsert("w-now", datetime.utcnow().isoformat(), 70.0) == "applied"
+    assert crud.list_weight_entries(db_session, user.id)[0].weight == 70.0
+
+
+def test_sync_rejects_only_the_mutation_that_fails(client, db_session, monkeypatch) -> None:
+    from sqlalchemy.exc import IntegrityError
+
+    from app import sync
+
+    user = crud.create_user(db_session, "Ada", "ada@example.com", "UTC")
+
+    def broken(batch, data, client_timestamp):
+        raise IntegrityError("INSERT ...", {}, Exception("UNIQUE constraint failed"))
+
+    monkeypatch.setitem(sync.HANDLERS, "delete_weight_entry", broken)
+    mutations = [
+        {
+            "idempotency_key": "w-1",
+            "client_timestamp": "2024-01-01T08:00:00Z",
+            "op": "upsert_weight_entry",
+            "payload": {"entry_date": "2024-01-01", "weight": 71.0},
+        },
+        {
+            "idempotency_key": "w-2",
+            "client_timestamp": "2024-01-01T09:00:00Z",
+            "op": "delete_weight_entry",
+            "payload": {"entry_date": "2024-01-01"},
+        },
+    ]
+    response = client.post(f"/users/{user.id}/sync", json={"mutations": mutations})
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [result["status"] for result in results] == ["applied", "rejected"]
+    assert "UNIQUE constraint failed" in results[1]["detail"]
+    assert crud.list_weight_entries(db_session, user.id)[0].weight == 71.0
+
+
+def test_create_schema_adds_columns_missing_from_older_databases(tmp_path) -> None:
+    from sqlalchemy import create_engine, inspect, text
+
+    from app.database import Base, create_schema
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "CREATE TABLE weight_entries (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, "
+                "entry_date DATE NOT NULL, weight FLOAT NOT NULL, note VARCHAR, created_at DATETIME NOT NULL)"
+            )
+        )
+        conn.execute(text("INSERT INTO weight_entries VALUES (1, 1, '2024-01-01', 70.0, NULL, '2024-01-01')"))
+    create_schema(Base.metadata, engine)
+    create_schema(Base.metadata, engine)
+
+    assert "updated_at" in {column["name"] for column in inspect(engine).get_columns("weight_entries")}
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT updated_at FROM weight_entries")).scalar().startswith("1970-01-01")
+    engine.dispose()
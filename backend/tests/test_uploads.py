@@ -0,0 +1,79 @@
+import asyncio
+import hashlib
+import io
+import tracemalloc
+
+import pytest
+from fastapi import UploadFile
+from fastapi.testclient import TestClient
+
+from app import main
+from app.inference import InferenceExecutor, PayloadFile, run_batch, run_on_device_inference
+from app.uploads import MAX_UPLOAD_BYTES, UploadLimitMiddleware, UploadTooLarge, read_upload
+
+
+def test_large_upload_is_spooled_and_hashed_in_bounded_memory() -> None:
+    body = bytes(range(256)) * 12_000  # ~3 MB
+    tracemalloc.start()
+    upload = asyncio.run(read_upload(UploadFile(io.BytesIO(body), filename="plate.jpg"), spool_bytes=256 * 1024))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    with upload:
+        assert upload.spooled and upload.size == len(body)
+        assert upload.digest == hashlib.sha256(body).hexdigest()
+        assert upload.peak_memory <= 256 * 1024 + 64 * 1024
+        assert peak < len(body) // 2
+        payload = upload.payload()
+        assert isinstance(payload, PayloadFile)
+        assert run_batch([("plate.jpg", payload)]) == run_batch([("plate.jpg", body)])
+
+
+
+def test_a_vanished_spool_file_fails_only_its_own_upload(tmp_path) -> None:
+    # A cancelled request removes its spool file while the upload may still be queued.
+    executor = InferenceExecutor(workers=1, max_batch=2, max_wait=5, warmup_runs=0)
+    try:
+        gone = executor.submit("gone.jpg", PayloadFile(str(tmp_path / "gone.upload"), 10))
+        kept = executor.submit("plate.jpg", b"plate")
+        assert kept.result(timeout=60) == run_on_device_inference("plate.jpg", memoryview(b"plate"))
+        with pytest.raises(FileNotFoundError):
+            gone.result(timeout=60)
+    finally:
+        executor.shutdown()
+    assert executor.stats()["batches"] == 1
+
+def test_oversized_upload_is_rejected() -> None:
+    with pytest.raises(UploadTooLarge):
+        asyncio.run(read_upload(UploadFile(io.BytesIO(b"x" * 1000), filename="big.jpg"), max_bytes=999))
+
+    client = TestClient(main.app)
+    response = client.post("/photo-log", files={"photo": ("big.jpg", b"x" * (MAX_UPLOAD_BYTES + 1), "image/jpeg")})
+    assert response.status_code == 413
+
+
+def test_chunked_upload_is_cut_off_at_the_limit() -> None:
+    limit = 64 * 1024
+    app = UploadLimitMiddleware(main.app, paths=("/photo-log",), max_bytes=limit)
+    body = b"--b\r\nContent-Disposition: form-data; name=\"photo\"; filename=\"big.jpg\"\r\n\r\n" + b"x" * 10 * limit
+    chunks = [body[start : start + 4096] for start in range(0, len(body), 4096)]
+    total = len(chunks)
+    sent = []
+
+    async def receive():
+        chunk = chunks.pop(0)
+        return {"type": "http.request", "body": chunk, "more_body": bool(chunks)}
+
+    async def send(message) -> None:
+        sent.append(message)
+
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": "/photo-log",
+        "headers": [(b"content-type", b"multipart/form-data; boundary=b"), (b"transfer-encoding", b"chunked")],
+        "query_string": b"",
+    }
+    asyncio.run(app(scope, receive, send))
+    assert sent[0]["status"] == 413
+    # Reading stopped at the chunk that crossed the limit instead of draining the whole body.
+    assert (total - len(chunks)) * 4096 <= limit + 4096
@@ -0,0 +1,43 @@
+from datetime import date
+
+from app import crud, main, schemas
+from app.cache import user_cache
+
+
+def test_cached_user_skips_lookup(db_session, assert_statements) -> None:
+    user = crud.create_user(db_session, "Ada", "ada@example.com", "UTC")
+    engine = db_session.get_bind()
+
+    with assert_statements(engine, 1):
+        main.get_user_or_404(user.id, db=db_session, cache=user_cache)
+    db_session.expunge_all()
+    with assert_statements(engine, 0):
+        cached = main.get_user_or_404(user.id, db=db_session, cache=user_cache)
+    assert cached.email == "ada@example.com"
+
+
+def test_create_daily_log_statement_count(db_session, assert_statements) -> None:
+    user = crud.create_user(db_session, "Ada", "ada@example.com", "Europe/Paris")
+    engine = db_session.get_bind()
+    db_session.expunge_all()
+    payload = schemas.DailyLogCreate(log_date=date(2024, 1, 1), timezone="Europe/Paris")
+
+    # Cold cache: one joined user/log lookup, log and totals inserts, one
+    # batched change-feed insert and the refresh.
+    with assert_statements(engine, 5):
+        log = main.create_daily_log(user.id, payload, db=db_session, cache=user_cache)
+    assert log.macro_totals is not None
+
+    db_session.expunge_all()
+    with assert_statements(engine, 1):
+        main.upsert_daily_log(user.id, date(2024, 1, 1), payload, db=db_session, cache=user_cache)
+
+
+def test_update_user_invalidates_cache(db_session) -> None:
+    user = crud.create_user(db_session, "Ada", "ada@example.com", "UTC")
+    main.get_user_or_404(user.id, db=db_session, cache=user_cache)
+
+    crud.update_user(db_session, user, {"timezone": "Asia/Tokyo"})
+    db_session.expunge_all()
+    refreshed = main.get_user_or_404(user.id, db=db_session, cache=user_cache)
+    assert refreshed.timezone == "Asia/Tokyo"
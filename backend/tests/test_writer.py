@@ -0,0 +1,50 @@
+import asyncio
+import json
+import threading
+
+import pytest
+
+from app.writer import GroupCommitWriter, JsonlFile
+
+
+@pytest.mark.parametrize("policy", ["none", "interval", "batch"])
+def test_concurrent_submits_are_batched_and_flushed_on_close(tmp_path, policy) -> None:
+    path = tmp_path / "feedback.jsonl"
+    writer = GroupCommitWriter(JsonlFile(path), fsync_policy=policy, fsync_interval=0.01)
+    futures = []
+    lock = threading.Lock()
+
+    def submit(worker: int) -> None:
+        for index in range(50):
+            future = writer.submit({"worker": worker, "index": index, "pad": "x" * 200})
+            with lock:
+                futures.append(future)
+
+    threads = [threading.Thread(target=submit, args=(worker,)) for worker in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    async def acknowledged():
+        return await asyncio.wrap_future(futures[-1])
+
+    assert isinstance(asyncio.run(acknowledged()), int)
+    writer.close()
+    assert all(future.done() for future in futures)
+    lines = path.read_text(encoding="utf-8").splitlines()
+    assert len(lines) == 400 and writer.records == 400
+    # Concurrent submitters share batches rather than paying a write (and fsync) each.
+    assert writer.batches < writer.records // 4 and writer.fsyncs >= 1
+    if policy == "batch":
+        assert writer.fsyncs == writer.batches
+    records = [json.loads(line) for line in lines]
+    for worker in range(8):
+        assert [r["index"] for r in records if r["worker"] == worker] == list(range(50))
+    with pytest.raises(RuntimeError):
+        writer.submit({"late": True})
+
+
+def test_rejects_unknown_policy(tmp_path) -> None:
+    with pytest.raises(ValueError):
+        GroupCommitWriter(JsonlFile(tmp_path / "x.jsonl"), fsync_policy="sometimes")
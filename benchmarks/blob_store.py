@@ -0,0 +1,61 @@
+"""Put/get throughput benchmark for the content-addressed photo blob store.
+
+Writes ``--photos`` random photos of ``--size`` bytes into a scratch store,
+a ``--duplicates`` share of them repeats of earlier ones, then reads every
+blob back through mmap (as ``BlobResponse`` serves it) and reports MB/s for
+each.
+
+    python benchmarks/blob_store.py --photos 500 --size 2000000 --duplicates 0.2
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from app.blobs import BlobStore  # noqa: E402
+
+
+def _report(label: str, seconds: float, count: int, nbytes: int) -> None:
+    print(f"{label:<8} {count / seconds:8.0f} ops/s {nbytes / seconds / 1e6:9.1f} MB/s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--photos", type=int, default=500)
+    parser.add_argument("--size", type=int, default=2_000_000)
+    parser.add_argument("--duplicates", type=float, default=0.2)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    unique = max(1, round(args.photos * (1 - args.duplicates)))
+    photos = [rng.randbytes(args.size) for _ in range(unique)]
+    uploads = photos + [rng.choice(photos) for _ in range(args.photos - unique)]
+    digests = [hashlib.sha256(photo).hexdigest() for photo in uploads]
+
+    with tempfile.TemporaryDirectory() as scratch:
+        store = BlobStore(Path(scratch))
+        started = time.perf_counter()
+        for index, (digest, photo) in enumerate(zip(digests, uploads)):
+            store.put(digest, [photo], f"log-{index}")
+        _report("put", time.perf_counter() - started, len(uploads), len(uploads) * args.size)
+        print(f"         {store.stats()}")
+
+        started = time.perf_counter()
+        checksum = 0
+        for digest in digests:
+            with store.open(digest) as view:
+                checksum ^= view[-1]
+        _report("mmap", time.perf_counter() - started, len(digests), len(digests) * args.size)
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
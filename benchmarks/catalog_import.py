@@ -0,0 +1,81 @@
+"""Catalog import time at 1, 2, 4 and 8 workers.
+
+Generates ``--sources`` synthetic source files of ``--items`` items each (a
+share of names repeated across sources so merging has work to do), imports
+them with each worker count into a scratch directory, and checks that every
+parallel catalog matches the serial one apart from timestamps. The CPU time
+of the importing process itself is reported too: it is the part the merge
+workers cannot take over, so it bounds the speedup on a machine with cores
+to spare.
+
+    python benchmarks/catalog_import.py --sources 4 --items 50000
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import re
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from backend.catalog.pipeline import run_import  # noqa: E402
+
+
+def _write_source(path: Path, index: int, items: int, rng: random.Random) -> None:
+    with path.open("w") as handle:
+        source = {"name": f"Source{index}", "dataset": "Synthetic", "version": "1", "url": None}
+        handle.write('{"source": ' + json.dumps(source) + ', "items": [')
+        for position in range(items):
+            name = f"Food {rng.randrange(items * 2)}"
+            protein, fat, carbs = rng.randint(0, 30), rng.randint(0, 30), rng.randint(0, 40)
+            item = {
+                "name": name,
+                "brand": None,
+                "locale": "en-US",
+                "confidence": round(rng.random(), 3),
+                "portions": [{"description": "serving", "amount": rng.randint(10, 300), "unit": "g"}],
+                "nutrients_per_100g": {
+                    "calories_kcal": 4 * protein + 4 * carbs + 9 * fat,
+                    "protein_g": protein,
+                    "fat_g": fat,
+                    "carbs_g": carbs,
+                },
+            }
+            handle.write(("," if position else "") + json.dumps(item))
+        handle.write("]}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sources", type=int, default=4)
+    parser.add_argument("--items", type=int, default=50_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as scratch:
+        directory = Path(scratch)
+        sources = [directory / f"source{index}.json" for index in range(args.sources)]
+        for index, path in enumerate(sources):
+            _write_source(path, index, args.items, rng)
+
+        baseline = None
+        for workers in args.workers:
+            output = directory / f"catalog_{workers}.json"
+            started, cpu_started = time.perf_counter(), time.process_time()
+            count, _ = run_import(sources, output, workers=workers)
+            elapsed, cpu = time.perf_counter() - started, time.process_time() - cpu_started
+            text = re.sub(r'"updated_at": "[^"]*"', "", output.read_text())
+            baseline = baseline or text
+            same = "identical" if text == baseline else "DIFFERS"
+            print(f"{workers} worker(s): {elapsed:6.2f}s ({cpu:.2f}s CPU in this process) for {count} items ({same} to the first run)")
+
+
+if __name__ == "__main__":
+    main()
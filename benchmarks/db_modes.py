@@ -0,0 +1,132 @@
+"""Load benchmark comparing the sync and async database modes of the API.
+
+Starts ``uvicorn app.main:api_app`` once per mode against a scratch SQLite
+file, seeds a user, daily log and meal, then fires a burst of concurrent
+food-item writes and macro-total reads and reports p50/p99 latency.
+
+    python benchmarks/db_modes.py --requests 2000 --concurrency 64
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import httpx
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _start_server(mode: str, db_path: Path, port: int) -> subprocess.Popen:
+    env = dict(os.environ)
+    env["CALORIE_TRACKER_DATABASE_URL"] = f"sqlite:///{db_path}"
+    env["CALORIE_TRACKER_DATABASE_MODE"] = mode
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:api_app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT,
+        env=env,
+    )
+
+
+async def _wait_ready(client: httpx.AsyncClient) -> None:
+    deadline = time.monotonic() + 20
+    while time.monotonic() < deadline:
+        try:
+            await client.get("/users")
+            return
+        except httpx.TransportError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError("server did not start")
+
+
+async def _run_load(base_url: str, total: int, concurrency: int) -> Tuple[List[float], int]:
+    async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+        await _wait_ready(client)
+        user = (await client.post("/users", json={"name": "Bench", "email": "bench@example.com"})).json()
+        log = (await client.post(f"/users/{user['id']}/daily-logs", json={"log_date": "2024-01-01"})).json()
+        meal = (await client.post(f"/daily-logs/{log['id']}/meals", json={"name": "Lunch"})).json()
+
+        latencies: List[float] = []
+        failures = [0]
+        queue: asyncio.Queue = asyncio.Queue()
+        for index in range(total):
+            queue.put_nowait(index)
+
+        async def worker() -> None:
+            while True:
+                try:
+                    index = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                started = time.perf_counter()
+                if index % 2:
+                    response = await client.get(f"/daily-logs/{log['id']}/macro-totals")
+                else:
+                    response = await client.post(
+                        f"/meals/{meal['id']}/food-items",
+                        json={"name": "Rice", "calories": 130, "carbs": 28.0},
+                    )
+                latencies.append(time.perf_counter() - started)
+                failures[0] += response.is_error
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return latencies, failures[0]
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def benchmark(mode: str, total: int, concurrency: int) -> Dict[str, float]:
+    port = _free_port()
+    with tempfile.TemporaryDirectory() as tmp:
+        server = _start_server(mode, Path(tmp) / "bench.db", port)
+        try:
+            started = time.perf_counter()
+            latencies, failures = asyncio.run(_run_load(f"http://127.0.0.1:{port}", total, concurrency))
+            elapsed = time.perf_counter() - started
+        finally:
+            server.terminate()
+            server.wait()
+    return {
+        "p50_ms": _percentile(latencies, 50) * 1000,
+        "p99_ms": _percentile(latencies, 99) * 1000,
+        "mean_ms": statistics.mean(latencies) * 1000,
+        "rps": total / elapsed,
+        "failures": failures,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--mode", action="append", choices=["sync", "async"])
+    args = parser.parse_args()
+
+    for mode in args.mode or ["sync", "async"]:
+        result = benchmark(mode, args.requests, args.concurrency)
+        print(
+            f"{mode:>5}: p50={result['p50_ms']:.1f}ms p99={result['p99_ms']:.1f}ms "
+            f"mean={result['mean_ms']:.1f}ms throughput={result['rps']:.0f} req/s failures={result['failures']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""Write-throughput benchmark for the sharded storage mode.
+
+Seeds one daily log and meal per user across 1, 4 and 16 SQLite shards in a
+scratch directory, then lets every user add food items from its own thread
+(spread over several processes) and reports committed writes per second and
+p50/p99 latency. Writes that hit SQLite's "database is locked" are retried and
+counted.
+
+    python benchmarks/shard_writes.py --users 64 --writes 50 --processes 8
+"""
+from __future__ import annotations
+
+import argparse
+import multiprocessing
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+from pathlib import Path
+from typing import Dict, List
+
+from sqlalchemy.exc import OperationalError
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from app import crud, sharding  # noqa: E402
+from app.database import Base  # noqa: E402
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _seed(router: sharding.ShardRouter, users: int) -> Dict[int, int]:
+    """Create the users, returning user id -> meal id."""
+    factory = router.sessionmaker()
+    meals: Dict[int, int] = {}
+    for index in range(users):
+        db = factory()
+        try:
+            user = crud.create_user(db, f"Bench {index}", f"bench{index}@example.com", "UTC")
+            db.info[sharding.SHARD_HINT] = router.shard_for_id(user.id)
+            log = crud.upsert_daily_log(db, user, date(2024, 1, 1), "UTC")
+            meals[user.id] = crud.create_meal(db, log, {"name": "Lunch"}).id
+        finally:
+            db.close()
+    return meals
+
+
+def _writer(directory: str, shards: int, pairs, writes: int, barrier, results) -> None:
+    """Add ``writes`` food items for each (user id, meal id) pair, one thread per user."""
+    router = sharding.ShardRouter.open(Path(directory), shards)
+    factory = router.sessionmaker()
+    latencies: List[float] = []
+    retries = 0
+    lock = threading.Lock()
+
+    def run(user_id: int, meal_id: int) -> None:
+        nonlocal retries
+        db = factory()
+        db.info[sharding.SHARD_HINT] = router.shard_for_id(user_id)
+        try:
+            for _ in range(writes):
+                started = time.perf_counter()
+                while True:
+                    try:
+                        meal = crud.get_meal(db, meal_id)
+                        crud.create_food_item(db, meal, {"name": "Rice", "calories": 130, "carbs": 28.0})
+                        break
+                    except OperationalError:
+                        db.rollback()
+                        with lock:
+                            retries += 1
+                with lock:
+                    latencies.append(time.perf_counter() - started)
+        finally:
+            db.close()
+
+    threads = [threading.Thread(target=run, args=pair) for pair in pairs]
+    barrier.wait()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    router.dispose()
+    results.put((latencies, retries))
+
+
+def benchmark(shards: int, users: int, writes: int, processes: int) -> Dict[str, float]:
+    # Writers are spread over processes, as behind a multi-worker uvicorn, so the
+    # GIL does not hide the SQLite write lock being measured.
+    with tempfile.TemporaryDirectory() as tmp:
+        router = sharding.ShardRouter.open(Path(tmp), shards)
+        router.create_all(Base.metadata)
+        pairs = list(_seed(router, users).items())
+        router.dispose()
+
+        barrier = multiprocessing.Barrier(processes + 1)
+        results: multiprocessing.Queue = multiprocessing.Queue()
+        workers = [
+            multiprocessing.Process(target=_writer, args=(tmp, shards, pairs[index::processes], writes, barrier, results))
+            for index in range(processes)
+        ]
+        for worker in workers:
+            worker.start()
+        barrier.wait()
+        started = time.perf_counter()
+        latencies: List[float] = []
+        retries = 0
+        for _ in workers:
+            worker_latencies, worker_retries = results.get()
+            latencies.extend(worker_latencies)
+            retries += worker_retries
+        elapsed = time.perf_counter() - started
+        for worker in workers:
+            worker.join()
+    return {
+        "p50_ms": _percentile(latencies, 50) * 1000,
+        "p99_ms": _percentile(latencies, 99) * 1000,
+        "mean_ms": statistics.mean(latencies) * 1000,
+        "wps": len(latencies) / elapsed,
+        "retries": retries,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=64)
+    parser.add_argument("--writes", type=int, default=50, help="food items added per user")
+    parser.add_argument("--processes", type=int, default=8)
+    parser.add_argument("--shards", type=int, action="append")
+    args = parser.parse_args()
+
+    for shards in args.shards or [1, 4, 16]:
+        result = benchmark(shards, args.users, args.writes, args.processes)
+        print(
+            f"{shards:>2} shards: p50={result['p50_ms']:.1f}ms p99={result['p99_ms']:.1f}ms "
+            f"mean={result['mean_ms']:.1f}ms throughput={result['wps']:.0f} writes/s "
+            f"lock retries={result['retries']}"
+        )
+
+
+if __name__ == "__main__":
+    main()